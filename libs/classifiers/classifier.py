@@ -1,4 +1,8 @@
 import logging
+import numpy as np
+
+from libs.classifiers.face_label_cache import FaceLabelCache
+from libs.utils.utils import config_to_boolean
 
 logging.getLogger().setLevel(logging.INFO)
 
@@ -26,6 +30,13 @@ class Classifier:
         else:
             raise ValueError(f"Classifier: Not supported device named: {classifier_section['Device']}")
         self.min_threshold = float(self.config.get_section_dict("Classifier").get("MinScore", 0.75))
+        self.face_label_cache = None
+        if config_to_boolean(classifier_section.get("TrackLabelCache", "False")):
+            self.face_label_cache = FaceLabelCache(
+                int(classifier_section.get("TrackLabelVotes", 3)),
+                int(classifier_section.get("TrackLabelRefreshFrames", 15)),
+                float(classifier_section.get("TrackLabelFaceGrowth", 1.5))
+            )
 
     def inference(self, objects):
         return self.classifier.inference(objects)
@@ -36,3 +47,40 @@ class Classifier:
                 object['face_label'] = classifier_result
             else:
                 object['face_label'] = -1
+
+    def detections_post_process(self, detections, classifier_results, classifier_scores):
+        """
+        Sets the face labels of a DetectionBatch. The results and scores are in the order of the objects with a face,
+        the faces with a low score (and the objects without a face) get the label -1.
+        """
+        face_labels = np.full(len(detections), -1, dtype=int)
+        face_indexes = np.flatnonzero(detections.has_faces)
+        if len(face_indexes):
+            classifier_results = np.asarray(classifier_results).reshape(-1)[:len(face_indexes)]
+            classifier_scores = np.asarray(classifier_scores, dtype=float).reshape(-1)[:len(face_indexes)]
+            confident = classifier_scores > self.min_threshold
+            face_labels[face_indexes[confident]] = classifier_results[confident]
+        detections.face_labels = face_labels
+
+    def classify_detections(self, detections, face_crops, tracks: list):
+        """
+        Sets the face labels of a DetectionBatch (already matched with the `tracks`) classifying its `face_crops`.
+        If the track label cache is enabled, only the faces of the tracks without a reliable label are classified.
+        """
+        if self.face_label_cache is None:
+            classifier_results, classifier_scores = self.inference(face_crops)
+            self.detections_post_process(detections, classifier_results, classifier_scores)
+            return
+        self.face_label_cache.retain_tracks([track[1] for track in tracks])
+        face_indexes = np.flatnonzero(detections.has_faces)
+        track_ids = detections.track_ids[face_indexes]
+        face_bboxes = detections.face_bboxes[face_indexes] * detections.scale if len(face_indexes) else np.zeros((0, 4))
+        face_areas = (face_bboxes[:, 2] - face_bboxes[:, 0]) * (face_bboxes[:, 3] - face_bboxes[:, 1])
+        to_classify = self.face_label_cache.faces_to_classify(track_ids, face_areas)
+        classifier_results, classifier_scores = [], []
+        if to_classify.any():
+            classifier_results, classifier_scores = self.inference(face_crops[:len(face_indexes)][to_classify])
+        face_labels = np.full(len(detections), -1, dtype=int)
+        face_labels[face_indexes] = self.face_label_cache.update(
+            track_ids, face_areas, to_classify, classifier_results, classifier_scores, self.min_threshold)
+        detections.face_labels = face_labels
@@ -46,7 +46,8 @@ class Classifier:
         """
         if np.shape(resized_rgb_images)[0] == 0:
             return [], []
-        resized_rgb_images = (resized_rgb_images * 255).astype("uint8")
+        # The float32 crops are rounded, as some of them are slightly lower than the original integer values
+        resized_rgb_images = np.rint(resized_rgb_images * 255).astype("uint8")
         result = []
         net_results = []
         for img in resized_rgb_images:
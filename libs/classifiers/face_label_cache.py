@@ -0,0 +1,90 @@
+import numpy as np
+
+
+class TrackFaceLabel:
+    __slots__ = ("label", "votes", "frames_since_classification", "face_area")
+
+    def __init__(self):
+        self.label = -1
+        self.votes = 0
+        self.frames_since_classification = 0
+        self.face_area = 0.0
+
+
+class FaceLabelCache:
+    """
+    Keeps the face mask label of each track, so the faces of the tracks whose label is already known aren't
+    classified in every frame.
+    A track is stable once it has `min_votes` consecutive classifications with the same label (and a score above the
+    classifier threshold). The faces of the stable tracks are only classified again every `refresh_frames` frames or
+    when their face grows more than `face_growth` times since the last classification (a closer face is more
+    reliable). The faces of the unstable tracks and the untracked objects are classified in every frame.
+
+    :param min_votes: The number of agreeing classifications needed to reuse the label of a track.
+    :param refresh_frames: The number of frames after which the face of a stable track is classified again.
+    :param face_growth: The ratio between the current and the last classified face areas that triggers a new
+        classification.
+    """
+
+    def __init__(self, min_votes, refresh_frames, face_growth):
+        self.min_votes = max(1, int(min_votes))
+        self.refresh_frames = max(1, int(refresh_frames))
+        self.face_growth = float(face_growth)
+        self.tracks_labels = {}
+
+    def is_stable(self, track_label):
+        return track_label is not None and track_label.votes >= self.min_votes
+
+    def retain_tracks(self, track_ids):
+        """ Removes the labels of the tracks that are no longer tracked """
+        track_ids = set(track_ids)
+        for track_id in [track_id for track_id in self.tracks_labels if track_id not in track_ids]:
+            del self.tracks_labels[track_id]
+
+    def faces_to_classify(self, track_ids, face_areas):
+        """
+        Returns a boolean array with True for the faces (of the objects tracked by `track_ids`, -1 for the untracked
+        ones) that have to be classified in this frame.
+        """
+        to_classify = np.ones(len(track_ids), dtype=bool)
+        for i, (track_id, face_area) in enumerate(zip(np.asarray(track_ids).tolist(), np.asarray(face_areas).tolist())):
+            track_label = self.tracks_labels.get(track_id)
+            if (self.is_stable(track_label) and track_label.frames_since_classification < self.refresh_frames
+                    and face_area <= track_label.face_area * self.face_growth):
+                to_classify[i] = False
+        return to_classify
+
+    def update(self, track_ids, face_areas, to_classify, results, scores, min_score):
+        """
+        Updates the labels of the tracks with the results of the classified faces and returns the label of every face:
+        the label of the stable tracks or the result of the classifier (-1 if its score isn't above `min_score`).
+        """
+        labels = np.full(len(track_ids), -1, dtype=int)
+        classified_results = zip(np.asarray(results).reshape(-1).tolist(),
+                                 np.asarray(scores, dtype=float).reshape(-1).tolist())
+        for i, (track_id, face_area, classified) in enumerate(
+                zip(np.asarray(track_ids).tolist(), np.asarray(face_areas).tolist(), np.asarray(to_classify).tolist())):
+            if track_id < 0:
+                result, score = next(classified_results)
+                labels[i] = result if score > min_score else -1
+                continue
+            track_label = self.tracks_labels.get(track_id)
+            if track_label is None:
+                track_label = self.tracks_labels[track_id] = TrackFaceLabel()
+            if not classified:
+                track_label.frames_since_classification += 1
+                labels[i] = track_label.label
+                continue
+            result, score = next(classified_results)
+            track_label.frames_since_classification = 0
+            track_label.face_area = face_area
+            if score > min_score:
+                if result == track_label.label:
+                    track_label.votes += 1
+                else:
+                    track_label.label, track_label.votes = result, 1
+                labels[i] = result
+            elif self.is_stable(track_label):
+                # An uncertain classification doesn't change the label of a stable track
+                labels[i] = track_label.label
+        return labels
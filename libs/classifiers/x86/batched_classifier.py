@@ -0,0 +1,61 @@
+import json
+import logging
+
+import numpy as np
+
+from threading import Lock
+
+from libs.utils.micro_batching import MicroBatcher
+
+logger = logging.getLogger(__name__)
+
+# Classifiers shared by all the cameras processed in the current process (one per model configuration)
+_batched_classifiers = {}
+_batched_classifiers_lock = Lock()
+
+
+def get_batched_classifier(model_name, variables, net_factory, max_batch_size, max_wait_ms):
+    """
+    Returns the BatchedClassifier shared by all the cameras of the process that use the same model configuration.
+    The network is only loaded (calling `net_factory`) the first time that the model configuration is requested.
+    """
+    key = (model_name, json.dumps(variables, sort_keys=True))
+    with _batched_classifiers_lock:
+        if key not in _batched_classifiers:
+            logger.info(f"Loading {model_name} for batched inference (max batch size: {max_batch_size})")
+            _batched_classifiers[key] = BatchedClassifier(net_factory(), max_batch_size, max_wait_ms)
+        return _batched_classifiers[key]
+
+
+class BatchedClassifier:
+    """
+    Wraps a classifier network and exposes the same interface as the network.
+    The face crops of the frames received from different camera threads are grouped into micro-batches (up to
+    `max_batch_size` frames or `max_wait_ms` of waiting) and classified with a single `predict` call. Each camera
+    thread receives only the results of its own faces.
+
+    :param net: A classifier network instance with an `inference` method and a `fps` attribute.
+    :param max_batch_size: The maximum number of frames whose faces are classified in a single call.
+    :param max_wait_ms: The maximum time (in milliseconds) the faces of a frame wait for other cameras to fill the batch.
+    """
+
+    def __init__(self, net, max_batch_size, max_wait_ms):
+        self.net = net
+        self.batcher = MicroBatcher(self.batch_inference, max_batch_size, max_wait_ms, name="BatchedClassifier")
+
+    @property
+    def fps(self):
+        return self.net.fps
+
+    def batch_inference(self, frames_faces):
+        """ Classifies the faces of several frames together and returns the (results, scores) of each frame """
+        counts = [len(faces) for faces in frames_faces]
+        results, scores = self.net.inference(np.concatenate(frames_faces))
+        bounds = np.cumsum([0] + counts).tolist()
+        return [(results[begin:end], scores[begin:end]) for begin, end in zip(bounds[:-1], bounds[1:])]
+
+    def inference(self, resized_rgb_images):
+        if len(resized_rgb_images) == 0:
+            # Frames without faces don't wait for the other cameras
+            return [], []
+        return self.batcher.submit(resized_rgb_images)
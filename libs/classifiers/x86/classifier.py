@@ -1,3 +1,6 @@
+from libs.classifiers.x86.batched_classifier import get_batched_classifier
+
+
 class Classifier:
     """
     Classifier class is a high level class for classifying images using x86 devices.
@@ -9,14 +12,28 @@ class Classifier:
     def __init__(self, config):
         self.config = config
         self.name = self.config.get_section_dict('Classifier')['Name']
+        max_batch_size = int(self.config.get_section_dict("Classifier").get("MaxBatchSize", 1))
+        max_batch_wait_ms = float(self.config.get_section_dict("Classifier").get("MaxBatchWaitMs", 10))
 
-        if self.name == 'OFMClassifier':
-            from libs.classifiers.x86 import face_mask
-            self.net = face_mask.Classifier(self.config)
+        if max_batch_size > 1:
+            # The network is shared by all the cameras of the process and their faces are classified together
+            self.net = get_batched_classifier(
+                self.name, self.config.get_section_dict("Classifier"), lambda: load_network(self.config, self.name),
+                max_batch_size, max_batch_wait_ms
+            )
         else:
-            raise ValueError('Not supported network named: ', self.name)
+            self.net = load_network(self.config, self.name)
 
     def inference(self, resized_rgb_image):
         self.fps = self.net.fps
         output, scores = self.net.inference(resized_rgb_image)
         return output, scores
+
+
+def load_network(config, name):
+    """ Loads the x86 classifier network named `name` """
+    if name == 'OFMClassifier':
+        from libs.classifiers.x86 import face_mask
+        return face_mask.Classifier(config)
+    else:
+        raise ValueError('Not supported network named: ', name)
@@ -51,11 +51,8 @@ class Classifier:
         inference_time = time.perf_counter() - t_begin  # Seconds
         # Calculate Frames rate (fps)
         self.fps = convert_infr_time_to_fps(inference_time)
-        result = list(np.argmax(output_dict, axis=1))  # returns class id
+        output_dict = np.asarray(output_dict)
+        result = np.argmax(output_dict, axis=1)  # returns class id
+        scores = output_dict[np.arange(len(result)), result]
 
-        # TODO: optimized without for
-        scores = []
-        for i, itm in enumerate(output_dict):
-            scores.append(itm[result[i]])
-
-        return result, scores
+        return list(result), list(scores)
@@ -4,6 +4,7 @@ import logging
 import numpy as np
 from math import trunc
 import os
+import time
 
 from datetime import date, datetime, timedelta
 from statistics import mean
@@ -12,13 +13,25 @@ from libs.classifiers.classifier import Classifier
 from libs.trackers.tracker import Tracker
 from libs.loggers.source_loggers.logger import Logger
 from libs.detectors.detector import Detector
+from libs.source_post_processors.objects_filtering import ObjectsFilteringPostProcessor
 from libs.source_post_processors.source_post_processor import SourcePostProcessor
+from libs.utils.detection_stride import AdaptiveDetectionStride
+from libs.utils.frame_capture import LatestFrameCapture
+from libs.utils.frame_pool import FramePool, PooledVideoCapture
+from libs.utils.motion_gate import MotionGate
+from libs.utils.utils import config_to_boolean
 
 
 logger = logging.getLogger(__name__)
 FRAMES_LOG_BATCH_SIZE = 100
 LOG_SECTIONS = ["Detector", "Classifier", "Tracker", "Post processing steps"]
 POST_PROCESSING = "Post processing steps"
+CAPTURE_LAG = "Capture lag"
+DROPPED_FRAMES = "Dropped frames"
+FRAME_ALLOCATIONS = "Frame allocations"
+FRAME_COPIES = "Frame copies"
+SKIPPED_INFERENCE = "Skipped inference"
+ASYNC_LOGGER_STATS = ["queue depth", "latency", "dropped updates"]
 
 
 class CvEngine:
@@ -26,6 +39,9 @@ class CvEngine:
     def __init__(self, config, source):
         self.config = config
         self.resolution = tuple([int(i) for i in self.config.get_section_dict('App')['Resolution'].split(',')])
+        # The frames that don't have the processing resolution are resized into this buffer (it's overwritten by the
+        # next frame once the loggers are done with the current one)
+        self.resized_frame = np.empty(self.resolution[::-1] + (3,), dtype=np.uint8)
 
         # Init detector, tracker and classifier
         self.detector = Detector(self.config, source)
@@ -59,6 +75,49 @@ class CvEngine:
                         self.logging_time_interval = min(self.logging_time_interval, logger_time_interval)
         self.running_video = False
 
+        # Decode live streams in a separate thread and always process the newest frame
+        self.latest_frame_capture = config_to_boolean(
+            self.config.get_section_dict("App").get("LatestFrameCapture", "False"))
+        self.capture_buffer_size = int(self.config.get_section_dict("App").get("CaptureBufferSize", 2))
+        # Decode the frames into preallocated shared memory slots instead of allocating a new frame each time
+        self.use_frame_pool = config_to_boolean(self.config.get_section_dict("App").get("FramePool", "False"))
+
+        # Skip the detector on the frames without motion inside the RoI
+        self.motion_gate = None
+        self.last_inference_results = None
+        if config_to_boolean(self.config.get_section_dict("App").get("MotionGate", "False")):
+            camera_id = self.config.get_section_dict(source)["Id"]
+            roi_contour = ObjectsFilteringPostProcessor.get_roi_contour(
+                ObjectsFilteringPostProcessor.get_roi_file_path(camera_id, self.config))
+            self.motion_gate = MotionGate(
+                self.resolution,
+                roi_contour,
+                float(self.config.get_section_dict("App").get("MotionGateThreshold", 0.005)),
+                float(self.config.get_section_dict("App").get("MotionGateRedetectInterval", 5))
+            )
+
+        # Run the detector every N frames (adapted to the scene activity) and track the objects in between
+        self.detection_stride = None
+        self.last_tracked_detections = None
+        if config_to_boolean(self.config.get_section_dict("App").get("AdaptiveDetectionStride", "False")):
+            self.detection_stride = AdaptiveDetectionStride(
+                int(self.config.get_section_dict("App").get("MaxDetectionStride", 5)))
+
+        self.log_sections = list(LOG_SECTIONS)
+        if self.latest_frame_capture:
+            self.log_sections += [CAPTURE_LAG, DROPPED_FRAMES]
+        if self.use_frame_pool:
+            self.log_sections += [FRAME_ALLOCATIONS, FRAME_COPIES]
+        if self.motion_gate is not None or self.detection_stride is not None:
+            self.log_sections.append(SKIPPED_INFERENCE)
+        # Queue depth, latency (from the frame to the end of the update) and dropped updates of the async loggers
+        self.async_loggers_sections = {}
+        for source_logger in self.loggers:
+            if source_logger.is_async:
+                logger_title = source_logger.name.replace("_", " ").capitalize()
+                sections = tuple(f"{logger_title} {stat}" for stat in ASYNC_LOGGER_STATS)
+                self.async_loggers_sections[source_logger] = sections
+                self.log_sections += sections
         self.log_performance = self.config.get_boolean("App", "LogPerformanceMetrics")
         if self.log_performance:
             self.log_performance_directory = self.config.get_section_dict('App')['LogPerformanceMetricsDirectory']
@@ -68,42 +127,54 @@ class CvEngine:
 
     def __process(self, cv_image):
         """
-        return object_list list of  dict for each obj,
-        obj["bbox"] is normalized coordinations for [x0, y0, x1, y1] of box
+        return the DetectionBatch with the objects of the frame,
+        its bboxes are normalized coordinations for [x0, y0, x1, y1] of the boxes
         """
 
-        # Resize input image to resolution
-        cv_image = cv.resize(cv_image, self.resolution)
+        # Resize input image to resolution (the frames decoded into the frame pool already have it)
+        if cv_image.shape[1::-1] != self.resolution:
+            cv_image = cv.resize(cv_image, self.resolution, dst=self.resized_frame)
 
-        # Execute detector
-        begin_time = datetime.now()
-        tmp_objects_list, detection_scores, class_ids, detection_bboxes, classifier_objects = self.detector.inference(cv_image)
-        detector_time = (datetime.now() - begin_time).total_seconds()
-
-        # Execute classifier and tracker
-        if self.classifier:
+        # In the frames between two detector runs the tracks are propagated by the tracker
+        predict_tracks = self.detection_stride is not None and not self.detection_stride.should_run_inference()
+        run_inference = not predict_tracks and (
+            self.motion_gate is None or self.motion_gate.should_run_inference(cv_image))
+        classifier_time, tracker_time = 0, 0
+        if run_inference:
+            # Execute detector
             begin_time = datetime.now()
-            classifier_results, classifier_scores = self.classifier.inference(classifier_objects)
-            classifier_time = (datetime.now() - begin_time).total_seconds()
-
-        begin_time = datetime.now()
-        tracks = self.tracker.update(detection_bboxes, class_ids, detection_scores)
-        tracker_time = (datetime.now() - begin_time).total_seconds()
+            detections, classifier_objects = self.detector.inference(cv_image)
+            detector_time = (datetime.now() - begin_time).total_seconds()
 
-        idx = 0
-        for obj in tmp_objects_list:
+            # Execute tracker and classifier (the classifier can reuse the face labels of the tracks)
             begin_time = datetime.now()
-            self.tracker.object_post_process(obj, tracks)
-            tracker_time += (datetime.now() - begin_time).total_seconds()
+            tracks = self.tracker.update(detections.tracker_bboxes(), detections.class_ids.tolist(),
+                                         detections.scores.tolist())
+            self.tracker.objects_post_process(detections, tracks)
+            tracker_time = (datetime.now() - begin_time).total_seconds()
 
-            if self.classifier is not None:
+            if self.classifier:
                 begin_time = datetime.now()
-                if obj.get("face") is not None:
-                    self.classifier.object_post_process(obj, classifier_results[idx], classifier_scores[idx])
-                    idx = idx + 1
-                else:
-                    self.classifier.object_post_process(obj, None, None)
-                classifier_time += (datetime.now() - begin_time).total_seconds()
+                self.classifier.classify_detections(detections, classifier_objects, tracks)
+                classifier_time = (datetime.now() - begin_time).total_seconds()
+            if self.motion_gate is not None:
+                # The detections and tracks are modified by the following steps, keep a copy to reuse them in the
+                # static frames
+                self.last_inference_results = (detections.copy(), [track.snapshot() for track in tracks])
+        elif predict_tracks:
+            begin_time = datetime.now()
+            tracks = self.tracker.predict()
+            detections = self.tracker.propagate_detections(self.last_tracked_detections, tracks)
+            tracker_time = (datetime.now() - begin_time).total_seconds()
+        else:
+            # Nothing moved, reuse the detections and the tracker state of the last inference
+            last_detections, tracks = self.last_inference_results
+            detections = last_detections.copy()
+
+        if not predict_tracks and self.detection_stride is not None:
+            # Keep the tracked objects to propagate them until the next detector run
+            self.last_tracked_detections = detections.select(detections.track_ids >= 0).copy()
+            self.detection_stride.update(tracks, len(detections))
 
         # Execute post processors
         post_processing_data = {
@@ -111,23 +182,39 @@ class CvEngine:
         }
         for post_processor in self.post_processors:
             begin_time = datetime.now()
-            cv_image, tmp_objects_list, post_processing_data = post_processor.process(
-                cv_image, tmp_objects_list, post_processing_data)
+            cv_image, detections, post_processing_data = post_processor.process(
+                cv_image, detections, post_processing_data)
             post_processors_time = (datetime.now() - begin_time).total_seconds()
             if self.log_performance:
                 p_processor_name = post_processor.post_processor_name.replace("_", " ").title()
                 self.log_detail["Post processing steps"][p_processor_name].append(post_processors_time)
 
         if self.log_performance:
-            self.log_detail["Detector"].append(detector_time)
-            if self.classifier:
-                self.log_detail["Classifier"].append(classifier_time)
+            if run_inference:
+                self.log_detail["Detector"].append(detector_time)
+                if self.classifier:
+                    self.log_detail["Classifier"].append(classifier_time)
+            if self.motion_gate is not None or self.detection_stride is not None:
+                self.log_detail[SKIPPED_INFERENCE].append(0 if run_inference else 1)
             self.log_detail["Tracker"].append(tracker_time)
-        return cv_image, tmp_objects_list, post_processing_data
+        return cv_image, detections, post_processing_data
 
     def process_video_file(self, video_uri, video_date: str = None):
-        input_cap = cv.VideoCapture(video_uri)
         is_video_file = bool(video_date)
+        # Frames of local files and historical videos can't be dropped
+        use_latest_frame_capture = self.latest_frame_capture and not is_video_file and not os.path.isfile(video_uri)
+        frame_pool = None
+        if self.use_frame_pool:
+            # The latest frame capture needs a slot for each buffered frame, the frame being decoded and the one
+            # being processed. Otherwise, a slot is enough as the frames are decoded after processing the previous one
+            pool_size = self.capture_buffer_size + 2 if use_latest_frame_capture else 1
+            frame_pool = FramePool(self.resolution[::-1] + (3,), pool_size)
+        if use_latest_frame_capture:
+            input_cap = LatestFrameCapture(video_uri, self.capture_buffer_size, frame_pool)
+        elif frame_pool is not None:
+            input_cap = PooledVideoCapture(video_uri, frame_pool)
+        else:
+            input_cap = cv.VideoCapture(video_uri)
         if is_video_file:
             fps = min(15, input_cap.get(cv.CAP_PROP_FPS))
         else:
@@ -152,12 +239,19 @@ class CvEngine:
         for source_logger in self.loggers:
             source_logger.start_logging(fps)
         frame_num = 0
+        frame_handle = None
         while input_cap.isOpened() and self.running_video:
+            if frame_handle is not None:
+                # The previous frame is no longer used, return its slot to the pool
+                frame_handle.release()
+                frame_handle = None
             ret, cv_image = input_cap.read()
             if not ret:
                 logger.warn("Failed to read capture frame. Stream ended?")
                 self.running_video = False
                 continue
+            if frame_pool is not None:
+                frame_handle, cv_image = cv_image, cv_image.frame
             if np.shape(cv_image) != ():
                 frame_num += 1
                 if frame_num % FRAMES_LOG_BATCH_SIZE == 1:
@@ -167,11 +261,20 @@ class CvEngine:
                     self.running_video = False
                 if is_video_file and frame_num % self.fps_log_number != 0:
                     continue
+                if use_latest_frame_capture and self.log_performance:
+                    self.log_detail[CAPTURE_LAG].append(time.perf_counter() - input_cap.last_capture_time)
+                    self.log_detail[DROPPED_FRAMES].append(input_cap.pop_dropped_frames())
+                if frame_pool is not None and self.log_performance:
+                    allocations, copies = frame_pool.pop_stats()
+                    self.log_detail[FRAME_ALLOCATIONS].append(allocations)
+                    self.log_detail[FRAME_COPIES].append(copies)
                 cv_image, objects, post_processing_data = self.__process(cv_image)
                 for source_logger in self.loggers:
                     log_time_str = log_time.strftime("%Y-%m-%d %H:%M:%S") if log_time else None
                     source_logger.update(cv_image, objects, post_processing_data, self.detector.fps,
                                          log_time_str)
+                    if source_logger.is_async and self.log_performance:
+                        self.log_async_logger_stats(source_logger)
                 if log_time:
                     log_time = log_time + timedelta(seconds=self.logging_time_interval)
                 if is_video_file and total_frames == frame_num:
@@ -180,6 +283,8 @@ class CvEngine:
                 if is_video_file:
                     # Video ended
                     self.running_video = False
+        if frame_handle is not None:
+            frame_handle.release()
         input_cap.release()
         for source_logger in self.loggers:
             source_logger.stop_logging()
@@ -197,11 +302,18 @@ class CvEngine:
     def stop_process_video(self):
         self.running_video = False
 
+    def log_async_logger_stats(self, source_logger):
+        queue_depth_section, latency_section, dropped_section = self.async_loggers_sections[source_logger]
+        latencies, dropped_updates = source_logger.dispatcher.pop_stats()
+        self.log_detail[queue_depth_section].append(source_logger.dispatcher.queue_depth())
+        self.log_detail[latency_section].extend(latencies)
+        self.log_detail[dropped_section].append(dropped_updates)
+
     def reset_log_detail(self, set_headers=False):
         self.log_detail = {}
         if set_headers:
             self.log_performance_headers = ["Timestamp", "FPS"]
-        for section in LOG_SECTIONS:
+        for section in self.log_sections:
             if section == POST_PROCESSING:
                 self.log_detail[section] = {}
                 for p_processor in self.post_processors:
@@ -225,7 +337,7 @@ class CvEngine:
                     "Timestamp": current_time_str,
                     "FPS": str(fps_time)
                 }
-                for section in LOG_SECTIONS:
+                for section in self.log_sections:
                     detail = self.log_detail[section]
                     if isinstance(detail, list):
                         if detail != []:
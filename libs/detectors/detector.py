@@ -2,7 +2,13 @@ import cv2 as cv
 import logging
 import numpy as np
 
+from libs.detectors.inference_server import RemoteDetector, get_inference_server_channel
 from libs.detectors.utils.ml_model_functions import get_model_json_file_or_return_default_values
+from libs.detectors.utils.preprocessing import PreprocessingPlan, get_input_geometry
+from libs.source_post_processors.objects_filtering import ObjectsFilteringPostProcessor
+from libs.utils.detection_batch import DetectionBatch
+from libs.utils.roi_mask import get_roi_mask
+from libs.utils.utils import config_to_boolean
 
 logger = logging.getLogger(__name__)
 
@@ -13,8 +19,12 @@ class Detector:
         self.config = config
         self.device = self.config.get_section_dict("Detector")["Device"]
         self.resolution = tuple([int(i) for i in self.config.get_section_dict("App")["Resolution"].split(",")])
-        self.image_size = [int(i) for i in get_model_json_file_or_return_default_values(
-            self.config, self.device, self.config.get_section_dict(source)["Id"])["variables"]["ImageSize"].split(",")]
+        camera_id = self.config.get_section_dict(source)["Id"]
+        model_data = get_model_json_file_or_return_default_values(self.config, self.device, camera_id)
+        self.image_size = [int(i) for i in model_data["variables"]["ImageSize"].split(",")]
+        # The frames are resized (and converted) once, straight to the input geometry of the network
+        self.preprocessing = PreprocessingPlan(
+            get_input_geometry(self.device, model_data["model_name"], model_data["variables"]))
         self.has_classifier = "Classifier" in self.config.get_sections()
         if self.has_classifier:
             self.classifier_img_size = [
@@ -24,7 +34,21 @@ class Detector:
                 self.classifier_min_img_size = [
                     int(i) for i in self.config.get_section_dict("Classifier")["MinImageSize"].split(",")
                 ]
-        if self.device == "Jetson":
+            # Buffers of the face crops of a frame, they grow with the number of faces
+            self.face_crops = np.empty((0,) + self.face_crop_shape, dtype=np.uint8)
+            self.face_batch = np.empty((0,) + self.face_crop_shape, dtype=np.float32)
+        # Run the detector only on the bounding rectangle of the RoI (plus a margin)
+        detector_section = self.config.get_section_dict("Detector")
+        self.roi_cropped_inference = config_to_boolean(detector_section.get("RoICroppedInference", "False"))
+        self.roi_crop_margin = float(detector_section.get("RoICropMargin", 0.05))
+        self.roi_file_path = ObjectsFilteringPostProcessor.get_roi_file_path(camera_id, self.config)
+        self.roi_crop = None
+        self.roi_crop_mask = None
+        inference_server_channel = get_inference_server_channel(camera_id)
+        if inference_server_channel is not None:
+            # The model is loaded by the inference server process
+            self.detector = RemoteDetector(inference_server_channel, model_data["model_name"])
+        elif self.device == "Jetson":
             from .jetson.detector import Detector as JetsonDetector
             self.detector = JetsonDetector(self.config, source)
         elif self.device == "EdgeTPU":
@@ -49,48 +73,90 @@ class Detector:
             return None
         return getattr(self.detector, "fps", None)
 
+    def get_roi_crop(self):
+        """
+        Returns the rectangle (x0, y0, x1, y1), in pixels of the frames, processed by the detector when the RoI
+        cropped inference is enabled and the camera has a RoI (None otherwise).
+        """
+        if not self.roi_cropped_inference:
+            return None
+        roi_mask = get_roi_mask(self.roi_file_path, self.resolution)
+        if roi_mask is None:
+            return None
+        if roi_mask is not self.roi_crop_mask:
+            # The RoI was loaded or modified
+            width, height = self.resolution
+            x, y, w, h = cv.boundingRect(np.asarray(roi_mask.contour, dtype=np.int32).reshape(-1, 1, 2))
+            margin_x, margin_y = self.roi_crop_margin * width, self.roi_crop_margin * height
+            self.roi_crop = (
+                max(int(x - margin_x), 0), max(int(y - margin_y), 0),
+                min(int(np.ceil(x + w + margin_x)), width), min(int(np.ceil(y + h + margin_y)), height)
+            )
+            self.roi_crop_mask = roi_mask
+        return self.roi_crop
+
     def inference(self, cv_image):
-        resized_image = cv.resize(cv_image, tuple(self.image_size[:2]))
-        rgb_resized_image = cv.cvtColor(resized_image, cv.COLOR_BGR2RGB)
-        object_list = self.detector.inference(rgb_resized_image)
-        return self.objects_post_processing(object_list, cv_image)
+        roi_crop = self.get_roi_crop()
+        input_image = cv_image
+        if roi_crop is not None:
+            x0, y0, x1, y1 = roi_crop
+            input_image = cv_image[y0:y1, x0:x1]
+        # Detectors with an input buffer (e.g. the inference server one) receive the image directly in it
+        input_image = self.preprocessing.run(input_image, dst=getattr(self.detector, "input_buffer", None))
+        object_list = self.detector.inference(input_image)
+        return self.objects_post_processing(object_list, cv_image, roi_crop)
 
-    def objects_post_processing(self, object_list, cv_image):
+    @property
+    def face_crop_shape(self):
+        """ The shape (height, width, channels) of the face crops received by the classifier """
+        return (self.classifier_img_size[1], self.classifier_img_size[0], 3)
+
+    def reserve_face_buffers(self, faces_count):
+        """ Makes the face crops buffers large enough to hold `faces_count` faces """
+        if faces_count > len(self.face_crops):
+            capacity = max(faces_count, 2 * len(self.face_crops))
+            self.face_crops = np.empty((capacity,) + self.face_crop_shape, dtype=np.uint8)
+            self.face_batch = np.empty((capacity,) + self.face_crop_shape, dtype=np.float32)
+
+    def objects_post_processing(self, object_list, cv_image, roi_crop=None):
+        """
+        Converts the output of the detector into a DetectionBatch and crops the detected faces for the classifier.
+        If the detector processed the `roi_crop` rectangle of the frame, the boxes are mapped back to the frame.
+        Returns the batch and the float32 array of face crops (in the order of the objects with a face).
+        """
         # TODO: Move this logic into the inference implementation in each detector
-        [w, h] = self.resolution
-        detection_scores = []
-        class_ids = []
-        detection_bboxes = []
-        classifier_objects = []
-        for itm in object_list:
-            if self.has_classifier and "face" in itm.keys():
-                face_bbox = itm["face"]  # [ymin, xmin, ymax, xmax]
-                if face_bbox is not None:
-                    xmin, xmax = np.multiply([face_bbox[1], face_bbox[3]], self.resolution[0])
-                    ymin, ymax = np.multiply([face_bbox[0], face_bbox[2]], self.resolution[1])
-                    if (self.classifier_min_img_size
-                            and (xmax - xmin < self.classifier_min_img_size[0] or ymax - ymin < self.classifier_min_img_size[1])):
-                        # Face is too small to process it, ignore it
-                        itm["face"] = None
-                    else:
-                        croped_face = cv_image[
-                            int(ymin):int(ymin) + (int(ymax) - int(ymin)),
-                            int(xmin):int(xmin) + (int(xmax) - int(xmin))
-                        ]
-                        # Resizing input image
-                        croped_face = cv.resize(croped_face, tuple(self.classifier_img_size[:2]))
-                        croped_face = cv.cvtColor(croped_face, cv.COLOR_BGR2RGB)
-                        # Normalizing input image to [0.0-1.0]
-                        croped_face = np.array(croped_face) / 255.0
-                        classifier_objects.append(croped_face)
-            # Prepare tracker input
-            box = itm["bbox"]
-            x0 = box[1]
-            y0 = box[0]
-            x1 = box[3]
-            y1 = box[2]
-            detection_scores.append(itm["score"])
-            class_ids.append(int(itm["id"].split("-")[0]))
-            detection_bboxes.append((int(x0 * w), int(y0 * h), int(x1 * w), int(y1 * h)))
-        classifier_objects = np.array(classifier_objects)
-        return object_list, detection_scores, class_ids, detection_bboxes, classifier_objects
+        detections = DetectionBatch.from_detector_objects(object_list, self.resolution)
+        if roi_crop is not None:
+            width, height = self.resolution
+            x0, y0, x1, y1 = roi_crop
+            scale = np.array([(x1 - x0) / width, (y1 - y0) / height] * 2)
+            offset = np.array([x0 / width, y0 / height] * 2)
+            detections.bboxes = detections.bboxes * scale + offset
+            if detections.face_bboxes is not None:
+                detections.face_bboxes = detections.face_bboxes * scale + offset
+        if not self.has_classifier:
+            return detections, np.zeros(0, dtype=np.float32)
+        faces_count = 0
+        if detections.face_bboxes is not None:
+            face_indexes = np.flatnonzero(detections.has_faces)
+            face_bboxes = detections.face_bboxes * detections.scale
+            self.reserve_face_buffers(len(face_indexes))
+            for i in face_indexes.tolist():
+                xmin, ymin, xmax, ymax = face_bboxes[i].tolist()
+                if (self.classifier_min_img_size
+                        and (xmax - xmin < self.classifier_min_img_size[0] or ymax - ymin < self.classifier_min_img_size[1])):
+                    # Face is too small to process it, ignore it
+                    detections.face_bboxes[i] = np.nan
+                    continue
+                croped_face = cv_image[
+                    int(ymin):int(ymin) + (int(ymax) - int(ymin)),
+                    int(xmin):int(xmin) + (int(xmax) - int(xmin))
+                ]
+                # Resizing input image straight into the buffer of the crops
+                cv.resize(croped_face, tuple(self.classifier_img_size[:2]), dst=self.face_crops[faces_count])
+                faces_count += 1
+        # Converting all the crops to RGB and normalizing them to [0.0-1.0] at once, the batch is overwritten by the
+        # next frame
+        classifier_objects = self.face_batch[:faces_count]
+        np.divide(self.face_crops[:faces_count, :, :, ::-1], np.float32(255), out=classifier_objects)
+        return detections, classifier_objects
@@ -0,0 +1,163 @@
+import json
+import logging
+import multiprocessing as mp
+import os
+import time
+
+import numpy as np
+
+from queue import Empty
+
+from libs.detectors.utils.ml_model_functions import get_model_json_file_or_return_default_values
+from libs.detectors.utils.preprocessing import get_input_geometry
+
+logger = logging.getLogger(__name__)
+
+# Devices whose models can be served by the inference server
+INFERENCE_SERVER_DEVICES = ["x86", "x86-gpu"]
+# Maximum time (in seconds) that a camera waits for the results of the inference server
+RESPONSE_TIMEOUT = 60
+
+# Channels of the cameras processed by the current process (by camera id)
+_channels = {}
+
+
+class InferenceServerChannel:
+    """
+    Connects a camera processed in a worker process with the inference server.
+    The input image is written into a buffer allocated in shared memory, so only the camera index and a request
+    number travel through the (shared) request queue. The results are sent back through a dedicated pipe.
+    The channels must be created before forking the worker and inference server processes.
+
+    :param camera_index: A number that identifies the camera in the inference server.
+    :param image_shape: The shape (height, width, channels) of the images sent to the detector.
+    :param request_queue: The queue used by all the cameras to send requests to the server.
+    """
+
+    def __init__(self, camera_index, image_shape, request_queue):
+        self.camera_index = camera_index
+        self.image_shape = tuple(image_shape)
+        self.shared_buffer = mp.RawArray("B", int(np.prod(self.image_shape)))
+        # Numpy view of the shared buffer, writing into it doesn't require additional copies
+        self.image = np.frombuffer(self.shared_buffer, dtype=np.uint8).reshape(self.image_shape)
+        self.request_queue = request_queue
+        self.response_recv_conn, self.response_send_conn = mp.Pipe(False)
+
+
+def create_inference_server_channels(config, sources, request_queue):
+    """ Returns a dict with the InferenceServerChannel of each source (by id) """
+    device = config.get_section_dict("Detector")["Device"]
+    channels = {}
+    for camera_index, src in enumerate(sources):
+        model_data = get_model_json_file_or_return_default_values(config, device, src["id"])
+        # The cameras write the images already prepared for the network (see PreprocessingPlan)
+        width, height = get_input_geometry(device, model_data["model_name"], model_data["variables"]).size
+        channels[src["id"]] = InferenceServerChannel(camera_index, (height, width, 3), request_queue)
+    return channels
+
+
+def set_inference_server_channels(channels):
+    """ Registers the channels of the cameras processed by the current process """
+    _channels.clear()
+    _channels.update(channels)
+
+
+def get_inference_server_channel(camera_id):
+    return _channels.get(camera_id)
+
+
+def run_inference_server(config, pipe, sources, channels, request_queue):
+    """
+    Loads a single copy of each model used by `sources` and serves the inference requests of all the worker
+    processes. The requests received from different cameras are grouped into batches (up to `MaxBatchSize` requests
+    or `MaxBatchWaitMs` of waiting) and processed with a single forward pass when the model supports it.
+    """
+    from libs.detectors.x86.detector import load_network
+
+    pid = os.getpid()
+    device = config.get_section_dict("Detector")["Device"]
+    max_batch_size = max(1, int(config.get_section_dict("Detector").get("MaxBatchSize", 1)))
+    max_batch_wait = float(config.get_section_dict("Detector").get("MaxBatchWaitMs", 10)) / 1000
+
+    networks = {}
+    camera_networks = {}
+    for src in sources:
+        model_data = get_model_json_file_or_return_default_values(config, device, src["id"])
+        model_key = (model_data["model_name"], json.dumps(model_data["variables"], sort_keys=True))
+        if model_key not in networks:
+            networks[model_key] = load_network(
+                config, model_data["model_name"], model_data["variables"], max_batch_size)
+        camera_networks[channels[src["id"]].camera_index] = networks[model_key]
+    cameras_channels = {channel.camera_index: channel for channel in channels.values()}
+    logger.info(f"[{pid}] inference server loaded {len(networks)} models for {len(sources)} cameras")
+
+    # Run until receiving a signal to die
+    while not pipe.poll():
+        try:
+            batch = [request_queue.get(timeout=0.5)]
+        except Empty:
+            continue
+        deadline = time.perf_counter() + max_batch_wait
+        while len(batch) < max_batch_size:
+            try:
+                batch.append(request_queue.get(timeout=max(deadline - time.perf_counter(), 0.0001)))
+            except Empty:
+                break
+        # Group the requests by model
+        network_requests = {}
+        for camera_index, request_id in batch:
+            network = camera_networks[camera_index]
+            network_requests.setdefault(id(network), (network, []))[1].append((camera_index, request_id))
+        for network, requests in network_requests.values():
+            error = None
+            images = [cameras_channels[camera_index].image for camera_index, _ in requests]
+            try:
+                if len(images) > 1 and hasattr(network, "batch_inference"):
+                    results = network.batch_inference(images)
+                else:
+                    results = [network.inference(image) for image in images]
+            except Exception as e:
+                logger.error(e, exc_info=True)
+                error = str(e)
+                results = [None] * len(requests)
+            for (camera_index, request_id), result in zip(requests, results):
+                cameras_channels[camera_index].response_send_conn.send((request_id, result, network.fps, error))
+    logger.info(f"[{pid}] inference server stopped")
+
+
+class RemoteDetector:
+    """
+    Detector that runs the inference in the inference server process instead of loading its own copy of the model.
+    Exposes the same interface as the device detectors (name, fps and inference).
+
+    :param channel: The InferenceServerChannel of the camera.
+    :param name: The name of the model used by the camera.
+    """
+
+    def __init__(self, channel, name):
+        self.channel = channel
+        self.name = name
+        self.fps = None
+        self.request_id = 0
+
+    @property
+    def input_buffer(self):
+        """ The shared buffer read by the inference server, writing the image into it avoids an extra copy """
+        return self.channel.image
+
+    def inference(self, resized_rgb_image):
+        self.request_id += 1
+        if resized_rgb_image is not self.channel.image:
+            np.copyto(self.channel.image, resized_rgb_image)
+        self.channel.request_queue.put((self.channel.camera_index, self.request_id))
+        while True:
+            if not self.channel.response_recv_conn.poll(RESPONSE_TIMEOUT):
+                raise RuntimeError(f"The inference server didn't respond in {RESPONSE_TIMEOUT} seconds")
+            request_id, result, fps, error = self.channel.response_recv_conn.recv()
+            # Discard the responses of previous requests that timed out
+            if request_id == self.request_id:
+                break
+        if error is not None:
+            raise RuntimeError(f"Inference server error: {error}")
+        self.fps = fps
+        return result
@@ -0,0 +1,67 @@
+"""A set of function(s) that decode the raw outputs of the detection networks.
+
+The outputs are filtered with a single mask over all the boxes (instead of testing the class and score of each box)
+and only the selected boxes are converted into the detected objects returned by the detectors:
+[{"id": "<class_id>-<index>", "bbox": [ymin, xmin, ymax, xmax], "score": s}, {...}, ...]
+
+"""
+import numpy as np
+
+
+def detection_mask(labels, scores, class_id, score_threshold):
+    """ Returns a boolean array with True for the boxes of the class `class_id` with a score above the threshold """
+    return (np.asarray(labels) == class_id) & (np.asarray(scores) > score_threshold)
+
+
+def build_objects(indexes, boxes, scores, class_id, **fields):
+    """
+    Returns the detected objects of the boxes selected by `indexes`. The index of each box is kept in the object id.
+    Any extra `fields` are added (with the same value) to all the objects.
+    """
+    objects = []
+    for index, box, score in zip(indexes.tolist(), boxes[indexes].tolist(), scores[indexes].tolist()):
+        detected_object = {"id": f"{class_id}-{index}", "bbox": box, "score": score}
+        detected_object.update(fields)
+        objects.append(detected_object)
+    return objects
+
+
+def decode_detections(boxes, labels, scores, class_id, score_threshold, output_class_id=None, **fields):
+    """
+    Decodes the output of the network for an image.
+    Args:
+        boxes: (N, 4) array with the normalized boxes as [ymin, xmin, ymax, xmax]
+        labels: (N,) array with the class of each box
+        scores: (N,) array with the score of each box
+        class_id: the class of the detected objects
+        score_threshold: the minimum score of the detected objects
+        output_class_id: the class id of the returned objects (if it's different from the class of the network)
+
+    Returns:
+        result: a list with the detected objects
+    """
+    boxes, scores = np.asarray(boxes, dtype=float).reshape(-1, 4), np.asarray(scores, dtype=float).reshape(-1)
+    indexes = np.flatnonzero(detection_mask(np.asarray(labels).reshape(-1), scores, class_id, score_threshold))
+    return build_objects(indexes, boxes, scores, class_id if output_class_id is None else output_class_id, **fields)
+
+
+def decode_batch_detections(image_indexes, boxes, labels, scores, class_id, score_threshold, images_count,
+                            output_class_id=None, **fields):
+    """
+    Decodes the output of the networks that return the detections of all the images of a batch together (one row per
+    box, with the index of its image). The rows of the images beyond `images_count` (padding) are ignored and the row
+    of each box is kept in the object id.
+
+    Returns:
+        results: a list with the detected objects of each image
+    """
+    image_indexes = np.asarray(image_indexes).astype(int).reshape(-1)
+    boxes, scores = np.asarray(boxes, dtype=float).reshape(-1, 4), np.asarray(scores, dtype=float).reshape(-1)
+    mask = detection_mask(np.asarray(labels).reshape(-1), scores, class_id, score_threshold)
+    mask &= (image_indexes >= 0) & (image_indexes < images_count)
+    indexes = np.flatnonzero(mask)
+    output_class_id = class_id if output_class_id is None else output_class_id
+    return [
+        build_objects(indexes[image_indexes[indexes] == image_index], boxes, scores, output_class_id, **fields)
+        for image_index in range(images_count)
+    ]
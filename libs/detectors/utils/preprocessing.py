@@ -0,0 +1,62 @@
+"""A set of function(s) and classes that prepare the frames for the detection networks.
+
+Each model declares the exact geometry (size and channels order) of the images it receives, so the frames are
+resized once, straight to the input size of the network, and only converted from BGR when the model needs it.
+
+"""
+from collections import namedtuple
+
+import cv2 as cv
+import numpy as np
+
+InputGeometry = namedtuple("InputGeometry", ["size", "color"])
+
+# Input size (width, height) of the openvino person detection model
+OPENVINO_INPUT_SIZE = (544, 320)
+
+
+def get_input_geometry(device, model_name, variables):
+    """
+    Returns the InputGeometry of the images received by the model: the `ImageSize` (width, height) of the model and
+    RGB channels, except for the models that resize or reorder the images again before the forward pass.
+    """
+    width, height = [int(i) for i in variables["ImageSize"].split(",")][:2]
+    if device in ["x86", "x86-gpu"]:
+        if model_name == "openvino":
+            return InputGeometry(OPENVINO_INPUT_SIZE, "RGB")
+        elif model_name == "yolov3":
+            # The network receives the channels in BGR order
+            return InputGeometry((width, height), "BGR")
+    return InputGeometry((width, height), "RGB")
+
+
+class PreprocessingPlan:
+    """
+    Resizes the (BGR) frames of a camera to the input geometry of its detector, with a single resize and color
+    conversion written into buffers allocated once. The steps that aren't needed (the resize of the frames that
+    already have the input size or the conversion for the BGR models) are skipped.
+    The returned image is overwritten by the next call.
+
+    :param geometry: The InputGeometry of the detector.
+    """
+
+    def __init__(self, geometry):
+        self.size = tuple(geometry.size)
+        self.convert_color = geometry.color == "RGB"
+        width, height = self.size
+        self.resized_image = np.empty((height, width, 3), dtype=np.uint8)
+        self.converted_image = np.empty((height, width, 3), dtype=np.uint8) if self.convert_color else None
+
+    def run(self, cv_image, dst=None):
+        """
+        Returns the `cv_image` resized and converted for the detector.
+        If `dst` is given (e.g. a buffer shared with the detector) the result is written into it.
+        """
+        if cv_image.shape[1::-1] != self.size:
+            cv_image = cv.resize(cv_image, self.size, dst=self.resized_image)
+        if self.convert_color:
+            return cv.cvtColor(cv_image, cv.COLOR_BGR2RGB, dst=self.converted_image if dst is None else dst)
+        if dst is not None:
+            np.copyto(dst, cv_image)
+            return dst
+        return cv_image
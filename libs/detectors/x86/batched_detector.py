@@ -0,0 +1,52 @@
+import json
+import logging
+
+from threading import Lock
+
+from libs.utils.micro_batching import MicroBatcher
+
+logger = logging.getLogger(__name__)
+
+# Models whose implementation supports running a single forward pass over a batch of images
+BATCH_INFERENCE_MODELS = ["mobilenet_ssd_v2", "openvino", "yolov3"]
+
+# Detectors shared by all the cameras processed in the current process (one per model configuration)
+_batched_detectors = {}
+_batched_detectors_lock = Lock()
+
+
+def get_batched_detector(model_name, variables, net_factory, max_batch_size, max_wait_ms):
+    """
+    Returns the BatchedDetector shared by all the cameras of the process that use the same model configuration.
+    The network is only loaded (calling `net_factory`) the first time that the model configuration is requested.
+    """
+    key = (model_name, json.dumps(variables, sort_keys=True))
+    with _batched_detectors_lock:
+        if key not in _batched_detectors:
+            logger.info(f"Loading {model_name} for batched inference (max batch size: {max_batch_size})")
+            _batched_detectors[key] = BatchedDetector(net_factory(), max_batch_size, max_wait_ms)
+        return _batched_detectors[key]
+
+
+class BatchedDetector:
+    """
+    Wraps a network that implements `batch_inference` and exposes the same interface as the network.
+    The images received from different camera threads are grouped into micro-batches (up to `max_batch_size`
+    images or `max_wait_ms` of waiting) and processed with a single forward pass. Each camera thread receives only
+    the results of its own image.
+
+    :param net: A network instance with a `batch_inference` method and a `fps` attribute.
+    :param max_batch_size: The maximum number of images processed in a single forward pass.
+    :param max_wait_ms: The maximum time (in milliseconds) an image waits for other cameras to fill the batch.
+    """
+
+    def __init__(self, net, max_batch_size, max_wait_ms):
+        self.net = net
+        self.batcher = MicroBatcher(self.net.batch_inference, max_batch_size, max_wait_ms, name="BatchedDetector")
+
+    @property
+    def fps(self):
+        return self.net.fps
+
+    def inference(self, resized_rgb_image):
+        return self.batcher.submit(resized_rgb_image)
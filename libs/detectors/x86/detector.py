@@ -1,4 +1,5 @@
 from libs.detectors.utils.ml_model_functions import get_model_json_file_or_return_default_values
+from libs.detectors.x86.batched_detector import BATCH_INFERENCE_MODELS, get_batched_detector
 
 
 class Detector:
@@ -6,6 +7,8 @@ class Detector:
     Detector class is a high level class for detecting object using x86 devices.
     When an instance of the Detector is created you can call inference method and feed your
     input image in order to get the detection results.
+    If `MaxBatchSize` (Detector section) is greater than 1 and the model supports it, the network is shared by all
+    the cameras of the process and the images are processed in micro-batches.
 
     :param config: Is a ConfigEngine instance which provides necessary parameters.
     :param source: A string that represents the camera. Ex: "Source_1".
@@ -18,27 +21,44 @@ class Detector:
         model_data = get_model_json_file_or_return_default_values(self.config, device, camera_id)
 
         self.name = model_data["model_name"]
+        variables = model_data["variables"]
+        max_batch_size = int(self.config.get_section_dict("Detector").get("MaxBatchSize", 1))
+        max_batch_wait_ms = float(self.config.get_section_dict("Detector").get("MaxBatchWaitMs", 10))
 
-        if self.name == 'mobilenet_ssd_v2':
-            from libs.detectors.x86 import mobilenet_ssd
-            self.net = mobilenet_ssd.Detector(self.config, self.name, model_data["variables"])
-        elif self.name == "openvino":
-            from libs.detectors.x86 import openvino
-            self.net = openvino.Detector(self.config, self.name, model_data["variables"])
-        elif self.name == "openpifpaf":
-            from libs.detectors.x86 import openpifpaf
-            self.net = openpifpaf.Detector(self.config, self.name, model_data["variables"])
-        elif self.name == "openpifpaf_tensorrt":
-            from libs.detectors.x86.openpifpaf_tensorrt import openpifpaf_tensorrt
-            self.net = openpifpaf_tensorrt.Detector(self.config, self.name, model_data["variables"])
-        elif self.name == "yolov3":
-            from libs.detectors.x86 import yolov3
-            self.net = yolov3.Detector(self.config, self.name, model_data["variables"])
-
+        if max_batch_size > 1 and self.name in BATCH_INFERENCE_MODELS:
+            self.net = get_batched_detector(
+                self.name, variables, lambda: load_network(self.config, self.name, variables, max_batch_size),
+                max_batch_size, max_batch_wait_ms
+            )
         else:
-            raise ValueError('Not supported network named: ', self.name)
+            self.net = load_network(self.config, self.name, variables)
 
     def inference(self, resized_rgb_image):
         self.fps = self.net.fps
         output = self.net.inference(resized_rgb_image)
         return output
+
+
+def load_network(config, name, variables, batch_size=1):
+    """
+    Loads the x86 network named `name`.
+    `batch_size` is the maximum number of images that the network receives in a `batch_inference` call.
+    """
+    if name == 'mobilenet_ssd_v2':
+        from libs.detectors.x86 import mobilenet_ssd
+        return mobilenet_ssd.Detector(config, name, variables)
+    elif name == "openvino":
+        from libs.detectors.x86 import openvino
+        return openvino.Detector(config, name, variables, batch_size=batch_size)
+    elif name == "openpifpaf":
+        from libs.detectors.x86 import openpifpaf
+        return openpifpaf.Detector(config, name, variables)
+    elif name == "openpifpaf_tensorrt":
+        from libs.detectors.x86.openpifpaf_tensorrt import openpifpaf_tensorrt
+        return openpifpaf_tensorrt.Detector(config, name, variables)
+    elif name == "yolov3":
+        from libs.detectors.x86 import yolov3
+        return yolov3.Detector(config, name, variables)
+
+    else:
+        raise ValueError('Not supported network named: ', name)
@@ -5,6 +5,7 @@ import numpy as np
 
 import tensorflow as tf
 
+from libs.detectors.utils.decoding import decode_detections
 from libs.detectors.utils.fps_calculator import convert_infr_time_to_fps
 
 def load_model(model_name):
@@ -56,24 +57,33 @@ class Detector:
         Returns:
             result: a dictionary contains of [{"id": 0, "bbox": [x1, y1, x2, y2], "score":s%}, {...}, {...}, ...]
         """
-        input_image = np.expand_dims(resized_rgb_image, axis=0)
-        input_tensor = tf.convert_to_tensor(input_image)
+        return self.batch_inference([resized_rgb_image])[0]
+
+    def batch_inference(self, resized_rgb_images):
+        """
+        Runs a single forward pass over a batch of images.
+        Args:
+            resized_rgb_images: list of uint8 numpy arrays with shape (img_height, img_width, channels)
+
+        Returns:
+            results: a list with the result of each image, in the same format returned by `inference`
+        """
+        input_tensor = tf.convert_to_tensor(np.stack(resized_rgb_images))
         t_begin = time.perf_counter()
         output_dict = self.detection_model(input_tensor)
         inference_time = time.perf_counter() - t_begin  # Seconds
 
         # Calculate Frames rate (fps)
-        self.fps = convert_infr_time_to_fps(inference_time)
+        self.fps = convert_infr_time_to_fps(inference_time / len(resized_rgb_images))
 
-        boxes = output_dict['detection_boxes']
-        labels = output_dict['detection_classes']
-        scores = output_dict['detection_scores']
+        # A single host copy of each output, decoded with a mask over all the boxes of each image
+        boxes = output_dict['detection_boxes'].numpy()
+        labels = output_dict['detection_classes'].numpy()
+        scores = output_dict['detection_scores'].numpy()
 
         class_id = int(self.model_variables['ClassID'])
         score_threshold = float(self.model_variables['MinScore'])
-        result = []
-        for i in range(boxes.shape[1]):  # number of boxes
-            if labels[0, i] == class_id and scores[0, i] > score_threshold:
-                result.append({"id": str(class_id) + '-' + str(i), "bbox": boxes[0, i, :].numpy(), "score": scores[0, i]})
-
-        return result
+        return [
+            decode_detections(boxes[batch_index], labels[batch_index], scores[batch_index], class_id, score_threshold)
+            for batch_index in range(boxes.shape[0])
+        ]
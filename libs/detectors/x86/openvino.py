@@ -4,7 +4,9 @@ import numpy as np
 
 import cv2 as cv
 
+from libs.detectors.utils.decoding import decode_batch_detections
 from libs.detectors.utils.fps_calculator import convert_infr_time_to_fps
+from libs.detectors.utils.preprocessing import OPENVINO_INPUT_SIZE
 
 from openvino.inference_engine import IECore
 
@@ -18,9 +20,10 @@ class Detector:
     :param config: Is a ConfigEngine instance which provides necessary parameters.
     :model_name: Name of the ML model.
     :variables: A dict with all the variables needed for the ML model.
+    :batch_size: The batch size of the loaded network. Smaller batches are padded with empty images.
     """
 
-    def __init__(self, config, model_name, variables):
+    def __init__(self, config, model_name, variables, batch_size=1):
         self.config = config
         self.model_name = model_name
         self.model_variables = variables
@@ -35,7 +38,13 @@ class Detector:
             weights='{}/person-detection-retail-0013.bin'.format(model_path)
         )
         self.input_layer = next(iter(network.inputs))
+        self.batch_size = batch_size
+        network.batch_size = self.batch_size
         self.detection_model = core.load_network(network=network, device_name='CPU')
+        # Input of the network, the images of smaller batches are padded with the previous content (the results of
+        # the padding images are discarded)
+        input_width, input_height = OPENVINO_INPUT_SIZE
+        self.input_images = np.zeros((self.batch_size, 3, input_height, input_width), dtype=np.uint8)
 
     def inference(self, resized_rgb_image):
         """
@@ -48,29 +57,43 @@ class Detector:
             result: a dictionary contains of [{"id": 0, "bbox": [x1, y1, x2, y2], "score":s%}, {...}, {...}, ...]
         """
 
-        required_image_size = (544, 320)
+        return self.batch_inference([resized_rgb_image])[0]
 
-        input_image = cv.resize(resized_rgb_image, required_image_size)
-        input_image = input_image.transpose(2, 0, 1)
-        input_image = np.expand_dims(input_image, axis=0)
+    def batch_inference(self, resized_rgb_images):
+        """
+        Runs a single forward pass over a batch of at most `batch_size` images.
+        Args:
+            resized_rgb_images: list of uint8 numpy arrays with shape (img_height, img_width, channels)
+
+        Returns:
+            results: a list with the result of each image, in the same format returned by `inference`
+        """
+        for index, resized_rgb_image in enumerate(resized_rgb_images):
+            # The images are usually prepared with the input size of the network (see get_input_geometry)
+            if resized_rgb_image.shape[1::-1] != OPENVINO_INPUT_SIZE:
+                resized_rgb_image = cv.resize(resized_rgb_image, OPENVINO_INPUT_SIZE)
+            self.input_images[index] = resized_rgb_image.transpose(2, 0, 1)
 
         t_begin = time.perf_counter()
         output = self.detection_model.infer(
-            inputs={self.input_layer: input_image}
+            inputs={self.input_layer: self.input_images}
         )['detection_out']
         inference_time = time.perf_counter() - t_begin  # Seconds
 
         # Calculate Frames rate (fps)
-        self.fps = convert_infr_time_to_fps(inference_time)
+        self.fps = convert_infr_time_to_fps(inference_time / len(resized_rgb_images))
 
         class_id = int(self.model_variables['ClassID'])
         score_threshold = float(self.model_variables['MinScore'])
-        result = []
-
-        for i, (_, label, score, x_min, y_min, x_max, y_max) in enumerate(output[0][0]):
-            box = [y_min, x_min, y_max, x_max]
-            if label == class_id and score > score_threshold:
-                result.append({"id": str(class_id) + '-' + str(i), "bbox": box, "score": score})
-
-        return result
 
+        # The detections of all the images are returned together, each row is
+        # [image_id, label, score, x_min, y_min, x_max, y_max]
+        detections = output[0][0]
+        # The end of the detections is marked with image_id = -1
+        end = np.flatnonzero(detections[:, 0] < 0)
+        if len(end):
+            detections = detections[:end[0]]
+        return decode_batch_detections(
+            detections[:, 0], detections[:, [4, 3, 6, 5]], detections[:, 1], detections[:, 2], class_id,
+            score_threshold, len(resized_rgb_images)
+        )
@@ -5,7 +5,9 @@ from torch.autograd import Variable
 from libs.detectors.x86.yolov3_backbone.util import *
 from libs.detectors.x86.yolov3_backbone.darknet import Darknet
 import os
+import numpy as np
 import wget
+from libs.detectors.utils.decoding import decode_batch_detections
 from libs.detectors.utils.fps_calculator import convert_infr_time_to_fps
 
 
@@ -58,20 +60,31 @@ class Detector:
     @staticmethod
     def prep_image(img, inp_dim):
         """
-        Prepare image for inputting to the neural network.
+        Prepare image (with the channels in BGR order) for inputting to the neural network.
+        The images that already have the input size of the network (see get_input_geometry) aren't letterboxed.
 
         Returns a Variable
         """
 
         orig_im = img
         dim = orig_im.shape[1], orig_im.shape[0]
-        img = (letterbox_image(orig_im, (inp_dim, inp_dim)))
-        img_ = img[:, :, ::-1].transpose((2, 0, 1)).copy()
+        if dim != (inp_dim, inp_dim):
+            img = (letterbox_image(orig_im, (inp_dim, inp_dim)))
+        img_ = img.transpose((2, 0, 1)).copy()
         img_ = torch.from_numpy(img_).float().div(255.0).unsqueeze(0)
         return img_, orig_im, dim
 
-    def inference(self, resized_rgb_image):
-        img, orig_im, dim = self.prep_image(resized_rgb_image, self._inp_dim)
+    def inference(self, resized_bgr_image):
+        return self.batch_inference([resized_bgr_image])[0]
+
+    def batch_inference(self, resized_bgr_images):
+        """
+        Runs a single forward pass over a batch of images (in BGR order) with the same shape.
+        Returns a list with the detections of each image, in the same format returned by `inference`.
+        """
+        prepared_images = [self.prep_image(resized_bgr_image, self._inp_dim) for resized_bgr_image in resized_bgr_images]
+        img = torch.cat([prepared_image[0] for prepared_image in prepared_images])
+        dim = prepared_images[0][2]
         im_dim = torch.FloatTensor(dim).repeat(1, 2)
 
         if self._CUDA:
@@ -84,26 +97,28 @@ class Detector:
             output = self._model(Variable(img), self._CUDA)
         output = write_results(output, self.confidence, self._num_classes, nms=True, nms_conf=self.nms_threshold)
         inference_time = time.perf_counter() - t_begin
-        self.fps = convert_infr_time_to_fps(inference_time)
+        self.fps = convert_infr_time_to_fps(inference_time / len(resized_bgr_images))
+
+        results = [[] for _ in resized_bgr_images]
+        if isinstance(output, int) or output.size(0) == 0:
+            # Nothing was detected
+            return results
 
         im_dim = im_dim.repeat(output.size(0), 1)
         scaling_factor = torch.min(self._inp_dim / im_dim, 1)[0].view(-1, 1)
         output[:, [1, 3]] -= (self._inp_dim - scaling_factor * im_dim[:, 0].view(-1, 1)) / 2
         output[:, [2, 4]] -= (self._inp_dim - scaling_factor * im_dim[:, 1].view(-1, 1)) / 2
         output[:, 1:5] /= scaling_factor
-        for i in range(output.shape[0]):
-            output[i, [1, 3]] = torch.clamp(output[i, [1, 3]], 0.0, im_dim[i, 0])
-            output[i, [2, 4]] = torch.clamp(output[i, [2, 4]], 0.0, im_dim[i, 1])
-
-        result = []
-        for i, pred in enumerate(output):
-            c1 = pred[1:3].cpu().int().numpy()  # unormalized [xmin, ymin]
-            c2 = pred[3:5].cpu().int().numpy()  # unormalized [xmax, ymax]
-            cls = int(pred[-1].cpu())
-            score = float(pred[5].cpu())
-            if cls == 0:  # person class index is '0' at coco dataset
-                bbox_dict = {"id": "1-" + str(i),
-                             "bbox": [c1[1] / self.h, c1[0] / self.w, c2[1] / self.h, c2[0] / self.w], "score": score,
-                             "face": None}
-                result.append(bbox_dict)
-        return result
+        # All the images of the batch have the same shape
+        output[:, [1, 3]] = torch.clamp(output[:, [1, 3]], 0.0, float(dim[0]))
+        output[:, [2, 4]] = torch.clamp(output[:, [2, 4]], 0.0, float(dim[1]))
+
+        # A single host copy, each row is [image_index, xmin, ymin, xmax, ymax, score, class_score, class]
+        output = output.cpu().numpy()
+        corners = output[:, 1:5].astype(np.int32)  # unormalized [xmin, ymin, xmax, ymax]
+        boxes = corners[:, [1, 0, 3, 2]] / np.array([self.h, self.w, self.h, self.w], dtype=float)
+        # person class index is '0' at coco dataset
+        return decode_batch_detections(
+            output[:, 0], boxes, output[:, -1], output[:, 5], 0, -np.inf, len(resized_bgr_images), output_class_id=1,
+            face=None
+        )
@@ -167,6 +167,9 @@ def write_results(prediction, confidence, num_classes, nms=True, nms_conf=0.4):
                 out = torch.cat(seq, 1)
                 output = torch.cat((output, out))
 
+    if not write:
+        # Nothing was detected in the batch
+        return prediction.new(0, 8)
     return output
 
 
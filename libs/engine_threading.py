@@ -8,13 +8,15 @@ from datetime import datetime
 from shutil import rmtree
 from threading import Thread
 from libs.cv_engine import CvEngine
+from libs.detectors.inference_server import set_inference_server_channels
 
 logger = logging.getLogger(__name__)
 
 
-def run_video_processing(config, pipe, sources, historical_data_mode: bool = False):
+def run_video_processing(config, pipe, sources, historical_data_mode: bool = False, inference_server_channels=None):
     pid = os.getpid()
     logger.info(f"[{pid}] taking on {len(sources)} cameras")
+    set_inference_server_channels(inference_server_channels or {})
     threads = []
     for src in sources:
         engine = EngineThread(config, src)
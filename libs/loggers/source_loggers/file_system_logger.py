@@ -1,14 +1,19 @@
-import csv
 import logging
 import os
 import time
 
 import cv2 as cv
-from datetime import date
+
+from libs.utils.columnar_log import ColumnarLogWriter
+from libs.utils.rotating_csv_writer import RotatingCsvWriter
+from libs.utils.utils import config_to_boolean
+from tools.environment_score import mx_environment_scoring_consider_crowd
 
 from .raw_data_logger import RawDataLogger
 
 logger = logging.getLogger(__name__)
+OBJECTS_LOG_HEADERS = ["Version", "Timestamp", "DetectedObjects", "ViolatingObjects",
+                       "EnvironmentScore", "Detections", "ViolationsIndexes"]
 
 
 class FileSystemLogger(RawDataLogger):
@@ -18,10 +23,22 @@ class FileSystemLogger(RawDataLogger):
         self.log_directory = config.get_section_dict(logger)["LogDirectory"]
         self.objects_log_directory = os.path.join(self.log_directory, self.camera_id, "objects_log")
         os.makedirs(self.objects_log_directory, exist_ok=True)
+        # The file of the current day is kept open and the rows are written in batches
+        logger_section = config.get_section_dict(logger)
+        flush_rows = int(logger_section.get("FlushRows", 100))
+        flush_interval = float(logger_section.get("FlushInterval", 5))
+        fsync = config_to_boolean(logger_section.get("Fsync", "False"))
+        self.objects_log_writer = RotatingCsvWriter(
+            self.objects_log_directory, OBJECTS_LOG_HEADERS, flush_rows, flush_interval, fsync)
+        # Also store the rows in the columnar format (read by the hourly metrics without parsing each row)
+        self.columnar_log_writer = None
+        if config_to_boolean(logger_section.get("ColumnarLog", "False")):
+            self.columnar_log_writer = ColumnarLogWriter(self.objects_log_directory, flush_rows, flush_interval, fsync)
 
         # config.ini uses minutes as the unit for ScreenshotPeriod
         self.screenshot_period = float(self.config.get_section_dict(logger)["ScreenshotPeriod"]) * 60
         self.last_screeenshot_time = time.time()
+        self.uses_frame = self.screenshot_period > 0
         self.screenshot_path = os.path.join(self.config.get_section_dict(logger)["ScreenshotsDirectory"], self.camera_id)
         if not os.path.exists(self.screenshot_path):
             os.makedirs(self.screenshot_path)
@@ -32,20 +49,18 @@ class FileSystemLogger(RawDataLogger):
 
     def log_objects(self, objects, violating_objects, violating_objects_index_list, violating_objects_count,
                     detected_objects_cout, environment_score, time_stamp, version):
-        
-        file_name = time_stamp[0: 10]
-        file_path = os.path.join(self.objects_log_directory, file_name + ".csv")
-        file_exists = os.path.isfile(file_path)
-        with open(file_path, "a") as csvfile:
-            headers = ["Version", "Timestamp", "DetectedObjects", "ViolatingObjects",
-                       "EnvironmentScore", "Detections", 'ViolationsIndexes']
-            writer = csv.DictWriter(csvfile, fieldnames=headers)
-            if not file_exists:
-                writer.writeheader()
-            writer.writerow(
-                {"Version": version, "Timestamp": time_stamp, "DetectedObjects": detected_objects_cout,
-                 "ViolatingObjects": violating_objects_count, "EnvironmentScore": environment_score,
-                 "Detections": str(objects), "ViolationsIndexes": str(violating_objects_index_list)})
+        # The rows go to the file of the day of their timestamp
+        self.objects_log_writer.writerow(
+            time_stamp[0: 10],
+            {"Version": version, "Timestamp": time_stamp, "DetectedObjects": detected_objects_cout,
+             "ViolatingObjects": violating_objects_count, "EnvironmentScore": environment_score,
+             "Detections": str(objects), "ViolationsIndexes": str(violating_objects_index_list)})
+
+    def log_detections(self, detections, violating_objects, log_time):
+        super().log_detections(detections, violating_objects, log_time)
+        if self.columnar_log_writer is not None:
+            environment_score = mx_environment_scoring_consider_crowd(len(detections), len(violating_objects))
+            self.columnar_log_writer.writerow(log_time, detections, violating_objects, environment_score)
 
     def update(self, cv_image, objects, post_processing_data, fps, log_time):
         # Save a screenshot only if the period is greater than 0, and the minimum period has occured
@@ -53,3 +68,8 @@ class FileSystemLogger(RawDataLogger):
             self.last_screeenshot_time = time.time()
             self.save_screenshot(cv_image)
         super().update(cv_image, objects, post_processing_data, fps, log_time)
+
+    def stop_logging(self):
+        self.objects_log_writer.close()
+        if self.columnar_log_writer is not None:
+            self.columnar_log_writer.close()
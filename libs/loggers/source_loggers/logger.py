@@ -1,7 +1,14 @@
+from libs.utils.utils import config_to_boolean
+
+from .logger_dispatcher import LoggerDispatcher
+
+
 class Logger:
 
     def __init__(self, config, source: str, logger: str):
-        logger_name = config.get_section_dict(logger)["Name"]
+        logger_section = config.get_section_dict(logger)
+        logger_name = logger_section["Name"]
+        self.name = logger_name
         self.logger = None
         if logger_name == "video_logger":
             from .video_logger import VideoLogger
@@ -17,12 +24,40 @@ class Logger:
             self.logger = WebHookLogger(config, source, logger)
         else:
             raise ValueError('Not supported logger named: ', logger_name)
+        # Run the updates of the logger in its own thread, so a slow logger doesn't stall the processing
+        self.dispatcher = None
+        if config_to_boolean(logger_section.get("Async", "False")):
+            self.dispatcher = LoggerDispatcher(
+                self._update,
+                f"{logger_name}-{config.get_section_dict(source)['Id']}",
+                queue_size=int(logger_section.get("QueueSize", 10)),
+                overflow_policy=logger_section.get("OverflowPolicy", "drop_oldest"),
+                copy_frame=getattr(self.logger, "uses_frame", True)
+            )
+
+    @property
+    def is_async(self):
+        return self.dispatcher is not None
+
+    def update(self, cv_image, detections, post_processing_data, fps, log_time):
+        if self.dispatcher is not None:
+            self.dispatcher.submit(cv_image, detections, post_processing_data, fps, log_time)
+        else:
+            self._update(cv_image, detections, post_processing_data, fps, log_time)
 
-    def update(self, cv_image, objects, post_processing_data, fps, log_time):
-        self.logger.update(cv_image, objects, post_processing_data, fps, log_time)
+    def _update(self, cv_image, detections, post_processing_data, fps, log_time):
+        if not getattr(self.logger, "accepts_detection_batch", False):
+            # Loggers that work with the list of objects of each frame
+            detections = detections.to_objects()
+        self.logger.update(cv_image, detections, post_processing_data, fps, log_time)
 
     def start_logging(self, fps):
         self.logger.start_logging(fps)
+        if self.dispatcher is not None:
+            self.dispatcher.start()
 
     def stop_logging(self):
+        if self.dispatcher is not None:
+            # The pending updates are processed before stopping the logger
+            self.dispatcher.stop()
         self.logger.stop_logging()
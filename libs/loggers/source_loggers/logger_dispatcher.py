@@ -0,0 +1,125 @@
+import logging
+import time
+
+from collections import deque
+from threading import Condition, Thread
+
+logger = logging.getLogger(__name__)
+
+# Overflow policies, applied when an update arrives and the queue of the logger is full
+# The oldest pending update is discarded
+DROP_OLDEST = "drop_oldest"
+# The frame loop waits until the logger processes an update
+BLOCK = "block"
+# The pending updates are discarded, only the newest one is kept
+COALESCE = "coalesce"
+OVERFLOW_POLICIES = [DROP_OLDEST, BLOCK, COALESCE]
+# Maximum number of latencies kept until they are read (only the newest ones are kept if nobody reads them)
+MAX_RECORDED_LATENCIES = 1000
+
+
+def snapshot_update(cv_image, detections, post_processing_data, copy_frame=True):
+    """
+    Returns copies of the arguments of a logger update that aren't modified by the processing of the next frames:
+    the frame (it can be a reused buffer), the detections and the tracks (views of the tracker state).
+    """
+    post_processing_data = dict(post_processing_data)
+    if "tracks" in post_processing_data:
+        post_processing_data["tracks"] = [
+            track.snapshot() if hasattr(track, "snapshot") else track for track in post_processing_data["tracks"]
+        ]
+    return (cv_image.copy() if copy_frame else None), detections.copy(), post_processing_data
+
+
+class LoggerDispatcher:
+    """
+    Runs the updates of a logger in a dedicated worker thread, so slow loggers (I/O, encoding, network) don't stall
+    the processing of the frames. The updates wait in a bounded queue of `queue_size` updates, when it's full the
+    `overflow_policy` decides what happens with the new update (see OVERFLOW_POLICIES).
+    The queue depth and the latency of the updates (from the submit to the end of the update) are recorded for the
+    performance log (only the latest MAX_RECORDED_LATENCIES latencies are kept between reads).
+
+    :param update_function: The function that runs the update of the logger (receives the arguments of `submit`).
+    :param name: A name used to identify the worker thread.
+    :param queue_size: The maximum number of pending updates.
+    :param overflow_policy: One of OVERFLOW_POLICIES.
+    :param copy_frame: False for the loggers that don't use the frame (it isn't copied and they receive None).
+    """
+
+    def __init__(self, update_function, name, queue_size=10, overflow_policy=DROP_OLDEST, copy_frame=True):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Not supported logger overflow policy: {overflow_policy}")
+        self.update_function = update_function
+        self.name = name
+        self.queue_size = max(1, int(queue_size))
+        self.overflow_policy = overflow_policy
+        self.copy_frame = copy_frame
+        self.pending_updates = deque()
+        self.condition = Condition()
+        self.running = False
+        self.worker = None
+        self.latencies = deque(maxlen=MAX_RECORDED_LATENCIES)
+        self.dropped_updates = 0
+
+    def start(self):
+        self.running = True
+        self.worker = Thread(target=self._process_updates, name=self.name, daemon=True)
+        self.worker.start()
+
+    def stop(self):
+        """ Waits until the pending updates are processed and stops the worker """
+        if self.worker is None:
+            return
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        self.worker.join()
+        self.worker = None
+
+    def submit(self, cv_image, detections, post_processing_data, fps, log_time):
+        """ Enqueues a snapshot of the update, applying the overflow policy if the queue is full """
+        cv_image, detections, post_processing_data = snapshot_update(
+            cv_image, detections, post_processing_data, self.copy_frame)
+        update = (time.perf_counter(), (cv_image, detections, post_processing_data, fps, log_time))
+        with self.condition:
+            if len(self.pending_updates) >= self.queue_size:
+                if self.overflow_policy == BLOCK:
+                    while len(self.pending_updates) >= self.queue_size and self.running:
+                        self.condition.wait()
+                elif self.overflow_policy == DROP_OLDEST:
+                    self.pending_updates.popleft()
+                    self.dropped_updates += 1
+                else:
+                    self.dropped_updates += len(self.pending_updates)
+                    self.pending_updates.clear()
+            self.pending_updates.append(update)
+            self.condition.notify_all()
+
+    def queue_depth(self):
+        return len(self.pending_updates)
+
+    def pop_stats(self):
+        """ Returns the latencies (in seconds) of the updates processed and the updates dropped since the last call """
+        with self.condition:
+            latencies, dropped_updates = list(self.latencies), self.dropped_updates
+            self.latencies.clear()
+            self.dropped_updates = 0
+        return latencies, dropped_updates
+
+    def _process_updates(self):
+        while True:
+            with self.condition:
+                while not self.pending_updates and self.running:
+                    self.condition.wait()
+                if not self.pending_updates:
+                    # Stopped and all the updates were processed
+                    return
+                submit_time, update = self.pending_updates.popleft()
+                # Wake up the submits blocked by a full queue
+                self.condition.notify_all()
+            try:
+                self.update_function(*update)
+            except Exception as e:
+                logger.error(f"{self.name} failed to process an update: {e}", exc_info=True)
+            with self.condition:
+                self.latencies.append(time.perf_counter() - submit_time)
@@ -11,6 +11,9 @@ logger = logging.getLogger(__name__)
 
 
 class RawDataLogger:
+    accepts_detection_batch = True
+    # The frames aren't logged (they aren't copied for the asynchronous updates)
+    uses_frame = False
 
     def __init__(self, config, source: str, logger: str):
         self.config = config
@@ -29,14 +32,19 @@ class RawDataLogger:
             log_time = now.strftime("%Y-%m-%d %H:%M:%S")
             if time.time() - self.submited_time < self.time_interval:
                 return
+        self.log_detections(objects, violating_objects, log_time)
+        self.submited_time = time.time()
+
+    def log_detections(self, detections, violating_objects, log_time):
+        """ Logs the objects (DetectionBatch) of a frame and the pairs of objects that violate the social distancing """
         # Process objects
-        objects_formated = self.format_objects(objects)
+        objects_formated = self.format_objects(detections)
         # Get unique objects that are in close contact
         violating_objects_index_list = list(set(itertools.chain(*violating_objects)))
         # Get the number of violating objects (people)
         violating_objects_count = len(violating_objects)
         # Get the number of detected objects (people)
-        detected_objects_count = len(objects)
+        detected_objects_count = len(detections)
         # Get environment score
         environment_score = mx_environment_scoring_consider_crowd(detected_objects_count, violating_objects_count)
         self.log_objects(
@@ -49,24 +57,26 @@ class RawDataLogger:
             log_time,
             version=LOG_FORMAT_VERSION
         )
-        self.submited_time = time.time()
 
-    def format_objects(self, objects_list):
+    def format_objects(self, detections):
         """ Format the attributes of the objects in a way ready to be saved
 
             Args:
-                objects_list: a list of dictionary where each dictionary stores information of an object (person) in a frame.
+                detections: the DetectionBatch with the information of the objects (people) in a frame.
         """
+        face_labels = [-1] * len(detections) if detections.face_labels is None else detections.face_labels.tolist()
         objects = []
-        for obj_dict in objects_list:
+        columns = zip(detections.bboxes_real.tolist(), detections.bboxes.tolist(), detections.class_ids.tolist(),
+                      detections.track_ids.tolist(), face_labels)
+        for i, (bbox_real, bbox, class_id, track_id, face_label) in enumerate(columns):
             obj = {}
             # TODO: Get 3D position of objects
             obj["position"] = [0.0, 0.0, 0.0]
-            obj["bbox_real"] = obj_dict["bboxReal"]
-            obj["bbox"] = obj_dict["bbox"]
-            obj["tracking_id"] = obj_dict.get("tracked_id", obj_dict["id"])
-            if "face_label" in obj_dict and obj_dict["face_label"] != -1:
-                obj["face_label"] = obj_dict["face_label"]
+            obj["bbox_real"] = bbox_real
+            obj["bbox"] = bbox
+            obj["tracking_id"] = track_id if track_id >= 0 else f"{class_id}-{i}"
+            if face_label != -1:
+                obj["face_label"] = face_label
             # TODO: Add more optional parameters
             objects.append(obj)
         return objects
@@ -3,6 +3,7 @@ from libs.uploaders.s3_uploader import S3Uploader
 
 
 class S3Logger:
+    accepts_detection_batch = True
 
     def __init__(self, config, source: str, logger: str):
         self.config = config
@@ -5,10 +5,17 @@ import shutil
 
 from libs.detectors.utils.ml_model_functions import get_model_json_file_or_return_default_values
 from libs.utils import visualization_utils
+from libs.utils.roi_mask import get_roi_mask
+from libs.utils.camera_calibration import get_camera_calibration_path, get_ground_plane_lookup_path, GroundPlaneLookup
+from libs.utils.utils import config_to_boolean
 from libs.source_post_processors.objects_filtering import ObjectsFilteringPostProcessor
 
+# Number of centroids drawn for each track
+TRACK_TRAIL_LENGTH = 50
+
 
 class VideoLogger:
+    accepts_detection_batch = True
 
     def __init__(self, config, source: str, logger: str):
         self.config = config
@@ -19,11 +26,27 @@ class VideoLogger:
         self.out_birdseye = None
         self.live_feed_enabled = self.config.get_boolean(source, "LiveFeedEnabled")
         self.track_hist = dict()
+        # Trails of the removed tracks, reused by the new ones
+        self.free_track_trails = []
         self.roi_file_path = ObjectsFilteringPostProcessor.get_roi_file_path(self.camera_id, self.config)
+        self.ground_plane_lookup = None
+        self.ground_plane_bounds = None
+
+    def load_ground_plane_lookup(self):
+        """ Loads the ground plane lookup table of the calibrated cameras (if it's enabled) for the bird's-eye view """
+        if not config_to_boolean(self.config.get_section_dict("App").get("GroundPlaneLookup", "False")):
+            return
+        calibration_file = get_camera_calibration_path(self.config, self.camera_id)
+        if not os.path.isfile(calibration_file):
+            return
+        self.ground_plane_lookup = GroundPlaneLookup.load(
+            calibration_file, get_ground_plane_lookup_path(self.config, self.camera_id, self.resolution), self.resolution)
+        self.ground_plane_bounds = self.ground_plane_lookup.world_bounds()
 
     def start_logging(self, fps):
         if not self.live_feed_enabled:
             return
+        self.load_ground_plane_lookup()
         self.out, self.out_birdseye = (
             self.gstreamer_writer(feed, fps, resolution)
             for (feed, resolution) in (
@@ -87,11 +110,11 @@ class VideoLogger:
             raise RuntimeError("Could not open gstreamer output for " + feed_name)
         return out
 
-    def update(self, cv_image, objects, post_processing_data, fps, log_time):
+    def update(self, cv_image, detections, post_processing_data, fps, log_time):
         if not self.live_feed_enabled:
             return
         self.update_history(post_processing_data["tracks"])
-        distancings = post_processing_data.get("distances", [])
+        min_distances = post_processing_data.get("min_distances", [])
         dist_threshold = post_processing_data.get("dist_threshold", 0)
 
         birds_eye_window = np.zeros(self.birds_eye_resolution[::-1] + (3,), dtype="uint8")
@@ -102,12 +125,12 @@ class VideoLogger:
                 self.camera_id
             )["variables"]["ClassID"]
         )
-        roi_contour = ObjectsFilteringPostProcessor.get_roi_contour(self.roi_file_path)
-        if roi_contour is not None:
+        roi_mask = get_roi_mask(self.roi_file_path, self.resolution)
+        if roi_mask is not None:
             color = (41, 127, 255)  # #ff7f29 (255, 127, 41)
-            visualization_utils.draw_contour(cv_image, roi_contour, color)
+            visualization_utils.draw_contour(cv_image, roi_mask.contour, color)
 
-        output_dict = visualization_utils.visualization_preparation(objects, distancings, dist_threshold)
+        output_dict = visualization_utils.visualization_preparation(detections, min_distances, dist_threshold)
         category_index = {class_id: {
             "id": class_id,
             "name": "Pedestrian",
@@ -118,8 +141,9 @@ class VideoLogger:
             -1: "N/A",
         }
         # Assign object's color to corresponding track history
-        for i, track_id in enumerate(output_dict["track_ids"]):
-            self.track_hist[track_id][1].append(output_dict["detection_colors"][i])
+        for track_id, color in zip(output_dict["track_ids"], output_dict["detection_colors"]):
+            if track_id in self.track_hist:
+                self.track_hist[track_id].set_color(color)
         # Draw bounding boxes and other visualization factors on input_frame
         visualization_utils.visualize_boxes_and_labels_on_image_array(
             cv_image,
@@ -135,14 +159,20 @@ class VideoLogger:
             face_labels=output_dict["face_labels"],
             face_index=face_index
         )
-        # TODO: Implement perspective view for objects
+        world_points = None
+        if self.ground_plane_bounds is not None and len(output_dict["detection_boxes"]):
+            # Center of the bottom line of the boxes
+            boxes = output_dict["detection_boxes"]
+            floor_points = np.stack([(boxes[:, 0] + boxes[:, 2]) / 2, boxes[:, 3]], axis=1) * self.resolution
+            world_points = self.ground_plane_lookup.world_points(floor_points)
         birds_eye_window = visualization_utils.birds_eye_view(
-            birds_eye_window, output_dict["detection_boxes"], output_dict["violating_objects"])
+            birds_eye_window, output_dict["detection_boxes"], output_dict["violating_objects"],
+            world_points=world_points, world_bounds=self.ground_plane_bounds)
 
         # Put occupancy to the frame
         # region
         # -_- -_- -_- -_- -_- -_- -_- -_- -_- -_- -_- -_- -_- -_-
-        txt_fps = 'Occupancy = ' + str(len(objects))
+        txt_fps = 'Occupancy = ' + str(len(detections))
         # (0, 0) is the top-left (x,y); normalized number between 0-1
         origin = (0.05, 0.93)
         visualization_utils.text_putter(cv_image, txt_fps, origin)
@@ -163,16 +193,18 @@ class VideoLogger:
         """
         This method updates self.track_hist with new tracks
         """
-        _new_track_hist = dict()
-        prev_track_ids = list(self.track_hist.keys())
+        current_track_ids = set()
         for track in tracks:
             track_id = track[1]
-            if track_id in prev_track_ids:
-                prev_centroids = self.track_hist[track_id][0]
-                prev_colors = self.track_hist[track_id][1]
-                _new_track_hist[track_id] = (np.concatenate((prev_centroids, track[3][None, ...]), axis=0), prev_colors)
-                if len(_new_track_hist[track_id][0]) > 50:
-                    _new_track_hist[track_id] = (_new_track_hist[track_id][0][1:, :], _new_track_hist[track_id][1][1:])
-            else:
-                _new_track_hist[track_id] = (track[3][None, ...], [])
-        self.track_hist = _new_track_hist
+            current_track_ids.add(track_id)
+            track_trail = self.track_hist.get(track_id)
+            if track_trail is None:
+                if self.free_track_trails:
+                    track_trail = self.free_track_trails.pop()
+                    track_trail.reset()
+                else:
+                    track_trail = visualization_utils.TrackTrail(TRACK_TRAIL_LENGTH)
+                self.track_hist[track_id] = track_trail
+            track_trail.append(track[3])
+        for track_id in [track_id for track_id in self.track_hist if track_id not in current_track_ids]:
+            self.free_track_trails.append(self.track_hist.pop(track_id))
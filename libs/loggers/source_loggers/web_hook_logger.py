@@ -1,13 +1,11 @@
 import logging
 import os
-import requests
 import time
 
-from json.decoder import JSONDecodeError
-from requests.exceptions import ConnectionError
-from starlette import status
+from libs.utils.utils import config_to_boolean
 
 from .raw_data_logger import RawDataLogger
+from .web_hook_sender import WebHookSender
 
 logger = logging.getLogger(__name__)
 
@@ -16,11 +14,27 @@ class WebHookLogger(RawDataLogger):
 
     def __init__(self, config, source: str, logger: str):
         super().__init__(config, source, logger)
-        self.web_hook_endpoint = config.get_section_dict(logger)["Endpoint"]
-        self.web_hook_authorization = config.get_section_dict(logger)["Authorization"]
-        self.sending_interval = float(self.config.get_section_dict(logger)["SendingInterval"])  # Seconds
+        logger_section = config.get_section_dict(logger)
+        self.web_hook_endpoint = logger_section["Endpoint"]
+        self.web_hook_authorization = logger_section["Authorization"]
+        self.sending_interval = float(logger_section["SendingInterval"])  # Seconds
         self.sent_time = 0
         self.pending_requests = []
+        self.sender = None
+        if self.web_hook_endpoint:
+            # The requests are sent (and retried) in background, the batches that can't be sent are spooled
+            spool_directory = logger_section.get("SpoolDirectory", "/repo/data/processor/static/data/web_hook_spool")
+            self.sender = WebHookSender(
+                self.web_hook_endpoint,
+                self.camera_id,
+                self.web_hook_authorization,
+                os.path.join(spool_directory, f"{self.camera_id}.jsonl"),
+                float(logger_section.get("MaxSpoolSize", 50)) * 1024 * 1024,  # MB
+                timeout=float(logger_section.get("RequestTimeout", 5)),
+                max_retries=int(logger_section.get("MaxRetries", 3)),
+                max_backoff=float(logger_section.get("MaxBackoff", 60)),
+                compress=config_to_boolean(logger_section.get("Compression", "False"))
+            )
 
     def _process_object(self, object):
         return {
@@ -42,35 +56,24 @@ class WebHookLogger(RawDataLogger):
             "violations_indexes": [int(v) for v in violating_objects_index_list],
             "timezone": os.environ.get("TZ", "UTC")
         }
-        headers = {"content-type": "application/json"}
-        if self.web_hook_authorization:
-            headers["Authorization"] = self.web_hook_authorization
         self.pending_requests.append(request_data)
         if time.time() - self.sent_time < self.sending_interval:
             return
-        try:
-            request_data = {
-                "camera_id": self.camera_id,
-                "raw_data": self.pending_requests
-            }
-            response = requests.post(self.web_hook_endpoint, json=request_data, headers=headers)
-        except ConnectionError:
-            logger.error(f"Connection with endpoint {self.web_hook_endpoint} can't be established")
-        except Exception as e:
-            logger.error(f"Unexpected error connecting with {self.web_hook_endpoint}")
-            logger.error(e)
-        else:
-            self.sent_time = time.time()
-            if response.status_code == status.HTTP_200_OK:
-                self.pending_requests = []
-            else:
-                logger.error(f"Webhook endpoint returns status {response.status_code}")
-                if response.text:
-                    try:
-                        logger.error(response.json())
-                    except JSONDecodeError:
-                        logger.error(response.text)
+        self.sender.submit(self.pending_requests)
+        self.pending_requests = []
+        self.sent_time = time.time()
 
     def update(self, cv_image, objects, post_processing_data, fps, log_time):
         if self.web_hook_endpoint:
             super().update(cv_image, objects, post_processing_data, fps, log_time)
+
+    def start_logging(self, fps):
+        if self.sender is not None:
+            self.sender.start()
+
+    def stop_logging(self):
+        if self.sender is not None:
+            if self.pending_requests:
+                self.sender.submit(self.pending_requests)
+                self.pending_requests = []
+            self.sender.stop()
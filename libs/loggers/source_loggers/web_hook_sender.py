@@ -0,0 +1,238 @@
+import gzip
+import json
+import logging
+import os
+import time
+
+import requests
+
+from collections import deque
+from threading import Condition, Thread
+
+logger = logging.getLogger(__name__)
+
+# Client errors that can succeed if the request is retried later (the other ones are dropped)
+RETRYABLE_STATUS_CODES = [408, 425, 429]
+# Maximum number of spooled batches sent in a single request while replaying the spool
+REPLAY_BATCHES_PER_REQUEST = 10
+
+
+class WebHookSender:
+    """
+    Sends the batches of raw data of a camera to a web hook endpoint from a background thread, so the frame loop
+    never waits for the network.
+    The requests reuse the connections of a `requests.Session` and their JSON bodies are (optionally) gzip-compressed.
+    A failed request is retried with exponential backoff (1, 2, 4... seconds up to `max_backoff`). After
+    `max_retries` consecutive failures, or when too many batches are waiting, the pending batches are spilled to a
+    spool file (one JSON line per batch) that is replayed in order once the endpoint recovers, so the data survives
+    long outages and restarts. The spool can't grow over `max_spool_size` bytes, the batches that don't fit are
+    dropped.
+    The position of the next spooled batch to replay is persisted next to the spool, a batch is only sent twice if
+    the processor is killed between a successful request and the update of that position.
+
+    :param endpoint: The url of the web hook.
+    :param camera_id: The id of the camera, included in every request.
+    :param authorization: The value of the Authorization header (optional).
+    :param spool_path: The path of the spool file.
+    :param max_spool_size: The maximum size of the spool file (in bytes).
+    :param timeout: The timeout of each request (in seconds).
+    :param max_retries: The number of failed requests after which the pending batches are spilled to the spool.
+    :param max_backoff: The maximum time (in seconds) between retries.
+    :param max_pending_batches: The number of batches kept in memory while the endpoint is failing.
+    :param compress: Whether to gzip the bodies of the requests.
+    """
+
+    def __init__(self, endpoint, camera_id, authorization, spool_path, max_spool_size, timeout=5, max_retries=3,
+                 max_backoff=60, max_pending_batches=20, compress=False):
+        self.endpoint = endpoint
+        self.camera_id = camera_id
+        self.spool_path = spool_path
+        self.spool_offset_path = f"{spool_path}.offset"
+        self.max_spool_size = max_spool_size
+        self.timeout = timeout
+        self.max_retries = max(1, max_retries)
+        self.max_backoff = max_backoff
+        self.max_pending_batches = max_pending_batches
+        self.compress = compress
+        self.session = requests.Session()
+        self.session.headers["Content-Type"] = "application/json"
+        if compress:
+            self.session.headers["Content-Encoding"] = "gzip"
+        if authorization:
+            self.session.headers["Authorization"] = authorization
+        self.pending_batches = deque()
+        self.condition = Condition()
+        self.running = False
+        self.worker = None
+        self.spool_offset = self._read_spool_offset()
+
+    def start(self):
+        self.running = True
+        self.worker = Thread(target=self._process_batches, name=f"web-hook-{self.camera_id}", daemon=True)
+        self.worker.start()
+
+    def stop(self):
+        """ Stops the worker, the batches that couldn't be sent are kept in the spool for the next run """
+        if self.worker is None:
+            return
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        self.worker.join()
+        self.worker = None
+        self.session.close()
+
+    def submit(self, batch):
+        """ Enqueues a batch (a list of raw data entries) to be sent """
+        with self.condition:
+            self.pending_batches.append(batch)
+            self.condition.notify_all()
+
+    def _process_batches(self):
+        failures = 0
+        while True:
+            with self.condition:
+                while self.running and not self.pending_batches and not self._has_spooled_batches():
+                    self.condition.wait()
+                running = self.running
+            if not running:
+                if failures == 0:
+                    # Try to deliver the last batches before exiting
+                    while self._send_next_batch():
+                        if not self.pending_batches and not self._has_spooled_batches():
+                            break
+                self._spill_pending_batches()
+                return
+            if self._send_next_batch():
+                failures = 0
+                continue
+            failures += 1
+            if failures >= self.max_retries or len(self.pending_batches) > self.max_pending_batches:
+                self._spill_pending_batches()
+            # The new batches don't interrupt the backoff, only the stop does
+            retry_time = time.monotonic() + min(2 ** (failures - 1), self.max_backoff)
+            with self.condition:
+                while self.running and time.monotonic() < retry_time:
+                    self.condition.wait(retry_time - time.monotonic())
+
+    def _send_next_batch(self):
+        """ Sends the oldest spooled batches (or the oldest pending batch). Returns False if the request failed """
+        if self._has_spooled_batches():
+            batches, next_offset = self._read_spooled_batches()
+            if batches and not self._post([entry for batch in batches for entry in batch]):
+                return False
+            self._set_spool_offset(next_offset)
+            return True
+        with self.condition:
+            if not self.pending_batches:
+                return True
+            batch = self.pending_batches[0]
+        if not self._post(batch):
+            return False
+        with self.condition:
+            self.pending_batches.popleft()
+        return True
+
+    def _post(self, raw_data):
+        """ Returns True if the endpoint received the data (or rejected it permanently) """
+        body = json.dumps({"camera_id": self.camera_id, "raw_data": raw_data}).encode("utf-8")
+        if self.compress:
+            body = gzip.compress(body)
+        try:
+            response = self.session.post(self.endpoint, data=body, timeout=self.timeout)
+        except requests.exceptions.ConnectionError:
+            logger.error(f"Connection with endpoint {self.endpoint} can't be established")
+            return False
+        except requests.exceptions.Timeout:
+            logger.error(f"Request to endpoint {self.endpoint} timed out")
+            return False
+        except Exception as e:
+            logger.error(f"Unexpected error connecting with {self.endpoint}")
+            logger.error(e)
+            return False
+        if response.ok:
+            return True
+        logger.error(f"Webhook endpoint returns status {response.status_code}")
+        if response.text:
+            logger.error(response.text)
+        if 400 <= response.status_code < 500 and response.status_code not in RETRYABLE_STATUS_CODES:
+            logger.error(f"Dropping {len(raw_data)} entries rejected by {self.endpoint}")
+            return True
+        return False
+
+    def _has_spooled_batches(self):
+        return os.path.isfile(self.spool_path) and os.path.getsize(self.spool_path) > self.spool_offset
+
+    def _read_spooled_batches(self):
+        """ Returns the next spooled batches and the offset of the spool after them """
+        batches = []
+        with open(self.spool_path, "rb") as spool:
+            spool.seek(self.spool_offset)
+            while len(batches) < REPLAY_BATCHES_PER_REQUEST:
+                line = spool.readline()
+                if not line:
+                    break
+                if not line.endswith(b"\n"):
+                    # Incomplete batch (the process was stopped while spilling it), skip it
+                    logger.warning(f"Skipping an incomplete batch of the spool {self.spool_path}")
+                    continue
+                try:
+                    batches.append(json.loads(line))
+                except ValueError:
+                    logger.warning(f"Skipping a corrupted batch of the spool {self.spool_path}")
+            return batches, spool.tell()
+
+    def _spill_pending_batches(self):
+        """ Moves the pending batches to the end of the spool (they are newer than the spooled ones) """
+        with self.condition:
+            batches = list(self.pending_batches)
+            self.pending_batches.clear()
+        if not batches:
+            return
+        lines = [(json.dumps(batch) + "\n").encode("utf-8") for batch in batches]
+        spool_size = os.path.getsize(self.spool_path) if os.path.isfile(self.spool_path) else 0
+        if self.spool_offset and spool_size + sum(len(line) for line in lines) > self.max_spool_size:
+            spool_size = self._compact_spool()
+        dropped_batches = 0
+        os.makedirs(os.path.dirname(self.spool_path) or ".", exist_ok=True)
+        with open(self.spool_path, "ab") as spool:
+            for line in lines:
+                if spool_size + len(line) > self.max_spool_size:
+                    dropped_batches += 1
+                    continue
+                spool.write(line)
+                spool_size += len(line)
+        if dropped_batches:
+            logger.error(f"The spool {self.spool_path} is full, {dropped_batches} batches were dropped")
+
+    def _compact_spool(self):
+        """ Removes the replayed batches from the spool and returns its new size """
+        with open(self.spool_path, "rb") as spool:
+            spool.seek(self.spool_offset)
+            remaining = spool.read()
+        with open(self.spool_path, "wb") as spool:
+            spool.write(remaining)
+        self._set_spool_offset(0)
+        return len(remaining)
+
+    def _read_spool_offset(self):
+        if not os.path.isfile(self.spool_path):
+            return 0
+        try:
+            with open(self.spool_offset_path) as offset_file:
+                return int(offset_file.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _set_spool_offset(self, offset):
+        if os.path.isfile(self.spool_path) and offset >= os.path.getsize(self.spool_path):
+            # All the spooled batches were sent
+            os.remove(self.spool_path)
+            offset = 0
+        self.spool_offset = offset
+        if offset == 0:
+            if os.path.isfile(self.spool_offset_path):
+                os.remove(self.spool_offset_path)
+            return
+        with open(self.spool_offset_path, "w") as offset_file:
+            offset_file.write(str(offset))
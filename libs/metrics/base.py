@@ -3,6 +3,7 @@ import cv2 as cv
 import os
 import copy
 import csv
+import json
 import numpy as np
 import pandas as pd
 import logging
@@ -14,12 +15,18 @@ from datetime import date, datetime, timedelta, time
 from typing import Dict, List, Iterator
 from pandas.api.types import is_numeric_dtype
 
+from libs.utils.columnar_log import columnar_log_rows_count, read_columnar_log
 from libs.utils.config import get_source_config_directory
+from libs.utils.roi_mask import get_roi_mask
 from libs.utils.loggers import get_source_log_directory, get_area_log_directory, get_source_logging_interval
 from libs.utils.utils import is_list_recursively_empty, validate_file_exists_and_is_not_empty
 
 logger = logging.getLogger(__name__)
 
+# Number of log rows whose objects are tested against the RoI at once
+ROI_FILTERING_BATCH_SIZE = 1000
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
 
 class AggregationMode(Enum):
     SINGLE = 1
@@ -38,6 +45,63 @@ def parse_date_range(dates):
         dates = dates[end+1:]
 
 
+def count_csv_rows(csv_path):
+    """ Returns the number of complete rows (ended by a newline) of a CSV file, without counting its header """
+    lines = 0
+    with open(csv_path, "rb") as csvfile:
+        for chunk in iter(lambda: csvfile.read(1 << 20), b""):
+            lines += chunk.count(b"\n")
+    return max(lines - 1, 0)
+
+
+def hours_range(time_from, time_until):
+    """ Returns the hours of the day of `time_from` between `time_from` and `time_until` (up to 24:00) """
+    return range(time_from.hour, time_from.hour + int((time_until - time_from).total_seconds() // 3600))
+
+
+class HourlyCheckpoint:
+    """
+    Byte offset of the raw data log of a day up to which an hourly metric was computed for an entity (the offset of
+    the first row at or after `processed_until`), so the next run only reads the new rows of the log.
+    The checkpoint of a previous day is ignored.
+    """
+
+    def __init__(self, path, log_date, processed_until=None, offset=0):
+        self.path = path
+        self.log_date = str(log_date)
+        self.processed_until = processed_until
+        self.offset = offset
+
+    @classmethod
+    def load(cls, path, log_date):
+        try:
+            with open(path) as checkpoint_file:
+                checkpoint = json.load(checkpoint_file)
+        except (OSError, ValueError):
+            return cls(path, log_date)
+        if checkpoint.get("date") != str(log_date):
+            # Day rollover, the rows of the new day start at the beginning of its log
+            return cls(path, log_date)
+        return cls(path, log_date, checkpoint.get("processed_until"), int(checkpoint.get("offset", 0)))
+
+    def offset_for(self, time_from, log_file):
+        """ Returns the offset of the first row at or after `time_from` if it's known (0 otherwise) """
+        if self.processed_until != time_from.strftime(TIMESTAMP_FORMAT) or self.offset > os.path.getsize(log_file):
+            return 0
+        return self.offset
+
+    def update(self, processed_until, offset):
+        self.processed_until = processed_until.strftime(TIMESTAMP_FORMAT)
+        self.offset = offset
+
+    def save(self):
+        temporary_path = self.path + ".tmp"
+        with open(temporary_path, "w") as checkpoint_file:
+            json.dump({"date": self.log_date, "processed_until": self.processed_until, "offset": self.offset},
+                      checkpoint_file)
+        os.replace(temporary_path, self.path)
+
+
 class BaseMetric:
     processing_count_threshold = 3
     reports_folder = None
@@ -79,6 +143,14 @@ class BaseMetric:
             return None
         return cls.get_roi_contour(cls.get_roi_file_path(source_id, config))
 
+    @classmethod
+    def get_roi_mask_for_entity(cls, config, source_id):
+        """ Returns the (cached) RoIMask of the source at the processing resolution """
+        if cls.entity == "area":
+            return None
+        resolution = tuple([int(i) for i in config.get_section_dict("App")["Resolution"].split(",")])
+        return get_roi_mask(cls.get_roi_file_path(source_id, config), resolution)
+
     @staticmethod
     def is_inside_roi(detected_object, roi_contour):
         """
@@ -101,22 +173,49 @@ class BaseMetric:
             return True
         return False
 
+    @staticmethod
+    def parse_row_field(csv_row, field):
+        """
+        Returns the list stored in the `field` (Detections or ViolationsIndexes) of a raw data row. The rows of the
+        columnar log (and the rows filtered by the RoI) have these fields already parsed.
+        """
+        value = csv_row[field]
+        return ast.literal_eval(value) if isinstance(value, str) else value
+
+    @classmethod
+    def ignore_objects_outside_roi(cls, csv_row, roi_mask):
+        return cls.ignore_rows_objects_outside_roi([csv_row], roi_mask)[0]
+
     @classmethod
-    def ignore_objects_outside_roi(cls, csv_row, roi_contour):
-        detections = ast.literal_eval(csv_row["Detections"])
+    def ignore_rows_objects_outside_roi(cls, csv_rows, roi_mask):
+        """
+        Removes from the `csv_rows` the objects outside the RoI. The objects of all the rows are tested at once with
+        the RoIMask.
+        """
+        rows_detections = [cls.parse_row_field(csv_row, "Detections") for csv_row in csv_rows]
+        boxes = [obj["bbox_real"] for detections in rows_detections for obj in detections]
+        inside = roi_mask.contains_boxes(boxes).tolist() if boxes else []
+        position = 0
+        for csv_row, detections in zip(csv_rows, rows_detections):
+            cls._update_csv_row_detections(csv_row, detections, inside[position:position + len(detections)])
+            position += len(detections)
+        return csv_rows
+
+    @classmethod
+    def _update_csv_row_detections(cls, csv_row, detections, inside):
         detections_in_roi = []
-        for index, obj in enumerate(detections):
+        for index, (obj, is_inside) in enumerate(zip(detections, inside)):
             obj["index"] = index
-            if cls.is_inside_roi(obj, roi_contour):
+            if is_inside:
                 detections_in_roi.append(obj)
-        violations_indexes = ast.literal_eval(csv_row["ViolationsIndexes"])
+        violations_indexes = cls.parse_row_field(csv_row, "ViolationsIndexes")
         violations_indexes_in_roi = []
         for index, obj in enumerate(detections_in_roi):
             if obj["index"] in violations_indexes:
                 violations_indexes_in_roi.append(index)
         # Update the csv fields
-        csv_row["Detections"] = str(detections_in_roi)
-        csv_row["ViolationsIndexes"] = str(violations_indexes_in_roi)
+        csv_row["Detections"] = detections_in_roi
+        csv_row["ViolationsIndexes"] = violations_indexes_in_roi
         csv_row["DetectedObjects"] = len(detections_in_roi)
         csv_row["ViolatingObjects"] = len(violations_indexes_in_roi)
         return csv_row
@@ -134,11 +233,19 @@ class BaseMetric:
         raise NotImplementedError
 
     @classmethod
-    def process_csv_row(cls, csv_row, object_logs, roi_contour=None):
-        if roi_contour is not None:
-            csv_row = cls.ignore_objects_outside_roi(csv_row, roi_contour)
+    def process_csv_row(cls, csv_row, object_logs, roi_mask=None):
+        if roi_mask is not None:
+            csv_row = cls.ignore_objects_outside_roi(csv_row, roi_mask)
         cls.process_metric_csv_row(csv_row, object_logs)
 
+    @classmethod
+    def process_csv_rows(cls, csv_rows, object_logs, roi_mask=None):
+        """ Same as `process_csv_row` for a batch of rows, filtering the objects of all of them at once """
+        if roi_mask is not None and csv_rows:
+            csv_rows = cls.ignore_rows_objects_outside_roi(csv_rows, roi_mask)
+        for csv_row in csv_rows:
+            cls.process_metric_csv_row(csv_row, object_logs)
+
     @classmethod
     def generate_hourly_metric_data(cls, config, object_logs, entity):
         """
@@ -146,24 +253,87 @@ class BaseMetric:
         """
         raise NotImplementedError
 
+    @staticmethod
+    def get_columnar_log_for_csv(entity_file):
+        """
+        Returns the folder of the columnar log of the day of the `entity_file` (the raw data CSV) if it has all the
+        rows of the CSV (None otherwise, e.g. if the columnar log was enabled or disabled during the day or its last
+        rows weren't written yet).
+        """
+        columnar_log_directory = os.path.splitext(entity_file)[0]
+        rows_count = columnar_log_rows_count(columnar_log_directory)
+        if rows_count == 0:
+            return None
+        if os.path.isfile(entity_file) and count_csv_rows(entity_file) != rows_count:
+            return None
+        return columnar_log_directory
+
+    @classmethod
+    def generate_hourly_columnar_data(cls, config, entity: Dict, columnar_log_directory: str, time_from: datetime,
+                                      time_until: datetime):
+        """ Same as `generate_hourly_csv_data` reading the columnar log of the day """
+        roi_mask = cls.get_roi_mask_for_entity(config, entity["id"])
+        objects_logs = {}
+        for hour in hours_range(time_from, time_until):
+            objects_logs[hour] = {}
+        columnar_log = read_columnar_log(columnar_log_directory).select_time_range(time_from, time_until)
+        if roi_mask is not None and len(columnar_log.columns["bboxes_real"]):
+            columnar_log = columnar_log.select_detections(roi_mask.contains_boxes(columnar_log.columns["bboxes_real"]))
+        for row in columnar_log.rows():
+            cls.process_metric_csv_row(row, objects_logs)
+        return cls.generate_hourly_metric_data(config, objects_logs, entity)
+
     @classmethod
     def generate_hourly_csv_data(cls, config, entity: Dict, entity_file: str, time_from: datetime,
-                                 time_until: datetime):
-        roi_contour = cls.get_roi_contour_for_entity(config, entity["id"])
+                                 time_until: datetime, checkpoint: HourlyCheckpoint = None):
+        """
+        Generates the hourly reports of the hours between `time_from` and `time_until` with the rows of the raw data
+        log `entity_file`. If a `checkpoint` is received, the log is read from the offset of the first row of
+        `time_from` (if it's known) and the checkpoint is updated with the offset of the first row at or after
+        `time_until`.
+        """
+        if cls.entity == "source":
+            columnar_log_directory = cls.get_columnar_log_for_csv(entity_file)
+            if columnar_log_directory is not None:
+                return cls.generate_hourly_columnar_data(config, entity, columnar_log_directory, time_from, time_until)
+        roi_mask = cls.get_roi_mask_for_entity(config, entity["id"])
         if not os.path.isfile(entity_file):
             entity_type = "Camera" if cls.entity else "Area"
             logger.warn(f"The [{entity_type}: {entity['id']}] contains no recorded data for that day")
             return
         objects_logs = {}
-        for hour in range(time_from.hour, time_until.hour):
+        for hour in hours_range(time_from, time_until):
             objects_logs[hour] = {}
-        with open(entity_file, newline='') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                row_time = datetime.strptime(row["Timestamp"], "%Y-%m-%d %H:%M:%S")
-                if time_from <= row_time < time_until:
-                    cls.process_csv_row(row, objects_logs, roi_contour)
-            return cls.generate_hourly_metric_data(config, objects_logs, entity)
+        # The timestamps are compared as strings (they have a fixed width format)
+        time_from_str, time_until_str = time_from.strftime(TIMESTAMP_FORMAT), time_until.strftime(TIMESTAMP_FORMAT)
+        with open(entity_file, "rb") as csvfile:
+            fieldnames = next(csv.reader([csvfile.readline().decode("utf-8")]), None)
+            offset = max(checkpoint.offset_for(time_from, entity_file) if checkpoint else 0, csvfile.tell())
+            csvfile.seek(offset)
+            rows = []
+            # The rows aren't always sorted by time (e.g. the logs of recorded videos), so the rest of the log is read
+            # but the checkpoint only skips the rows before the first one at or after `time_until`
+            processed_prefix = True
+            for line in csvfile:
+                if not line.endswith(b"\n"):
+                    # The row is being written, it's read in the next run
+                    break
+                row = dict(zip(fieldnames, next(csv.reader([line.decode("utf-8")]))))
+                if row["Timestamp"] >= time_until_str:
+                    processed_prefix = False
+                    continue
+                if processed_prefix:
+                    offset += len(line)
+                if row["Timestamp"] < time_from_str:
+                    continue
+                rows.append(row)
+                if len(rows) == ROI_FILTERING_BATCH_SIZE:
+                    cls.process_csv_rows(rows, objects_logs, roi_mask)
+                    rows = []
+        cls.process_csv_rows(rows, objects_logs, roi_mask)
+        if checkpoint is not None:
+            checkpoint.update(time_until, offset)
+        return cls.generate_hourly_metric_data(config, objects_logs, entity)
 
     @classmethod
     def compute_hourly_metrics(cls, config):
@@ -194,12 +364,18 @@ class BaseMetric:
             if os.path.isfile(daily_csv):
                 with open(daily_csv, "r", newline='') as csvfile:
                     processed_hours = sum(1 for line in csv.reader(csvfile)) - 1
-                    time_from = datetime.combine(report_date, time(processed_hours + 1, 0))
+                    # The daily report has a row for each processed hour
+                    time_from = time_from + timedelta(hours=processed_hours)
             else:
                 with open(daily_csv, "a", newline='') as csvfile:
                     writer = csv.DictWriter(csvfile, fieldnames=cls.csv_headers)
                     writer.writeheader()
-            csv_data = cls.generate_hourly_csv_data(config, entity, entity_csv, time_from, time_until)
+            if time_from >= time_until:
+                # All the hours were processed
+                continue
+            # Offset of the first row that wasn't processed in the log of the day
+            checkpoint = HourlyCheckpoint.load(os.path.join(reports_directory, "hourly_checkpoint.json"), report_date)
+            csv_data = cls.generate_hourly_csv_data(config, entity, entity_csv, time_from, time_until, checkpoint)
             if csv_data is None:
                 entity_type = "Camera" if cls.entity else "Area"
                 logger.warn(f"Hourly report not generated! [{entity_type}: {entity['id']}]")
@@ -211,6 +387,8 @@ class BaseMetric:
                     for index, header in enumerate(cls.csv_headers):
                         row[header] = item[index]
                     writer.writerow(row)
+            # Saved once the rows are stored (if the process is stopped before, the hours are processed again)
+            checkpoint.save()
 
     @classmethod
     def generate_daily_csv_data(cls, yesterday_hourly_file):
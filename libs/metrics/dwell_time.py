@@ -31,7 +31,7 @@ class DwellTimeMetric(BaseMetric):
     @classmethod
     def process_metric_csv_row(cls, csv_row: Dict, objects_logs: Dict):
         row_time = datetime.strptime(csv_row["Timestamp"], "%Y-%m-%d %H:%M:%S")
-        detections = ast.literal_eval(csv_row["Detections"])
+        detections = cls.parse_row_field(csv_row, "Detections")
         row_hour = row_time.hour
         if not objects_logs.get(row_hour):
             objects_logs[row_hour] = {}
@@ -154,14 +154,14 @@ class DwellTimeMetric(BaseMetric):
         """
         Generates the live report using the `today_entity_csv` file received.
         """
-        roi_contour = cls.get_roi_contour_for_entity(config, entity["id"])
+        roi_mask = cls.get_roi_mask_for_entity(config, entity["id"])
         live_csv = os.path.join(entity.base_directory, "reports", cls.reports_folder, "live.csv")
         latest_active_ids = _read_estimated_latest_active_ids(live_csv)
         with open(today_entity_csv, "r") as log:
             objects_logs = {}
             lastest_entries = deque(csv.DictReader(log), entries_in_interval)
             for entry in lastest_entries:
-                cls.process_csv_row(entry, objects_logs, roi_contour)
+                cls.process_csv_row(entry, objects_logs, roi_mask)
         metric_data = cls.calculate_metrics(objects_logs, latest_active_ids)
         numerics = np.zeros(6, dtype=np.long)
         avg = 0.
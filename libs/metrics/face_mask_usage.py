@@ -1,5 +1,4 @@
 
-import ast
 import csv
 import numpy as np
 
@@ -20,7 +19,7 @@ class FaceMaskUsageMetric(BaseMetric):
     @classmethod
     def process_metric_csv_row(cls, csv_row: Dict, objects_logs: Dict):
         row_time = datetime.strptime(csv_row["Timestamp"], "%Y-%m-%d %H:%M:%S")
-        detections = ast.literal_eval(csv_row["Detections"])
+        detections = cls.parse_row_field(csv_row, "Detections")
         row_hour = row_time.hour
         if not objects_logs.get(row_hour):
             objects_logs[row_hour] = {}
@@ -113,12 +112,12 @@ class FaceMaskUsageMetric(BaseMetric):
         """
         Generates the live report using the `today_entity_csv` file received.
         """
-        roi_contour = cls.get_roi_contour_for_entity(config, entity["id"])
+        roi_mask = cls.get_roi_mask_for_entity(config, entity["id"])
         with open(today_entity_csv, "r") as log:
             objects_logs = {}
             lastest_entries = deque(csv.DictReader(log), entries_in_interval)
             for entry in lastest_entries:
-                cls.process_csv_row(entry, objects_logs, roi_contour)
+                cls.process_csv_row(entry, objects_logs, roi_mask)
         return np.sum(cls.generate_hourly_metric_data(config, objects_logs), axis=0)
 
     @classmethod
@@ -29,7 +29,7 @@ class InOutMetric(BaseMetric):
     @classmethod
     def process_metric_csv_row(cls, csv_row: Dict, objects_logs: Dict):
         row_time = datetime.strptime(csv_row["Timestamp"], "%Y-%m-%d %H:%M:%S")
-        detections = ast.literal_eval(csv_row["Detections"])
+        detections = cls.parse_row_field(csv_row, "Detections")
         row_hour, row_minute = row_time.hour, row_time.minute
         intervals_per_hour = 60 // cls.SEGMENTATION_MINUTES
         segment = row_minute // cls.SEGMENTATION_MINUTES
@@ -104,7 +104,7 @@ class InOutMetric(BaseMetric):
         """
         boundaries = cls.retrieve_in_out_boundaries(config, entity["id"])
         boundary_names = [boundary["name"] for boundary in boundaries]
-        roi_contour = cls.get_roi_contour_for_entity(config, entity["id"])
+        roi_mask = cls.get_roi_mask_for_entity(config, entity["id"])
 
         live_csv = os.path.join(entity.base_directory, "reports", cls.reports_folder, "live.csv")
         latest_estimated_occupancy = _read_estimated_latest_occupancy(live_csv)
@@ -113,7 +113,7 @@ class InOutMetric(BaseMetric):
             objects_logs = {}
             lastest_entries = deque(csv.DictReader(log), entries_in_interval)
             for entry in lastest_entries:
-                cls.process_csv_row(entry, objects_logs, roi_contour)
+                cls.process_csv_row(entry, objects_logs, roi_mask)
 
         hour_in, hour_out, hour_balance = [], [], []
         for hour in sorted(objects_logs):
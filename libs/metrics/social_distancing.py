@@ -24,7 +24,8 @@ class SocialDistancingMetric(BaseMetric):
     @classmethod
     def process_metric_csv_row(cls, csv_row: Dict, objects_logs: Dict):
         row_time = datetime.strptime(csv_row["Timestamp"], "%Y-%m-%d %H:%M:%S")
-        detections = ast.literal_eval(csv_row["Detections"])
+        detections = cls.parse_row_field(csv_row, "Detections")
+        violations_indexes = cls.parse_row_field(csv_row, "ViolationsIndexes")
         row_hour = row_time.hour
         if not objects_logs.get(row_hour):
             objects_logs[row_hour] = {}
@@ -35,7 +36,7 @@ class SocialDistancingMetric(BaseMetric):
             objects_logs[row_hour][d["tracking_id"]]["distance_violations"].append(
                 {
                     "time": row_time,
-                    "infrigement": index in ast.literal_eval(csv_row["ViolationsIndexes"])
+                    "infrigement": index in violations_indexes
                 }
             )
 
@@ -182,12 +183,12 @@ class SocialDistancingMetric(BaseMetric):
         """
         Generates the live report using the `today_entity_csv` file received.
         """
-        roi_contour = cls.get_roi_contour_for_entity(config, entity["id"])
+        roi_mask = cls.get_roi_mask_for_entity(config, entity["id"])
         with open(today_entity_csv, "r") as log:
             objects_logs = {}
             lastest_entries = deque(csv.DictReader(log), entries_in_interval)
             for entry in lastest_entries:
-                cls.process_csv_row(entry, objects_logs, roi_contour)
+                cls.process_csv_row(entry, objects_logs, roi_mask)
         return np.sum(cls.generate_hourly_metric_data(config, objects_logs), axis=0)
 
     @classmethod
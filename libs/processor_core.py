@@ -7,6 +7,10 @@ from queue import Empty
 import schedule
 from libs.engine_threading import run_video_processing
 from libs.area_threading import run_area_processing
+from libs.detectors.inference_server import (
+    INFERENCE_SERVER_DEVICES, create_inference_server_channels, run_inference_server
+)
+from libs.utils.utils import config_to_boolean
 from libs.utils.notifications import run_check_violations
 
 logger = logging.getLogger(__name__)
@@ -135,18 +139,42 @@ class ProcessorCore:
         tasks_per_process = len(sources) // processes
         processes_with_additional_task = len(sources) % processes
 
+        inference_server = None
+        channels = {}
+        detector_config = self.config.get_section_dict("Detector")
+        if (config_to_boolean(detector_config.get("InferenceServer", "False"))
+                and detector_config["Device"] in INFERENCE_SERVER_DEVICES):
+            inference_server, channels = self.start_inference_server(sources)
+
         index = 0
         engines = []
         for p_index in range(processes):
             extra = 1 if p_index < processes_with_additional_task else 0
             p_src = sources[index:(index + tasks_per_process + extra)]
             index += tasks_per_process + extra
+            p_channels = {src["id"]: channels[src["id"]] for src in p_src if src["id"] in channels}
             recv_conn, send_conn = mp.Pipe(False)
-            p = mp.Process(target=run_video_processing, args=(self.config, recv_conn, p_src))
+            p = mp.Process(target=run_video_processing, args=(self.config, recv_conn, p_src, False, p_channels))
             p.start()
             engines.append((send_conn, p))
+        if inference_server:
+            # The inference server is stopped after the processes that use it
+            engines.append(inference_server)
         return engines
 
+    def start_inference_server(self, sources):
+        """
+        Starts the process that loads the detector models and runs the inference for all the cameras.
+        Returns the (connection, process) tuple of the server and the channels used by the cameras to reach it.
+        """
+        request_queue = mp.Queue()
+        channels = create_inference_server_channels(self.config, sources, request_queue)
+        recv_conn, send_conn = mp.Pipe(False)
+        p = mp.Process(target=run_inference_server, args=(self.config, recv_conn, sources, channels, request_queue))
+        p.start()
+        logger.info("Inference server started")
+        return (send_conn, p), channels
+
     def start_processing_areas(self):
         recv_conn, send_conn = mp.Pipe(False)
         p = mp.Process(target=run_area_processing, args=(self.config, recv_conn, self.config.get_areas()))
@@ -2,20 +2,21 @@ import cv2 as cv
 
 
 class AnonymizerPostProcesor:
+    accepts_detection_batch = True
 
     def __init__(self, config, source: str, post_processor: str):
         pass
 
-    def anonymize_image(self, img, objects_list):
+    def anonymize_image(self, img, detections):
         """
         Anonymize every instance in the frame.
         """
         h, w = img.shape[:2]
-        for box in objects_list:
-            xmin = max(int(box["bboxReal"][0]), 0)
-            xmax = min(int(box["bboxReal"][2]), w)
-            ymin = max(int(box["bboxReal"][1]), 0)
-            ymax = min(int(box["bboxReal"][3]), h)
+        for box in detections.bboxes_real.astype(int).tolist():
+            xmin = max(box[0], 0)
+            xmax = min(box[2], w)
+            ymin = max(box[1], 0)
+            ymax = min(box[3], h)
             ymax = (ymax - ymin) // 3 + ymin
             roi = img[ymin:ymax, xmin:xmax]
             roi = self.anonymize_face(roi)
@@ -36,6 +37,6 @@ class AnonymizerPostProcesor:
             kernel_h = max(1, kernel_h - 1)
         return cv.GaussianBlur(image, (kernel_w, kernel_h), 0)
 
-    def process(self, cv_image, objects_list, post_processing_data):
-        cv_image = self.anonymize_image(cv_image, objects_list)
-        return cv_image, objects_list, post_processing_data
+    def process(self, cv_image, detections, post_processing_data):
+        cv_image = self.anonymize_image(cv_image, detections)
+        return cv_image, detections, post_processing_data
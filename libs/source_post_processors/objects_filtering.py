@@ -5,9 +5,16 @@ import numpy as np
 from pathlib import Path
 
 from ..utils.config import get_source_config_directory
+from ..utils.roi_mask import get_roi_mask
 from ..utils.utils import validate_file_exists_and_is_not_empty
 
+# Maximum number of boxes for which the non maximum suppression computes the matrix of overlaps of all the pairs,
+# larger sets remove the duplicates of each picked box from the remaining candidates (less memory)
+NMS_MATRIX_MAX_BOXES = 300
+
+
 class ObjectsFilteringPostProcessor:
+    accepts_detection_batch = True
 
     def __init__(self, config, source: str, post_processor: str):
         self.config = config
@@ -16,8 +23,17 @@ class ObjectsFilteringPostProcessor:
             self.config.get_section_dict(post_processor)["NMSThreshold"]
         )
         camera_id = config.get_section_dict(source)["Id"]
-        roi_file_path = self.get_roi_file_path(camera_id, config)
-        self.roi_contour = self.get_roi_contour(roi_file_path)
+        self.roi_file_path = self.get_roi_file_path(camera_id, config)
+        self.resolution = tuple([int(i) for i in self.config.get_section_dict("App")["Resolution"].split(",")])
+
+    @staticmethod
+    def large_boxes_mask(centroids):
+        """
+        Returns a boolean array with True for the boxes which are bigger than the 1/4 of the size the image
+        params:
+            centroids: a (N, 4) array with the normalized centroid coordinates (cx,cy,w,h) of the boxes
+        """
+        return centroids[:, 2] * centroids[:, 3] > 0.25
 
     @staticmethod
     def ignore_large_boxes(object_list):
@@ -31,12 +47,57 @@ class ObjectsFilteringPostProcessor:
         returns:
         object_list: input object list without large boxes
         """
-        large_boxes = []
-        for i in range(len(object_list)):
-            if (object_list[i]["centroid"][2] * object_list[i]["centroid"][3]) > 0.25:
-                large_boxes.append(i)
-        updated_object_list = [j for i, j in enumerate(object_list) if i not in large_boxes]
-        return updated_object_list
+        if not object_list:
+            return []
+        centroids = np.array([item["centroid"] for item in object_list], dtype=float)
+        large_boxes = ObjectsFilteringPostProcessor.large_boxes_mask(centroids)
+        return [item for item, is_large in zip(object_list, large_boxes.tolist()) if not is_large]
+
+    @staticmethod
+    def non_max_suppression_indexes(centroids, corners, overlapThresh):
+        """
+        omitting duplicated boxes by applying an auxilary non-maximum-suppression.
+        The boxes are visited from the lowest bottom edge and each picked box suppresses the remaining boxes whose
+        area is covered by it more than `overlapThresh`.
+        params:
+        centroids: a (N, 4) array with the normalized centroid coordinates (cx,cy,w,h) of the boxes
+        corners: a (N, 4) array with the normalized (xmin,ymin,xmax,ymax) coordinates of the boxes
+        overlapThresh: threshold of minimum IoU of to detect two box as duplicated.
+
+        returns:
+        pick: sorted array with the indexes of the boxes that are kept
+        """
+        if len(centroids) == 0:
+            return np.zeros(0, dtype=int)
+        x1, y1, x2, y2 = corners.T
+        area = (centroids[:, 3] + 1) * (centroids[:, 2] + 1)
+        # Candidates sorted by their bottom edge (the last one is visited first)
+        order = np.argsort(centroids[:, 1] + (centroids[:, 3] / 2))[::-1]
+        pick = []
+        if len(order) <= NMS_MATRIX_MAX_BOXES:
+            # overlaps[i, j] is the ratio of the area of the box j covered by the box i
+            w = np.maximum(0, np.minimum(x2[:, None], x2[None, :]) - np.maximum(x1[:, None], x1[None, :]) + 1)
+            h = np.maximum(0, np.minimum(y2[:, None], y2[None, :]) - np.maximum(y1[:, None], y1[None, :]) + 1)
+            suppressions = (w * h) / area[None, :] > overlapThresh
+            suppressed = np.zeros(len(order), dtype=bool)
+            for i in order.tolist():
+                if suppressed[i]:
+                    continue
+                pick.append(i)
+                suppressed |= suppressions[i]
+        else:
+            # The picked boxes remove their duplicates from the remaining candidates
+            remaining = order
+            while len(remaining) > 0:
+                i = remaining[0]
+                pick.append(i)
+                remaining = remaining[1:]
+                w = np.maximum(0, np.minimum(x2[i], x2[remaining]) - np.maximum(x1[i], x1[remaining]) + 1)
+                h = np.maximum(0, np.minimum(y2[i], y2[remaining]) - np.maximum(y1[i], y1[remaining]) + 1)
+                # compute the ratio of overlap
+                overlap = (w * h) / area[remaining]
+                remaining = remaining[overlap <= overlapThresh]
+        return np.sort(pick)
 
     @staticmethod
     def non_max_suppression_fast(object_list, overlapThresh):
@@ -56,41 +117,12 @@ class ObjectsFilteringPostProcessor:
         object_list: input object list without duplicated boxes
         """
         # if there are no boxes, return an empty list
-        boxes = np.array([item["centroid"] for item in object_list])
-        corners = np.array([item["bbox"] for item in object_list])
-        if len(boxes) == 0:
+        if len(object_list) == 0:
             return []
-        if boxes.dtype.kind == "i":
-            boxes = boxes.astype("float")
-        # initialize the list of picked indexes
-        pick = []
-        cy = boxes[:, 1]
-        cx = boxes[:, 0] # noqa
-        h = boxes[:, 3]
-        w = boxes[:, 2]
-        x1 = corners[:, 0]
-        x2 = corners[:, 2]
-        y1 = corners[:, 1]
-        y2 = corners[:, 3]
-        area = (h + 1) * (w + 1)
-        idxs = np.argsort(cy + (h / 2))
-        while len(idxs) > 0:
-            last = len(idxs) - 1
-            i = idxs[last]
-            pick.append(i)
-            xx1 = np.maximum(x1[i], x1[idxs[:last]])
-            yy1 = np.maximum(y1[i], y1[idxs[:last]])
-            xx2 = np.minimum(x2[i], x2[idxs[:last]])
-            yy2 = np.minimum(y2[i], y2[idxs[:last]])
-
-            w = np.maximum(0, xx2 - xx1 + 1)
-            h = np.maximum(0, yy2 - yy1 + 1)
-            # compute the ratio of overlap
-            overlap = (w * h) / area[idxs[:last]]
-            # delete all indexes from the index list that have
-            idxs = np.delete(idxs, np.concatenate(([last], np.where(overlap > overlapThresh)[0])))
-        updated_object_list = [j for i, j in enumerate(object_list) if i in pick]
-        return updated_object_list
+        centroids = np.array([item["centroid"] for item in object_list], dtype=float)
+        corners = np.array([item["bbox"] for item in object_list], dtype=float)
+        pick = ObjectsFilteringPostProcessor.non_max_suppression_indexes(centroids, corners, overlapThresh)
+        return [object_list[i] for i in pick.tolist()]
 
     @staticmethod
     def is_inside_roi(detected_object, roi_contour):
@@ -114,8 +146,8 @@ class ObjectsFilteringPostProcessor:
             return True
         return False
 
-    @classmethod
-    def ignore_objects_outside_roi(cls, objects_list, roi_contour):
+    @staticmethod
+    def ignore_objects_outside_roi(objects_list, roi_mask):
 
         """
         If a Region of Interest is defined, filer boxes which middle bottom point lies outside the RoI.
@@ -124,12 +156,14 @@ class ObjectsFilteringPostProcessor:
             "id", "centroid" (a tuple of the normalized centroid coordinates (cx,cy,w,h) of the box) and "bbox" (a tuple
             of the normalized (xmin,ymin,xmax,ymax) coordinate of the box)
 
-            roi_contour: An array of 2-tuples that compose the contour of the RoI
+            roi_mask: The RoIMask of the Region of Interest
         returns:
         object_list: input object list with only the objets that fall under the Region of Interest.
         """
-
-        return [obj for obj in objects_list if cls.is_inside_roi(obj, roi_contour)]
+        if not objects_list:
+            return objects_list
+        inside = roi_mask.contains_boxes([obj["bboxReal"] for obj in objects_list])
+        return [obj for obj, is_inside in zip(objects_list, inside.tolist()) if is_inside]
 
     @staticmethod
     def get_roi_file_path(camera_id, config):
@@ -144,13 +178,22 @@ class ObjectsFilteringPostProcessor:
         else:
             return None
 
-    def filter_objects(self, objects_list):
-        new_objects_list = self.ignore_large_boxes(objects_list)
-        new_objects_list = self.non_max_suppression_fast(new_objects_list, self.overlap_threshold)
-        if self.roi_contour is not None:
-            new_objects_list = self.ignore_objects_outside_roi(new_objects_list, self.roi_contour)
-        return new_objects_list
-
-    def process(self, cv_image, objects_list, post_processing_data):
-        new_objects_list = self.filter_objects(objects_list)
-        return cv_image, new_objects_list, post_processing_data
+    def filter_objects(self, detections):
+        """
+        Removes the large, duplicated and outside the RoI objects. The filters work on the arrays of boxes of the
+        DetectionBatch and the batch is rebuilt once with the indexes of the remaining objects.
+        """
+        if not len(detections):
+            return detections
+        centroids = detections.centroids
+        corners = detections.bboxes
+        indexes = np.flatnonzero(~self.large_boxes_mask(centroids))
+        indexes = indexes[self.non_max_suppression_indexes(centroids[indexes], corners[indexes], self.overlap_threshold)]
+        roi_mask = get_roi_mask(self.roi_file_path, self.resolution)
+        if roi_mask is not None and len(indexes):
+            indexes = indexes[roi_mask.contains_boxes(detections.bboxes_real[indexes])]
+        return detections.select(indexes)
+
+    def process(self, cv_image, detections, post_processing_data):
+        new_detections = self.filter_objects(detections)
+        return cv_image, new_detections, post_processing_data
@@ -4,13 +4,55 @@ import numpy as np
 
 from scipy.spatial.distance import cdist
 
-from libs.utils.camera_calibration import get_camera_calibration_path
+from libs.utils.camera_calibration import (get_camera_calibration_path, get_ground_plane_lookup_path,
+                                           load_inv_homography_matrix, project_to_world, GroundPlaneLookup)
+from libs.utils.utils import config_to_boolean
 from tools.objects_post_process import extract_violating_objects
 
 logger = logging.getLogger(__name__)
 
 
+# Neighbor cells (dx, dy) visited from each cell of the grid, the other half is covered by the symmetric pairs
+GRID_NEIGHBOR_OFFSETS = ((0, 0), (1, 0), (-1, 1), (0, 1), (1, 1))
+
+
+def grid_candidate_pairs(points, cell_size):
+    """
+    Buckets the points in a uniform grid with cells of size `cell_size` and returns the pairs of points in the same or
+    adjacent cells, which include all the pairs closer than `cell_size`.
+
+    returns:
+    rows, cols: ndarrays with the indexes (rows[k] < cols[k]) of each candidate pair (can contain duplicates)
+    """
+    count = len(points)
+    cells = np.floor(points / cell_size).astype(np.int64)
+    # Leave an empty column at both sides so that the neighbors of a cell never wrap to the next row
+    cells -= cells.min(axis=0) - [1, 0]
+    width = cells[:, 0].max() + 2
+    keys = cells[:, 1] * width + cells[:, 0]
+    order = np.argsort(keys, kind="mergesort")
+    sorted_keys = keys[order]
+    indexes = np.arange(count)
+    rows_list, cols_list = [], []
+    for dx, dy in GRID_NEIGHBOR_OFFSETS:
+        neighbor_keys = keys + dy * width + dx
+        starts = np.searchsorted(sorted_keys, neighbor_keys, side="left")
+        counts = np.searchsorted(sorted_keys, neighbor_keys, side="right") - starts
+        rows = np.repeat(indexes, counts)
+        positions = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(starts, counts)
+        cols = order[positions]
+        if dx == 0 and dy == 0:
+            # Each pair of the same cell is found twice (and each point with itself)
+            same_cell = rows < cols
+            rows, cols = rows[same_cell], cols[same_cell]
+        rows_list.append(rows)
+        cols_list.append(cols)
+    rows, cols = np.concatenate(rows_list), np.concatenate(cols_list)
+    return np.minimum(rows, cols), np.maximum(rows, cols)
+
+
 class SocialDistancePostProcessor:
+    accepts_detection_batch = True
 
     # Distance methods
     CALIBRATED_DISTANCE = "CalibratedDistance"
@@ -21,7 +63,10 @@ class SocialDistancePostProcessor:
         self.config = config
         self.post_processor = self.config.get_section_dict(post_processor)
         self.dist_threshold = float(self.post_processor["DistThreshold"])
+        # Only find the violating pairs instead of computing the distances between all the objects
+        self.pairs_only = config_to_boolean(self.post_processor.get("PairsOnly", "False"))
         default_dist_method = self.post_processor["DefaultDistMethod"]
+        self.ground_plane_lookup = None
         if self.config.get_section_dict(source).get("DistMethod"):
             self.dist_method = self.config.get_section_dict(source).get("DistMethod")
         else:
@@ -30,15 +75,20 @@ class SocialDistancePostProcessor:
             calibration_file = get_camera_calibration_path(
                 self.config, self.config.get_section_dict(source)["Id"])
             try:
-                with open(calibration_file, "r") as file:
-                    self.h_inv = file.readlines()[0].split(" ")[1:]
-                    self.h_inv = np.array(self.h_inv, dtype="float").reshape((3, 3))
+                self.h_inv = load_inv_homography_matrix(calibration_file)
+                if config_to_boolean(self.config.get_section_dict("App").get("GroundPlaneLookup", "False")):
+                    resolution = tuple(int(i) for i in self.config.get_section_dict("App")["Resolution"].split(","))
+                    self.ground_plane_lookup = GroundPlaneLookup.load(
+                        calibration_file,
+                        get_ground_plane_lookup_path(self.config, self.config.get_section_dict(source)["Id"], resolution),
+                        resolution
+                    )
             except FileNotFoundError:
                 logger.error("The specified 'CalibrationFile' does not exist")
                 logger.info(f"Falling back using {default_dist_method}")
                 self.dist_method = default_dist_method
 
-    def calculate_box_distances(self, nn_out):
+    def calculate_box_distances(self, detections):
 
         """
         This function calculates a distance matrix for detected bounding boxes.
@@ -47,81 +97,121 @@ class SocialDistancePostProcessor:
         boxes and the third one uses minimum distance of each of 4 points of bounding boxes.
 
         params:
-        object_list: a list of dictionaries. each dictionary has attributes of a detected object such as
-        "id", "centroidReal" (a tuple of the centroid coordinates (cx,cy,w,h) of the box) and "bboxReal" (a tuple
-        of the (xmin,ymin,xmax,ymax) coordinate of the box)
+        detections: the DetectionBatch with the objects of the frame
 
         returns:
         distances: a NxN ndarray which i,j element is estimated distance between i-th and j-th bounding box in real scene (cm)
 
         """
         if self.dist_method == self.CALIBRATED_DISTANCE:
-            return self.calculate_calibrated_distance(nn_out)
+            return self.calculate_calibrated_distance(detections)
         elif self.dist_method == self.FOUR_CORNER_DISTANCE:
-            return self.calculate_four_corner_distance(nn_out)
+            return self.calculate_four_corner_distance(detections)
         elif self.dist_method == self.CENTER_POINTS_DISTANCE:
-            return self.calculate_center_points_distance(nn_out)
+            return self.calculate_center_points_distance(detections)
         else:
             raise ValueError(f"Not supported distance method {self.dist_method}")
 
-    def calculate_four_corner_distance(self, nn_out):
-        distances = []
-        for i in range(len(nn_out)):
-            distance_row = []
-            for j in range(len(nn_out)):
-                if i == j:
-                    distance_row.append(0)
-                    continue
-                lower_left_of_first_box = [nn_out[i]["bboxReal"][0], nn_out[i]["bboxReal"][1],
-                                           nn_out[i]["centroidReal"][3]]
-                lower_right_of_first_box = [nn_out[i]["bboxReal"][2], nn_out[i]["bboxReal"][1],
-                                            nn_out[i]["centroidReal"][3]]
-                upper_left_of_first_box = [nn_out[i]["bboxReal"][0], nn_out[i]["bboxReal"][3],
-                                           nn_out[i]["centroidReal"][3]]
-                upper_right_of_first_box = [nn_out[i]["bboxReal"][2], nn_out[i]["bboxReal"][3],
-                                            nn_out[i]["centroidReal"][3]]
-
-                lower_left_of_second_box = [nn_out[j]["bboxReal"][0], nn_out[j]["bboxReal"][1],
-                                            nn_out[j]["centroidReal"][3]]
-                lower_right_of_second_box = [nn_out[j]["bboxReal"][2], nn_out[j]["bboxReal"][1],
-                                             nn_out[j]["centroidReal"][3]]
-                upper_left_of_second_box = [nn_out[j]["bboxReal"][0], nn_out[j]["bboxReal"][3],
-                                            nn_out[j]["centroidReal"][3]]
-                upper_right_of_second_box = [nn_out[j]["bboxReal"][2], nn_out[j]["bboxReal"][3],
-                                             nn_out[j]["centroidReal"][3]]
-
-                l1 = self.calculate_distance_of_two_points_of_boxes(
-                    lower_left_of_first_box, lower_left_of_second_box)
-                l2 = self.calculate_distance_of_two_points_of_boxes(
-                    lower_right_of_first_box, lower_right_of_second_box)
-                l3 = self.calculate_distance_of_two_points_of_boxes(
-                    upper_left_of_first_box, upper_left_of_second_box)
-                l4 = self.calculate_distance_of_two_points_of_boxes(
-                    upper_right_of_first_box, upper_right_of_second_box)
-                distance_row.append(min(l1, l2, l3, l4))
-            distances.append(distance_row)
-        return np.asarray(distances, dtype=np.float32)
-
-    def calculate_center_points_distance(self, nn_out):
-        distances = []
-        for i in range(len(nn_out)):
-            distance_row = []
-            for j in range(len(nn_out)):
-                if i == j:
-                    distance_row.append(0)
-                    continue
-                center_of_first_box = [nn_out[i]["centroidReal"][0], nn_out[i]["centroidReal"][1], nn_out[i]["centroidReal"][3]]
-                center_of_second_box = [nn_out[j]["centroidReal"][0], nn_out[j]["centroidReal"][1], nn_out[j]["centroidReal"][3]]
-                distance_row.append(self.calculate_distance_of_two_points_of_boxes(center_of_first_box, center_of_second_box))
-            distances.append(distance_row)
-        return np.asarray(distances, dtype=np.float32)
-
-    def calculate_calibrated_distance(self, nn_out):
-        world_coordinate_points = np.array([self.transform_to_world_coordinate(bbox) for bbox in nn_out])
+    @staticmethod
+    def _boxes_and_heights(detections):
+        """ Returns the (N, 4) array of the boxes of the objects (in pixels) and the (N,) array of their heights """
+        boxes = detections.bboxes_real
+        return boxes, boxes[:, 3] - boxes[:, 1]
+
+    @staticmethod
+    def _pixel_to_cm_scales(heights, rows=None, cols=None):
+        """
+        Returns the factors that convert the pixel distances between two boxes into centimeters, assuming that
+        each person is 170 cm tall (see `calculate_distance_of_two_points_of_boxes`). Without rows and cols the
+        result is the (N, N) matrix of all the pairs, otherwise it's the array of the pairs (rows[i], cols[i]).
+        """
+        inverse_heights = 1 / heights
+        if rows is None:
+            return 170 * (inverse_heights[:, None] + inverse_heights[None, :]) / 2
+        return 170 * (inverse_heights[rows] + inverse_heights[cols]) / 2
+
+    def calculate_four_corner_distance(self, detections):
+        boxes, heights = self._boxes_and_heights(detections)
+        # The minimum over the 4 pairs of corresponding corners combines the closest vertical and horizontal sides
+        dx = np.minimum(np.abs(boxes[None, :, 0] - boxes[:, None, 0]), np.abs(boxes[None, :, 2] - boxes[:, None, 2]))
+        dy = np.minimum(np.abs(boxes[None, :, 1] - boxes[:, None, 1]), np.abs(boxes[None, :, 3] - boxes[:, None, 3]))
+        distances = np.hypot(dx, dy) * self._pixel_to_cm_scales(heights)
+        np.fill_diagonal(distances, 0)
+        return distances.astype(np.float32)
+
+    def calculate_center_points_distance(self, detections):
+        boxes, heights = self._boxes_and_heights(detections)
+        centers = (boxes[:, :2] + boxes[:, 2:]) / 2
+        distances = cdist(centers, centers) * self._pixel_to_cm_scales(heights)
+        np.fill_diagonal(distances, 0)
+        return distances.astype(np.float32)
+
+    def calculate_violating_pairs(self, detections):
+        """
+        Finds the pairs of objects closer than the distance threshold without computing the full distance matrix.
+        The objects are bucketed in a uniform grid, so only the pairs of nearby objects are measured.
+
+        returns:
+        violating_objects: a (K, 2) ndarray with the indexes (i < j) of the violating pairs, sorted as the ones
+        returned by `extract_violating_objects`.
+        distances: a (K,) ndarray with the distance of each pair (cm)
+        """
+        count = len(detections)
+        if count < 2:
+            return np.zeros((0, 2), dtype=int), np.zeros(0, dtype=np.float32)
+        if self.dist_method == self.CALIBRATED_DISTANCE:
+            points_sets = [self.transform_to_world_coordinates(detections)]
+            radius = self.dist_threshold
+        else:
+            boxes, heights = self._boxes_and_heights(detections)
+            if self.dist_method == self.FOUR_CORNER_DISTANCE:
+                points_sets = [boxes[:, [0, 1]], boxes[:, [2, 1]], boxes[:, [0, 3]], boxes[:, [2, 3]]]
+            elif self.dist_method == self.CENTER_POINTS_DISTANCE:
+                points_sets = [(boxes[:, :2] + boxes[:, 2:]) / 2]
+            else:
+                raise ValueError(f"Not supported distance method {self.dist_method}")
+            # The pixel to cm factor of a pair is larger than the one of the tallest box, so any violating pair is
+            # closer than this radius (in pixels) in at least one of the points sets
+            radius = self.dist_threshold * heights.max() / 170
+        candidates = [grid_candidate_pairs(points, radius) for points in points_sets]
+        # Sorted pairs without duplicates
+        pair_keys = np.unique(np.concatenate([rows * count + cols for rows, cols in candidates]))
+        rows, cols = pair_keys // count, pair_keys % count
+        if self.dist_method == self.CALIBRATED_DISTANCE:
+            points = points_sets[0]
+            distances = np.hypot(*(points[rows] - points[cols]).T)
+        elif self.dist_method == self.FOUR_CORNER_DISTANCE:
+            dx = np.minimum(np.abs(boxes[rows, 0] - boxes[cols, 0]), np.abs(boxes[rows, 2] - boxes[cols, 2]))
+            dy = np.minimum(np.abs(boxes[rows, 1] - boxes[cols, 1]), np.abs(boxes[rows, 3] - boxes[cols, 3]))
+            distances = np.hypot(dx, dy) * self._pixel_to_cm_scales(heights, rows, cols)
+        else:
+            points = points_sets[0]
+            distances = np.hypot(*(points[rows] - points[cols]).T) * self._pixel_to_cm_scales(heights, rows, cols)
+        violating = distances < self.dist_threshold
+        return np.stack([rows[violating], cols[violating]], axis=1), distances[violating].astype(np.float32)
+
+    def calculate_calibrated_distance(self, detections):
+        world_coordinate_points = self.transform_to_world_coordinates(detections)
         if len(world_coordinate_points) == 0:
             return np.array([])
         return cdist(world_coordinate_points, world_coordinate_points)
 
+    def transform_to_world_coordinates(self, detections):
+        """
+        Transforms the center of the bottom line of all the bounding boxes of the DetectionBatch from image coordinates
+        to world coordinates at once, with the ground plane lookup table if it's enabled or with the homography matrix
+        otherwise. Returns a numpy array of shape (N, 2) with the (X, Y) of the transformed points.
+        """
+        return self.transform_boxes_to_world_coordinates(detections.bboxes_real)
+
+    def transform_boxes_to_world_coordinates(self, boxes):
+        """ Same as `transform_to_world_coordinates` for a (N, 4) array of boxes (xmin,ymin,xmax,ymax) in pixels """
+        boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+        floor_points = np.stack([((boxes[:, 0] + boxes[:, 2]) / 2).astype(int), boxes[:, 3]], axis=1)
+        if self.ground_plane_lookup is not None:
+            return self.ground_plane_lookup.world_points(floor_points)
+        return project_to_world(self.h_inv, floor_points)
+
     def transform_to_world_coordinate(self, bbox):
         """
         This function will transform the center of the bottom line of a bounding box from image coordinate to world
@@ -135,10 +225,7 @@ class SocialDistancePostProcessor:
             A numpy array of (X,Y) of transformed point
 
         """
-        floor_point = np.array([int((bbox["bboxReal"][0] + bbox["bboxReal"][2]) / 2), bbox["bboxReal"][3], 1])
-        floor_world_point = np.matmul(self.h_inv, floor_point)
-        floor_world_point = floor_world_point[:-1] / floor_world_point[-1]
-        return floor_world_point
+        return self.transform_boxes_to_world_coordinates([bbox["bboxReal"]])[0]
 
     def calculate_distance_of_two_points_of_boxes(self, first_point, second_point):
 
@@ -169,34 +256,36 @@ class SocialDistancePostProcessor:
         ly = dy * 170 * (1 / h1 + 1 / h2) / 2
         return math.sqrt(lx ** 2 + ly ** 2)
 
-    def calculate_distancing(self, objects_list):
+    def calculate_distancing(self, detections):
         """
-        this function post-process the raw boxes of object detector and calculate a distance matrix
-        for detected bounding boxes.
-        post processing is consist of:
-        1. omitting large boxes by filtering boxes which are bigger than the 1/4 of the size the image.
-        2. omitting duplicated boxes by applying an auxilary non-maximum-suppression.
-        3. apply a simple object tracker to make the detection more robust.
+        this function calculates a distance matrix for the detected bounding boxes.
 
         params:
-        object_list: a list of dictionaries. each dictionary has attributes of a detected object such as
-        "id", "centroid" (a tuple of the normalized centroid coordinates (cx,cy,w,h) of the box) and "bbox" (a tuple
-        of the normalized (xmin,ymin,xmax,ymax) coordinate of the box)
+        detections: the DetectionBatch with the objects of the frame
 
         returns:
-        object_list: the post processed version of the input
         distances: a NxN ndarray which i,j element is distance between i-th and l-th bounding box
 
         """
-        for i, item in enumerate(objects_list):
-            item["id"] = item["id"].split("-")[0] + "-" + str(i)
-        distances = self.calculate_box_distances(objects_list)
-
-        return distances
-
-    def process(self, cv_image, objects_list, post_processing_data):
-        post_processing_data["distances"] = self.calculate_distancing(objects_list)
-        post_processing_data["violating_objects"] = extract_violating_objects(
-            post_processing_data["distances"], self.dist_threshold)
+        return self.calculate_box_distances(detections)
+
+    def process(self, cv_image, detections, post_processing_data):
+        count = len(detections)
+        if self.pairs_only:
+            violating_objects, pair_distances = self.calculate_violating_pairs(detections)
+            min_distances = np.full(count, self.dist_threshold, dtype=np.float32)
+            np.minimum.at(min_distances, violating_objects[:, 0], pair_distances)
+            np.minimum.at(min_distances, violating_objects[:, 1], pair_distances)
+        else:
+            distances = self.calculate_distancing(detections)
+            post_processing_data["distances"] = distances
+            violating_objects = extract_violating_objects(distances, self.dist_threshold)
+            if count > 1:
+                min_distances = np.amin(distances + np.identity(len(distances)) * self.dist_threshold * 2, 0)
+            else:
+                min_distances = np.full(count, self.dist_threshold, dtype=np.float32)
+        post_processing_data["violating_objects"] = violating_objects
+        # Distance of each object to the closest one (or the threshold if it's farther)
+        post_processing_data["min_distances"] = np.minimum(min_distances, self.dist_threshold)
         post_processing_data["dist_threshold"] = self.dist_threshold
-        return cv_image, objects_list, post_processing_data
+        return cv_image, detections, post_processing_data
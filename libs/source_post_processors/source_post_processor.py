@@ -1,3 +1,6 @@
+from libs.utils.detection_batch import DetectionBatch
+
+
 class SourcePostProcessor:
 
     def __init__(self, config, source: str, post_processor: str):
@@ -15,5 +18,10 @@ class SourcePostProcessor:
         else:
             raise ValueError(f"Not supported post processor named: {self.post_processor_name}")
 
-    def process(self, cv_image, objects_list, post_processing_data):
-        return self.post_processor.process(cv_image, objects_list, post_processing_data)
+    def process(self, cv_image, detections, post_processing_data):
+        if getattr(self.post_processor, "accepts_detection_batch", False):
+            return self.post_processor.process(cv_image, detections, post_processing_data)
+        # Post processors that work with the list of objects of each frame
+        cv_image, objects_list, post_processing_data = self.post_processor.process(
+            cv_image, detections.to_objects(), post_processing_data)
+        return cv_image, DetectionBatch.from_objects(objects_list, detections.resolution), post_processing_data
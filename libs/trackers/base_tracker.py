@@ -2,7 +2,7 @@ from collections import OrderedDict
 import numpy as np
 from scipy.spatial import distance
 from libs.trackers.utils.misc import get_centroids
-from libs.trackers.track import Track
+from libs.trackers.track import Track, TrackStore
 
 
 class BaseTracker:
@@ -21,11 +21,21 @@ class BaseTracker:
 
         self.next_track_id = 0  # ID of next object
         self.tracks = OrderedDict()
+        # Data of the tracks, the `Track` objects are views of its records
+        self.track_store = TrackStore()
 
         self.max_lost = max_lost
         self.frame_count = 0
 
-    def _add_track(self, centroid, bbox, class_id, **kwargs):
+    @property
+    def frame_count(self):
+        return self.track_store.frame_count
+
+    @frame_count.setter
+    def frame_count(self, value):
+        self.track_store.frame_count = value
+
+    def _add_track(self, centroid, bbox, class_id, detection_index=-1, **kwargs):
         """
         Add a newly detected object to the queue
 
@@ -37,6 +47,8 @@ class BaseTracker:
                bounding box of the object being tracked as top right and bottom right coordinates.
         class_id : int
                    class label
+        detection_index : int
+                   index of the detection in the current frame
 
         Returns
         -------
@@ -46,9 +58,12 @@ class BaseTracker:
         self.tracks[self.next_track_id] = Track(track_id=self.next_track_id,
                                                 centroid=centroid,
                                                 bbox=bbox,
-                                                class_id=class_id)
+                                                class_id=class_id,
+                                                detection_index=detection_index,
+                                                store=self.track_store)
         for key, value in kwargs.items():
             self.tracks[self.next_track_id].info[key] = value
+        self.tracks[self.next_track_id].last_update_frame = self.frame_count
 
         self.next_track_id += 1
 
@@ -65,14 +80,67 @@ class BaseTracker:
         -------
 
         """
-        del self.tracks[track_id]
+        self.tracks.pop(track_id).release()
 
     def _update_track(self, track_id, centroid, bbox, **kwargs):
-        self.tracks[track_id].centroid = centroid
-        self.tracks[track_id].bbox = bbox
-        self.tracks[track_id].lost = 0
+        track = self.tracks[track_id]
+        elapsed_frames = self.frame_count - track.last_update_frame
+        if elapsed_frames > 0:
+            # Velocity (pixels per frame) between the last two detections
+            track.info["velocity"] = (
+                (float(centroid[0]) - float(track.detected_centroid[0])) / elapsed_frames,
+                (float(centroid[1]) - float(track.detected_centroid[1])) / elapsed_frames
+            )
+        track.centroid = centroid
+        track.bbox = bbox
+        track.detected_centroid = centroid
+        track.detected_bbox = bbox
+        track.last_update_frame = self.frame_count
+        track.lost = 0
         for key, value in kwargs.items():
-            self.tracks[track_id].info[key] = value
+            track.info[key] = value
+
+    def _track_indexes(self):
+        """ Returns the indexes of the tracks (in the order of `tracks`) in the track store """
+        return np.fromiter((track.index for track in self.tracks.values()), dtype=int, count=len(self.tracks))
+
+    def _update_tracks(self, indexes, detection_indexes, centroids, bboxes, scores):
+        """
+        Updates the tracks (identified by their indexes in the track store) matched with a detection in this frame.
+        All the parameters are arrays with one row per track.
+        """
+        store = self.track_store
+        store.detection_index[indexes] = detection_indexes
+        elapsed_frames = np.maximum(self.frame_count - store.last_update_frame[indexes], 1)
+        # Velocity (pixels per frame) between the last two detections
+        store.velocity[indexes] = (centroids - store.detected_centroid[indexes]) / elapsed_frames[:, None]
+        store.centroid[indexes] = centroids
+        store.detected_centroid[indexes] = centroids
+        store.bbox[indexes] = bboxes
+        store.detected_bbox[indexes] = bboxes
+        store.last_update_frame[indexes] = self.frame_count
+        store.lost[indexes] = 0
+        store.score[indexes] = scores
+        store.max_score[indexes] = np.maximum(store.max_score[indexes], scores)
+
+    def predict(self):
+        """
+        Moves the tracks to their expected position in the next frame with a constant velocity model.
+        It's used in the frames in which the detector doesn't run, so the lost counters aren't updated.
+
+        Returns
+        -------
+        outputs : list
+                 List of tracks being currently tracked by the tracker (same format as `update`).
+        """
+        self.frame_count += 1
+        store = self.track_store
+        indexes = self._track_indexes()
+        store.detection_index[indexes] = -1
+        displacements = store.velocity[indexes] * (self.frame_count - store.last_update_frame[indexes])[:, None]
+        store.centroid[indexes] = np.round(store.detected_centroid[indexes] + displacements)
+        store.bbox[indexes] = np.round(store.detected_bbox[indexes] + np.tile(displacements, 2))
+        return self._get_tracks(self.tracks)
 
     def _get_tracks(self, tracks):
         """
@@ -88,23 +156,17 @@ class BaseTracker:
         -------
         outputs : list
                  List of tracks being currently tracked by the tracker.
-                 Each element of this list contains the following tuple:
+                 Each element of this list is a `Track` that can be read as the following tuple:
                  (frame#, trackid, class_id, centroid, bbox, info_dict).
                  class_id is the id for label of the detection.
                  centroid represents the pixel coordinates of the centroid of bounding box, i.e., (x, y).
                  bbox is the bounding box coordinates as (x_top_left, y_top_left, x_bottom_right, y_bottom_right).
                  info_dict is the dictionary of information which may be useful from the tracker (example:
                   number of times tracker was lost while tracking.).
+                 The values are views of the track store, use `Track.snapshot` to keep them after the next update.
 
         """
-        outputs = []
-
-        for trackid, track in tracks.items():
-            track.info['lost'] = track.lost
-            op = (self.frame_count, trackid, track.class_id, track.centroid, track.bbox, track.info)
-            outputs.append(op)
-
-        return outputs
+        return list(tracks.values())
 
     def update(self, bboxes: list, class_ids: list, detection_scores: list):
         """
@@ -140,10 +202,8 @@ class BaseTracker:
         new_detection_scores = np.array(detection_scores)
 
         new_centroids = get_centroids(new_bboxes)
-
-        new_detections = list(zip(
-            range(len(bboxes)), new_bboxes, new_class_ids, new_centroids, new_detection_scores
-        ))
+        # Only the tracks matched in this update keep a detection index
+        self.track_store.detection_index[self._track_indexes()] = -1
 
         if len(bboxes) == 0:  # if no object detected
             lost_ids = list(self.tracks.keys())
@@ -157,25 +217,31 @@ class BaseTracker:
 
         track_ids = list(self.tracks.keys())
         if len(track_ids):
-            old_centroids = np.array([self.tracks[tid].centroid for tid in track_ids])
+            track_indexes = self._track_indexes()
+            old_centroids = self.track_store.centroid[track_indexes]
+            track_class_ids = self.track_store.class_id[track_indexes].tolist()
+            new_class_ids_list = new_class_ids.tolist()
             D = distance.cdist(old_centroids, new_centroids)  # (row, col) = distance between old (row) and new (col)
 
             row_idxs = D.min(axis=1).argsort()  # old tracks sorted as per min distance from new
             col_idxs = D.argmin(axis=1)[row_idxs]  # new tracks sorted as per min distance from old
 
             assigned_rows, assigned_cols = set(), set()
-            for (row_idx, col_idx) in zip(row_idxs, col_idxs):
+            matched_rows, matched_cols = [], []
+            for (row_idx, col_idx) in zip(row_idxs.tolist(), col_idxs.tolist()):
                 if row_idx in assigned_rows or col_idx in assigned_cols:
                     continue
 
-                track_id = track_ids[row_idx]
-
-                col_idx, bbox, class_id, centroid, detection_score = new_detections[col_idx]
-
-                if self.tracks[track_id].class_id == class_id:
-                    self._update_track(track_id, centroid, bbox, score=detection_score)
+                if track_class_ids[row_idx] == new_class_ids_list[col_idx]:
                     assigned_rows.add(row_idx)
                     assigned_cols.add(col_idx)
+                    matched_rows.append(row_idx)
+                    matched_cols.append(col_idx)
+            # The assigned tracks are updated all at once
+            matched_cols = np.array(matched_cols, dtype=int)
+            self._update_tracks(track_indexes[np.array(matched_rows, dtype=int)], matched_cols,
+                                new_centroids[matched_cols], new_bboxes[matched_cols],
+                                new_detection_scores[matched_cols])
 
             unassigned_rows = set(range(0, D.shape[0])).difference(assigned_rows)
             unassigned_cols = set(range(0, D.shape[1])).difference(assigned_cols)
@@ -189,10 +255,10 @@ class BaseTracker:
                         self._remove_track(track_id)
             else:
                 for col_idx in unassigned_cols:
-                    self._add_track(new_centroids[col_idx], bboxes[col_idx], class_ids[col_idx])
+                    self._add_track(new_centroids[col_idx], bboxes[col_idx], class_ids[col_idx], col_idx)
         else:
             for i in range(0, len(bboxes)):
-                self._add_track(new_centroids[i], bboxes[i], class_ids[i])
+                self._add_track(new_centroids[i], bboxes[i], class_ids[i], i)
 
         outputs = self._get_tracks(self.tracks)
         return outputs
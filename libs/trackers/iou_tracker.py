@@ -4,7 +4,9 @@ https://github.com/bochinski/iou-tracker
 """
 
 import numpy as np
-from libs.trackers.utils.misc import get_centroids, iou
+from scipy.optimize import linear_sum_assignment
+
+from libs.trackers.utils.misc import get_centroids, iou_matrix
 from libs.trackers.base_tracker import BaseTracker
 
 
@@ -51,33 +53,37 @@ class IOUTracker(BaseTracker):
 
         self.frame_count += 1
 
-        new_bboxes = np.array(bboxes, dtype='int')
+        new_bboxes = np.array(bboxes, dtype='int').reshape(-1, 4)
         new_class_ids = np.array(class_ids, dtype='int')
-        new_detection_scores = np.array(detection_scores)
+        new_detection_scores = np.array(detection_scores, dtype=float)
         new_centroids = get_centroids(new_bboxes)
 
-        new_detections = list(zip(new_bboxes, new_class_ids, new_centroids, new_detection_scores))
         track_ids = list(self.tracks.keys())
-
-        updated_tracks = []
-        for track_id in track_ids:
-            if len(new_detections) > 0:
-                idx, best_match = max(enumerate(new_detections), key=lambda x: iou(self.tracks[track_id].bbox, x[1][0]))
-                (bb, cid, ctrd, scr) = best_match
-
-                if iou(self.tracks[track_id].bbox, bb) > self.iou_threshold:
-                    max_score = max(self.tracks[track_id].info['max_score'], scr)
-                    self._update_track(track_id, ctrd, bb, score=scr, max_score=max_score)
-                    updated_tracks.append(track_id)
-                    del new_detections[idx]
-
-            if len(updated_tracks) == 0 or track_id is not updated_tracks[-1]:
-                self.tracks[track_id].lost += 1
-                if self.tracks[track_id].lost > self.max_lost:
-                    self._remove_track(track_id)
-
-        for bb_, cid_, ctrd_, scr_ in new_detections:
-            self._add_track(ctrd_, bb_, cid_, score=scr_, max_score=scr_)
+        track_indexes = self._track_indexes()
+        rows, cols = np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+        if len(track_ids) and len(new_bboxes):
+            # IoU of every track (rows) with every detection (columns), matched with a global assignment
+            ious = iou_matrix(self.track_store.bbox[track_indexes], new_bboxes)
+            rows, cols = linear_sum_assignment(-ious)
+            matched = ious[rows, cols] > self.iou_threshold
+            rows, cols = rows[matched], cols[matched]
+
+        # Only the tracks matched in this update keep a detection index
+        self.track_store.detection_index[track_indexes] = -1
+        self._update_tracks(track_indexes[rows], cols, new_centroids[cols], new_bboxes[cols], new_detection_scores[cols])
+
+        unmatched_rows = np.ones(len(track_ids), dtype=bool)
+        unmatched_rows[rows] = False
+        unmatched_indexes = track_indexes[unmatched_rows]
+        self.track_store.lost[unmatched_indexes] += 1
+        for row in np.flatnonzero(unmatched_rows)[self.track_store.lost[unmatched_indexes] > self.max_lost]:
+            self._remove_track(track_ids[row])
+
+        unmatched_cols = np.ones(len(new_bboxes), dtype=bool)
+        unmatched_cols[cols] = False
+        for col in np.flatnonzero(unmatched_cols).tolist():
+            self._add_track(new_centroids[col], new_bboxes[col], new_class_ids[col], col,
+                            score=new_detection_scores[col], max_score=new_detection_scores[col])
 
         outputs = self._get_tracks(self.tracks)
         return outputs
@@ -0,0 +1,162 @@
+"""
+Implementation of this algorithm is heavily based on the following:
+https://github.com/abewley/sort
+"""
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+from libs.trackers.utils.misc import get_centroids, iou_matrix
+from libs.trackers.base_tracker import BaseTracker
+
+# Constant velocity model of the state (cx, cy, s, r, vx, vy, vs), where (cx, cy) is the centroid of the box, s its
+# area and r its aspect ratio. The measurements are (cx, cy, s, r).
+TRANSITION_MATRIX = np.eye(7)
+TRANSITION_MATRIX[0, 4] = TRANSITION_MATRIX[1, 5] = TRANSITION_MATRIX[2, 6] = 1
+PROCESS_NOISE = np.diag([1, 1, 1, 1, 0.01, 0.01, 0.0001])
+MEASUREMENT_NOISE = np.diag([1, 1, 10, 10])
+# High uncertainty for the (unobserved) initial velocities
+INITIAL_COVARIANCE = np.diag([10, 10, 10, 10, 10000, 10000, 10000])
+
+
+def bboxes_to_measurements(bboxes):
+    """ Converts an array of boxes (x0, y0, x1, y1) into an array of measurements (cx, cy, s, r) """
+    bboxes = np.asarray(bboxes, dtype=float).reshape(-1, 4)
+    w = bboxes[:, 2] - bboxes[:, 0]
+    h = bboxes[:, 3] - bboxes[:, 1]
+    return np.stack([bboxes[:, 0] + w / 2, bboxes[:, 1] + h / 2, w * h, w / np.maximum(h, 1e-6)], axis=1)
+
+
+def states_to_bboxes(states):
+    """ Converts an array of states (cx, cy, s, r, ...) into an array of integer boxes (x0, y0, x1, y1) """
+    w = np.sqrt(np.clip(states[:, 2] * states[:, 3], 0, None))
+    h = np.where(w > 0, np.clip(states[:, 2], 0, None) / np.maximum(w, 1e-6), 0)
+    bboxes = np.stack([states[:, 0] - w / 2, states[:, 1] - h / 2, states[:, 0] + w / 2, states[:, 1] + h / 2], axis=1)
+    return np.round(bboxes).astype(int)
+
+
+class SORTTracker(BaseTracker):
+    """
+    SORT tracker: each track follows a constant velocity Kalman filter and the detections are assigned to the
+    predicted boxes solving the optimal assignment problem of their IoU.
+    The Kalman filters of all the tracks are stored in arrays (one row per track, in the same order as `tracks`), so
+    the predictions and corrections of a frame are computed in a few vectorized operations.
+    """
+
+    def __init__(self, max_lost=5, iou_threshold=0.3):
+        self.iou_threshold = iou_threshold
+        self.states = np.zeros((0, 7))
+        self.covariances = np.zeros((0, 7, 7))
+        super(SORTTracker, self).__init__(max_lost=max_lost)
+
+    def _predict_states(self):
+        # Prevent the predicted area from becoming negative
+        self.states[self.states[:, 2] + self.states[:, 6] <= 0, 6] = 0
+        self.states = self.states @ TRANSITION_MATRIX.T
+        self.covariances = TRANSITION_MATRIX @ self.covariances @ TRANSITION_MATRIX.T + PROCESS_NOISE
+
+    def _correct_states(self, rows, measurements):
+        states = self.states[rows]
+        covariances = self.covariances[rows]
+        # The measurement matrix selects the first 4 components of the state
+        residuals = measurements - states[:, :4]
+        # Each measured component is only correlated with its own velocity (the model matrices are diagonal or
+        # block-diagonal), so the residual covariance is diagonal and its inverse is element-wise
+        residual_variances = np.diagonal(covariances[:, :4, :4], axis1=1, axis2=2) + np.diag(MEASUREMENT_NOISE)
+        gains = covariances[:, :, :4] / residual_variances[:, None, :]
+        self.states[rows] = states + (gains @ residuals[:, :, None])[:, :, 0]
+        self.covariances[rows] = covariances - gains @ covariances[:, :4, :]
+
+    def update(self, bboxes: list, class_ids: list, detection_scores: list):
+        """
+        Update the tracker based on the new bboxes as input.
+
+        Parameters
+        ----------
+        bboxes : list
+                 List of bounding boxes detected in the current frame/timestep. Each element of the list represent
+                 coordinates of bounding box as tuple (top-left-x, top-left-y, bottom-right-x, bottom-right-y).
+        class_ids : list
+                    List of class_ids (int) corresponding to labels of the detected object. Default is `None`.
+        detection_scores: list
+                         List of detection scores / probability of each detected object or objectness.
+
+        Returns
+        -------
+        outputs : list
+                 List of tracks being currently tracked by the tracker.
+                 Each element of this list contains the tuple in
+                 format (frame#, trackid, class_id, centroid, bbox, info_dict).
+                 For the tracks matched in this frame, bbox is the detected bounding box, for the rest it's the
+                 predicted one.
+        """
+        self.frame_count += 1
+        self._predict_states()
+
+        new_bboxes = np.array(bboxes, dtype='int').reshape(-1, 4)
+        new_class_ids = np.array(class_ids, dtype='int')
+        new_detection_scores = np.array(detection_scores, dtype=float)
+        new_centroids = get_centroids(new_bboxes)
+
+        track_ids = list(self.tracks.keys())
+        track_indexes = self._track_indexes()
+        predicted_bboxes = states_to_bboxes(self.states)
+        rows, cols = np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+        if len(track_ids) and len(new_bboxes):
+            ious = iou_matrix(predicted_bboxes, new_bboxes)
+            track_class_ids = self.track_store.class_id[track_indexes]
+            ious[track_class_ids[:, None] != new_class_ids[None, :]] = 0
+            rows, cols = linear_sum_assignment(-ious)
+            matched = ious[rows, cols] >= self.iou_threshold
+            rows, cols = rows[matched], cols[matched]
+            self._correct_states(rows, bboxes_to_measurements(new_bboxes[cols]))
+
+        # Only the tracks matched in this update keep a detection index
+        self.track_store.detection_index[track_indexes] = -1
+        self._update_tracks(track_indexes[rows], cols, new_centroids[cols], new_bboxes[cols], new_detection_scores[cols])
+        # The velocity estimated by the Kalman filter is smoother than the one between the last two detections
+        self.track_store.velocity[track_indexes[rows]] = self.states[rows, 4:6]
+
+        # Unmatched tracks keep the predicted position
+        unmatched_rows = np.ones(len(track_ids), dtype=bool)
+        unmatched_rows[rows] = False
+        unmatched_indexes = track_indexes[unmatched_rows]
+        self.track_store.bbox[unmatched_indexes] = predicted_bboxes[unmatched_rows]
+        self.track_store.centroid[unmatched_indexes] = get_centroids(predicted_bboxes[unmatched_rows])
+        self.track_store.lost[unmatched_indexes] += 1
+        keep = np.ones(len(track_ids), dtype=bool)
+        for row in np.flatnonzero(unmatched_rows)[self.track_store.lost[unmatched_indexes] > self.max_lost]:
+            self._remove_track(track_ids[row])
+            keep[row] = False
+        if not keep.all():
+            self.states = self.states[keep]
+            self.covariances = self.covariances[keep]
+
+        unmatched_cols = np.ones(len(new_bboxes), dtype=bool)
+        unmatched_cols[cols] = False
+        unmatched_cols = np.flatnonzero(unmatched_cols)
+        if len(unmatched_cols):
+            for col in unmatched_cols:
+                self._add_track(new_centroids[col], new_bboxes[col], new_class_ids[col], col,
+                                score=new_detection_scores[col], max_score=new_detection_scores[col])
+            new_states = np.zeros((len(unmatched_cols), 7))
+            new_states[:, :4] = bboxes_to_measurements(new_bboxes[unmatched_cols])
+            self.states = np.concatenate([self.states, new_states])
+            self.covariances = np.concatenate(
+                [self.covariances, np.repeat(INITIAL_COVARIANCE[None, :, :], len(unmatched_cols), axis=0)])
+
+        return self._get_tracks(self.tracks)
+
+    def predict(self):
+        """
+        Moves the tracks to the position predicted by their Kalman filters in the next frame.
+        It's used in the frames in which the detector doesn't run, so the lost counters aren't updated.
+        """
+        self.frame_count += 1
+        self._predict_states()
+        predicted_bboxes = states_to_bboxes(self.states)
+        track_indexes = self._track_indexes()
+        self.track_store.detection_index[track_indexes] = -1
+        self.track_store.bbox[track_indexes] = predicted_bboxes
+        self.track_store.centroid[track_indexes] = get_centroids(predicted_bboxes)
+        return self._get_tracks(self.tracks)
@@ -1,32 +1,228 @@
+import numpy as np
+
+from collections.abc import MutableMapping
+
+# Fields stored for each track. The detected_* fields keep the last position reported by the detector, used to
+# predict the position in the frames without detections
+TRACK_DTYPE = np.dtype([
+    ("id", np.int64),
+    ("class_id", np.int64),
+    ("centroid", np.int64, (2,)),
+    ("bbox", np.int64, (4,)),
+    ("detected_centroid", np.int64, (2,)),
+    ("detected_bbox", np.int64, (4,)),
+    ("lost", np.int64),
+    ("last_update_frame", np.int64),
+    ("score", np.float64),
+    ("max_score", np.float64),
+    ("velocity", np.float64, (2,)),
+    # Index of the detection matched with the track in the last update (-1 if it wasn't matched)
+    ("detection_index", np.int64),
+])
+# Fields exposed by the `info` of the tracks
+TRACK_INFO_FIELDS = ("max_score", "lost", "score", "velocity")
+
+
+class TrackStore:
+    """
+    Stores the data of all the tracks of a tracker in a single structured array (one record per track), so the
+    trackers can read and update all the tracks with vectorized operations. Each field can be accessed as an array
+    attribute (e.g. `store.bbox`, with shape (capacity, 4)). The records of the removed tracks are reused.
+
+    :param capacity: The initial number of records. The store grows automatically when it's full.
+    """
+
+    def __init__(self, capacity=64):
+        self.frame_count = 0
+        self.records = np.zeros(0, dtype=TRACK_DTYPE)
+        self.free_indexes = []
+        self._grow(max(1, capacity))
+
+    def _grow(self, capacity):
+        previous_capacity = len(self.records)
+        records = np.zeros(capacity, dtype=TRACK_DTYPE)
+        records[:previous_capacity] = self.records
+        self.records = records
+        for field in TRACK_DTYPE.names:
+            setattr(self, field, self.records[field])
+        # Lower indexes are used first
+        self.free_indexes.extend(range(capacity - 1, previous_capacity - 1, -1))
+
+    def allocate(self):
+        if not self.free_indexes:
+            self._grow(2 * len(self.records))
+        index = self.free_indexes.pop()
+        self.records[index] = 0
+        return index
+
+    def release(self, index):
+        self.free_indexes.append(index)
+
+
 class Track:
+    """
+    Track
+
+    View of the record of a track in a TrackStore. For compatibility with the trackers outputs, a track can also be
+    read as the tuple (frame#, trackid, class_id, centroid, bbox, info_dict), where centroid and bbox are views of
+    the store arrays (they are updated in place by the tracker, copy them to keep their current values).
+
+    Parameters
+    ----------
+    track_id : int
+               Track id.
+    centroid : tuple
+               Centroid of the track pixel coordinate (x, y).
+    bbox : tuple, list, numpy.ndarray
+           Bounding box of the track.
+    class_id : int
+               Class label id.
+    detection_index : int
+               Index of the detection that started the track in the current frame.
+    store : TrackStore
+            The store of the track data. If it's not provided, the track uses its own store.
+    """
+    __slots__ = ("store", "index", "info")
     count = 0
 
-    def __init__(self, track_id, centroid, bbox=None, class_id=None):
-        """
-        Track
-
-        Parameters
-        ----------
-        track_id : int
-                   Track id.
-        centroid : tuple
-                   Centroid of the track pixel coordinate (x, y).
-        bbox : tuple, list, numpy.ndarray
-               Bounding box of the track.
-        class_id : int
-                   Class label id.
-        """
-        self.id = track_id
-        self.class_id = class_id
+    def __init__(self, track_id, centroid, bbox=None, class_id=None, detection_index=-1, store=None):
+        self.store = store if store is not None else TrackStore(1)
+        self.index = self.store.allocate()
+        self.info = TrackInfo(self)
 
         Track.count += 1
 
-        self.centroid = centroid
-        self.bbox = bbox
-        self.lost = 0
+        self.store.id[self.index] = track_id
+        self.store.class_id[self.index] = class_id if class_id is not None else -1
+        self.store.detection_index[self.index] = detection_index
+        self.centroid = self.detected_centroid = centroid
+        if bbox is not None:
+            self.bbox = self.detected_bbox = bbox
+
+    def release(self):
+        """ Returns the record of the track to the store """
+        self.store.release(self.index)
+
+    @property
+    def id(self):
+        return int(self.store.id[self.index])
+
+    @property
+    def class_id(self):
+        return int(self.store.class_id[self.index])
+
+    @property
+    def centroid(self):
+        return self.store.centroid[self.index]
+
+    @centroid.setter
+    def centroid(self, value):
+        self.store.centroid[self.index] = value
+
+    @property
+    def bbox(self):
+        return self.store.bbox[self.index]
+
+    @bbox.setter
+    def bbox(self, value):
+        self.store.bbox[self.index] = value
+
+    @property
+    def detected_centroid(self):
+        return self.store.detected_centroid[self.index]
+
+    @detected_centroid.setter
+    def detected_centroid(self, value):
+        self.store.detected_centroid[self.index] = value
+
+    @property
+    def detected_bbox(self):
+        return self.store.detected_bbox[self.index]
+
+    @detected_bbox.setter
+    def detected_bbox(self, value):
+        self.store.detected_bbox[self.index] = value
+
+    @property
+    def lost(self):
+        return int(self.store.lost[self.index])
+
+    @lost.setter
+    def lost(self, value):
+        self.store.lost[self.index] = value
+
+    @property
+    def detection_index(self):
+        return int(self.store.detection_index[self.index])
+
+    @property
+    def last_update_frame(self):
+        return int(self.store.last_update_frame[self.index])
+
+    @last_update_frame.setter
+    def last_update_frame(self, value):
+        self.store.last_update_frame[self.index] = value
+
+    def __len__(self):
+        return 6
+
+    def __iter__(self):
+        return iter((self.store.frame_count, self.id, self.class_id, self.centroid, self.bbox, self.info))
+
+    def __getitem__(self, item):
+        if item == 1:
+            return self.id
+        elif item == 3:
+            return self.centroid
+        elif item == 4:
+            return self.bbox
+        elif item == 5:
+            return self.info
+        return tuple(self)[item]
+
+    def snapshot(self):
+        """ Returns the track tuple with copies of the current values """
+        return (self.store.frame_count, self.id, self.class_id, self.centroid.copy(), self.bbox.copy(),
+                dict(self.info))
+
+
+class TrackInfo(MutableMapping):
+    """
+    Dict-like view of the information of a track stored in a TrackStore (max_score, lost, score and velocity).
+    Copies of the info (copy.copy or copy.deepcopy) are plain dicts.
+    """
+    __slots__ = ("track",)
+
+    def __init__(self, track):
+        self.track = track
+
+    def __getitem__(self, key):
+        if key not in TRACK_INFO_FIELDS:
+            raise KeyError(key)
+        value = getattr(self.track.store, key)[self.track.index]
+        if key == "velocity":
+            return (float(value[0]), float(value[1]))
+        return value.item()
+
+    def __setitem__(self, key, value):
+        if key not in TRACK_INFO_FIELDS:
+            raise KeyError(f"Not supported track info: {key}")
+        getattr(self.track.store, key)[self.track.index] = value
+
+    def __delitem__(self, key):
+        raise KeyError(f"Track info can't be removed: {key}")
+
+    def __iter__(self):
+        return iter(TRACK_INFO_FIELDS)
+
+    def __len__(self):
+        return len(TRACK_INFO_FIELDS)
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return dict(self)
 
-        self.info = dict(
-            max_score=0.0,
-            lost=0,
-            score=0.0,
-        )
+    def __repr__(self):
+        return repr(dict(self))
@@ -1,7 +1,8 @@
-import functools
+import numpy as np
 
 from .base_tracker import BaseTracker
 from .iou_tracker import IOUTracker
+from .sort_tracker import SORTTracker
 
 
 class Tracker:
@@ -19,6 +20,11 @@ class Tracker:
                 min_detection_confidence=0.2,
                 max_detection_confidence=1.0
             )
+        elif tracker_name == "SORTTracker":
+            self.tracker = SORTTracker(
+                max_lost=int(self.config.get_section_dict("Tracker")["MaxLost"]),
+                iou_threshold=float(self.config.get_section_dict("Tracker")["TrackerIOUThreshold"])
+            )
         else:
             raise ValueError(f"Not supported tracker named: {tracker_name}")
         self.resolution = tuple([int(i) for i in self.config.get_section_dict("App")["Resolution"].split(",")])
@@ -26,20 +32,36 @@ class Tracker:
     def update(self, bboxes: list, class_ids: list, detection_scores: list):
         return self.tracker.update(bboxes, class_ids, detection_scores)
 
-    def object_post_process(self, object: dict, tracks: list):
-        [w, h] = self.resolution
-        box = object["bbox"]
-        x0 = box[1]
-        y0 = box[0]
-        x1 = box[3]
-        y1 = box[2]
-        object["centroid"] = [(x0 + x1) / 2, (y0 + y1) / 2, x1 - x0, y1 - y0]
-        object["bbox"] = [x0, y0, x1, y1]
-        object["centroidReal"] = [(x0 + x1) * w / 2, (y0 + y1) * h / 2, (x1 - x0) * w, (y1 - y0) * h]
-        object["bboxReal"] = [x0 * w, y0 * h, x1 * w, y1 * h]
+    def predict(self):
+        return self.tracker.predict()
+
+    def propagate_detections(self, detections, tracks: list):
+        """
+        Returns a copy of the tracked objects of the DetectionBatch processed in the last frame with detections moved
+        to the position predicted for their tracks. Used in the frames in which the detector doesn't run.
+        """
+        rows_by_trackid = {track_id: row for row, track_id in enumerate(detections.track_ids.tolist()) if track_id >= 0}
+        rows, track_bboxes, track_infos = [], [], []
+        for track in tracks:
+            row = rows_by_trackid.get(track[1])
+            if row is None:
+                continue
+            rows.append(row)
+            track_bboxes.append(track[4])
+            track_infos.append(track[5])
+        propagated_detections = detections.select(np.array(rows, dtype=int)).copy()
+        if rows:
+            propagated_detections.bboxes = np.array(track_bboxes, dtype=float) / propagated_detections.scale
+        propagated_detections.track_infos = track_infos
+        return propagated_detections
+
+    def objects_post_process(self, detections, tracks: list):
+        """
+        Sets the track ids and infos of the objects of the DetectionBatch matched with a track in the last update,
+        using the index of the detection stored in each track.
+        """
         for track in tracks:
-            track_count, trackid, class_id_o, centroid, track_bbox, track_info = track
-            selected_box = [int(x0 * w), int(y0 * h), int(x1 * w), int(y1 * h)]
-            if functools.reduce(lambda x, y: x and y, map(lambda p, q: p == q, selected_box, track_bbox), True):
-                object["tracked_id"] = trackid
-                object["track_info"] = track_info
+            detection_index = track.detection_index
+            if detection_index >= 0:
+                detections.track_ids[detection_index] = track.id
+                detections.track_infos[detection_index] = track.info
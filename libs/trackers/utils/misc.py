@@ -32,7 +32,7 @@ def get_centroids(bboxes):
         centroids = np.concatenate([x, y], axis=1)
         return centroids
     else:
-        return bboxes
+        return np.zeros((0, 2), dtype='int')
 
 
 def iou(bbox1, bbox2):
@@ -77,3 +77,43 @@ def iou(bbox1, bbox2):
     iou_ = size_intersection / size_union
 
     return iou_
+
+
+def iou_matrix(bboxes1, bboxes2):
+    """
+    Calculates the intersection-over-union of every pair of bounding boxes of two sets.
+
+    Parameters
+    ----------
+    bboxes1 : numpy.array
+              array of shape (n, 4) with bounding boxes in format (x-top-left, y-top-left, x-bottom-right,
+              y-bottom-right).
+    bboxes2 : numpy.array
+              array of shape (m, 4) with bounding boxes in the same format.
+
+    Returns
+    -------
+    ious: numpy.array
+          array of shape (n, m) with the intersection-over-union of bboxes1[i] and bboxes2[j] in the position (i, j).
+    """
+    bboxes1 = np.asarray(bboxes1, dtype=float).reshape(-1, 4)
+    bboxes2 = np.asarray(bboxes2, dtype=float).reshape(-1, 4)
+
+    # The intermediate (n, m) arrays are reused to avoid allocations
+    overlap_w = np.minimum(bboxes1[:, None, 2], bboxes2[None, :, 2])
+    overlap_w -= np.maximum(bboxes1[:, None, 0], bboxes2[None, :, 0])
+    np.maximum(overlap_w, 0, out=overlap_w)
+    overlap_h = np.minimum(bboxes1[:, None, 3], bboxes2[None, :, 3])
+    overlap_h -= np.maximum(bboxes1[:, None, 1], bboxes2[None, :, 1])
+    np.maximum(overlap_h, 0, out=overlap_h)
+    size_intersection = overlap_w
+    size_intersection *= overlap_h
+
+    size_1 = (bboxes1[:, 2] - bboxes1[:, 0]) * (bboxes1[:, 3] - bboxes1[:, 1])
+    size_2 = (bboxes2[:, 2] - bboxes2[:, 0]) * (bboxes2[:, 3] - bboxes2[:, 1])
+    size_union = overlap_h
+    np.add(size_1[:, None], size_2[None, :], out=size_union)
+    size_union -= size_intersection
+    # Degenerated boxes without intersection have IoU 0
+    np.maximum(size_union, 1e-9, out=size_union)
+    return np.divide(size_intersection, size_union, out=size_intersection)
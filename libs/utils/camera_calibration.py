@@ -32,3 +32,84 @@ def compute_and_save_inv_homography_matrix(points: ConfigHomographyMatrix, desti
 
 def get_camera_calibration_path(config, camera_id):
     return f"{get_source_config_directory(config)}/{camera_id}/homography_matrix/h_inverse.txt"
+
+
+def get_ground_plane_lookup_path(config, camera_id, resolution):
+    calibration_directory = os.path.dirname(get_camera_calibration_path(config, camera_id))
+    return f"{calibration_directory}/ground_plane_lookup_{resolution[0]}x{resolution[1]}.npy"
+
+
+def load_inv_homography_matrix(calibration_file):
+    """ Reads the 3x3 inverse homography matrix stored by `compute_and_save_inv_homography_matrix` """
+    with open(calibration_file, "r") as file:
+        h_inv = file.readlines()[0].split(" ")[1:]
+    return np.array(h_inv, dtype="float").reshape((3, 3))
+
+
+def project_to_world(h_inv, points):
+    """
+    Transforms an array of points (N, 2) from image coordinates to world coordinates with the inverse homography
+    matrix, in a single batched operation. Returns an array of shape (N, 2).
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    world_points = points @ h_inv[:, :2].T + h_inv[:, 2]
+    return world_points[:, :2] / world_points[:, 2:]
+
+
+class GroundPlaneLookup:
+    """
+    Table with the world coordinates of every pixel of the camera at the configured resolution, so the projection of
+    the floor points is a gather instead of a matrix product. The table is built once from the inverse homography
+    matrix, stored next to it (it's rebuilt if the calibration changes) and memory-mapped.
+    The pixels that are above the horizon of the ground plane have NaN coordinates.
+    """
+
+    def __init__(self, lookup_table):
+        self.lookup_table = lookup_table
+
+    @classmethod
+    def load(cls, calibration_file, lookup_file, resolution):
+        if not os.path.isfile(lookup_file) or os.path.getmtime(lookup_file) < os.path.getmtime(calibration_file):
+            lookup_table = cls.build_lookup_table(load_inv_homography_matrix(calibration_file), resolution)
+            # Write to a temporary file first, other processes can be reading the previous table
+            tmp_file = f"{lookup_file}.{os.getpid()}.tmp"
+            with open(tmp_file, "wb") as file:
+                np.save(file, lookup_table)
+            os.replace(tmp_file, lookup_file)
+        return cls(np.load(lookup_file, mmap_mode="r"))
+
+    @staticmethod
+    def build_lookup_table(h_inv, resolution):
+        """ Returns an array of shape (height, width, 2) with the world coordinates of each pixel """
+        width, height = resolution
+        xs = np.arange(width, dtype=float)[None, :]
+        ys = np.arange(height, dtype=float)[:, None]
+        lookup_table = np.empty((height, width, 2), dtype=np.float32)
+        w = h_inv[2, 0] * xs + h_inv[2, 1] * ys + h_inv[2, 2]
+        # Points at or behind the horizon don't have a valid projection
+        w = np.where(w > 0, w, np.nan)
+        lookup_table[:, :, 0] = (h_inv[0, 0] * xs + h_inv[0, 1] * ys + h_inv[0, 2]) / w
+        lookup_table[:, :, 1] = (h_inv[1, 0] * xs + h_inv[1, 1] * ys + h_inv[1, 2]) / w
+        return lookup_table
+
+    @property
+    def resolution(self):
+        return self.lookup_table.shape[1], self.lookup_table.shape[0]
+
+    def world_points(self, points):
+        """ Returns the world coordinates (N, 2) of an array of pixels (N, 2) as (x, y), clipped to the image """
+        points = np.asarray(points).reshape(-1, 2).astype(int)
+        xs = np.clip(points[:, 0], 0, self.lookup_table.shape[1] - 1)
+        ys = np.clip(points[:, 1], 0, self.lookup_table.shape[0] - 1)
+        return np.asarray(self.lookup_table[ys, xs], dtype=float)
+
+    def world_bounds(self):
+        """
+        Returns the ((min_x, min_y), (max_x, max_y)) world coordinates of the lower half of the image, where the
+        people are usually walking.
+        """
+        lower_half = self.lookup_table[self.lookup_table.shape[0] // 2:].reshape(-1, 2)
+        lower_half = lower_half[np.isfinite(lower_half).all(axis=1)]
+        if len(lower_half) == 0:
+            return None
+        return lower_half.min(axis=0), lower_half.max(axis=0)
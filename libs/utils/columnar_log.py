@@ -0,0 +1,353 @@
+"""
+Columnar format of the raw data logged by the `file_system_logger` (when `ColumnarLog` is enabled).
+
+The rows of each day are stored in the folder `<objects_log>/<day>/`, with a file per column (`<column>.bin`) where
+the values of the new rows are appended as raw arrays (the dtypes and shapes are in COLUMN_DTYPES and COLUMN_SHAPES,
+and in the `format.json` file of the folder):
+    - Per row: `timestamps` (datetime64[s]), `detected_objects`, `violating_objects`, `environment_scores`,
+      `detection_counts`, `violation_index_counts` and `violation_pair_counts`.
+    - Per detection (in the order of the rows): `bboxes` and `bboxes_real` (x0, y0, x1, y1), `class_ids`,
+      `track_ids` (-1 for the untracked objects) and `face_labels` (-1 without label).
+    - `violation_indexes`: the indexes (inside its row) of the objects that violate the social distancing.
+    - `violation_pairs`: the (i, j) pairs of violating objects (the CSV logs converted to this format don't have
+      them).
+The `timestamps` of a batch of rows are appended after the other columns, so a row is only visible to the readers
+once all its values are stored (the values after the last timestamp are ignored and truncated by the writer).
+A day is loaded with a single read per column, without parsing every row.
+"""
+import json
+import os
+import time
+
+import numpy as np
+
+LOG_FORMAT_VERSION = "2.0"
+ROW_COLUMNS = ["timestamps", "detected_objects", "violating_objects", "environment_scores", "detection_counts",
+               "violation_index_counts", "violation_pair_counts"]
+DETECTION_COLUMNS = ["bboxes", "bboxes_real", "class_ids", "track_ids", "face_labels"]
+COLUMN_DTYPES = {
+    "timestamps": "datetime64[s]",
+    "detected_objects": np.int32,
+    "violating_objects": np.int32,
+    "environment_scores": np.float64,
+    "detection_counts": np.int32,
+    "violation_index_counts": np.int32,
+    "violation_pair_counts": np.int32,
+    "bboxes": np.float64,
+    "bboxes_real": np.float64,
+    "class_ids": np.int32,
+    "track_ids": np.int64,
+    "face_labels": np.int8,
+    "violation_indexes": np.int32,
+    "violation_pairs": np.int32,
+}
+COLUMN_SHAPES = {"bboxes": (0, 4), "bboxes_real": (0, 4), "violation_pairs": (0, 2)}
+# The columns with the number of values of each row of the columns that don't have a value per row
+COUNT_COLUMNS = {
+    "bboxes": "detection_counts",
+    "bboxes_real": "detection_counts",
+    "class_ids": "detection_counts",
+    "track_ids": "detection_counts",
+    "face_labels": "detection_counts",
+    "violation_indexes": "violation_index_counts",
+    "violation_pairs": "violation_pair_counts",
+}
+COLUMN_EXTENSION = ".bin"
+FORMAT_FILE = "format.json"
+# Index of each detection inside its row when it was logged (not stored, the untracked objects are identified by it)
+OBJECT_INDEXES = "object_indexes"
+
+
+def get_columnar_log_directory(objects_log_directory, day):
+    return os.path.join(objects_log_directory, day)
+
+
+def _column_path(directory, column):
+    return os.path.join(directory, column + COLUMN_EXTENSION)
+
+
+def _column_width(column):
+    return int(np.prod(COLUMN_SHAPES.get(column, (0,))[1:]))
+
+
+def _empty_column(column):
+    return np.empty(COLUMN_SHAPES.get(column, (0,)), dtype=COLUMN_DTYPES[column])
+
+
+def _as_column(column, values):
+    return np.asarray(values, dtype=COLUMN_DTYPES[column]).reshape((-1,) + COLUMN_SHAPES.get(column, (0,))[1:])
+
+
+def _offsets(counts):
+    return np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+
+class ColumnarLog:
+    """ The columns of a sequence of rows of the raw data log (see the module docstring) """
+
+    def __init__(self, columns):
+        self.columns = columns
+        if OBJECT_INDEXES not in columns:
+            counts = columns["detection_counts"]
+            columns[OBJECT_INDEXES] = np.arange(counts.sum()) - np.repeat(_offsets(counts)[:-1], counts)
+
+    def __len__(self):
+        return len(self.columns["timestamps"])
+
+    def select_rows(self, mask):
+        """ Returns the rows selected by the boolean `mask` (with their detections and violations) """
+        mask = np.asarray(mask, dtype=bool)
+        columns = {column: self.columns[column][mask] for column in ROW_COLUMNS}
+        detections_mask = np.repeat(mask, self.columns["detection_counts"])
+        for column in DETECTION_COLUMNS + [OBJECT_INDEXES]:
+            columns[column] = self.columns[column][detections_mask]
+        columns["violation_indexes"] = self.columns["violation_indexes"][
+            np.repeat(mask, self.columns["violation_index_counts"])]
+        columns["violation_pairs"] = self.columns["violation_pairs"][
+            np.repeat(mask, self.columns["violation_pair_counts"])]
+        return ColumnarLog(columns)
+
+    def select_time_range(self, time_from, time_until):
+        """ Returns the rows with time_from <= timestamp < time_until (datetimes) """
+        timestamps = self.columns["timestamps"]
+        return self.select_rows(
+            (timestamps >= np.datetime64(time_from, "s")) & (timestamps < np.datetime64(time_until, "s")))
+
+    def select_detections(self, mask):
+        """
+        Returns the rows with only the detections selected by the boolean `mask`. As in the CSV log filtered by the
+        RoI, a selected object keeps violating the social distancing if it violates it with an object that isn't
+        selected (the pairs are only kept if both objects are selected).
+        """
+        mask = np.asarray(mask, dtype=bool)
+        columns = {column: self.columns[column] for column in ROW_COLUMNS}
+        for column in DETECTION_COLUMNS + [OBJECT_INDEXES]:
+            columns[column] = self.columns[column][mask]
+        detection_offsets = _offsets(self.columns["detection_counts"])
+        # The new index (inside its row) of each detection, -1 for the removed ones
+        new_indexes = np.cumsum(mask) - 1
+        row_starts = np.concatenate([[0], np.cumsum(mask)])[detection_offsets[:-1]]
+        new_indexes = np.where(mask, new_indexes - np.repeat(row_starts, self.columns["detection_counts"]), -1)
+        columns["detection_counts"] = self._count_per_row(mask, self.columns["detection_counts"])
+        columns["detected_objects"] = columns["detection_counts"].copy()
+
+        def remap(indexes, counts):
+            # Maps the indexes (inside their rows) to the new indexes, -1 for the removed detections
+            row_offsets = np.repeat(detection_offsets[:-1], counts)
+            if indexes.ndim == 2:
+                row_offsets = row_offsets[:, np.newaxis]
+            return new_indexes[indexes + row_offsets] if len(indexes) else indexes
+
+        violation_indexes = remap(self.columns["violation_indexes"], self.columns["violation_index_counts"])
+        kept_indexes = violation_indexes >= 0
+        columns["violation_indexes"] = violation_indexes[kept_indexes].astype(np.int32)
+        columns["violation_index_counts"] = self._count_per_row(kept_indexes, self.columns["violation_index_counts"])
+        columns["violating_objects"] = columns["violation_index_counts"].copy()
+        violation_pairs = remap(self.columns["violation_pairs"], self.columns["violation_pair_counts"])
+        kept_pairs = np.all(violation_pairs >= 0, axis=1)
+        columns["violation_pairs"] = violation_pairs[kept_pairs].astype(np.int32)
+        columns["violation_pair_counts"] = self._count_per_row(kept_pairs, self.columns["violation_pair_counts"])
+        return ColumnarLog(columns)
+
+    @staticmethod
+    def _count_per_row(kept, counts):
+        rows = np.repeat(np.arange(len(counts)), counts)
+        return np.bincount(rows[kept], minlength=len(counts)).astype(np.int32)
+
+    def rows(self):
+        """
+        Yields the rows as the dicts read from the CSV log, with the `Detections` and `ViolationsIndexes` already
+        parsed (lists).
+        """
+        detection_offsets = _offsets(self.columns["detection_counts"]).tolist()
+        violation_offsets = _offsets(self.columns["violation_index_counts"]).tolist()
+        bboxes = self.columns["bboxes"].tolist()
+        bboxes_real = self.columns["bboxes_real"].tolist()
+        class_ids = self.columns["class_ids"].tolist()
+        track_ids = self.columns["track_ids"].tolist()
+        face_labels = self.columns["face_labels"].tolist()
+        object_indexes = self.columns[OBJECT_INDEXES].tolist()
+        violation_indexes = self.columns["violation_indexes"].tolist()
+        row_columns = zip(
+            np.datetime_as_string(self.columns["timestamps"]).tolist(),
+            self.columns["detected_objects"].tolist(),
+            self.columns["violating_objects"].tolist(),
+            self.columns["environment_scores"].tolist()
+        )
+        for row, (timestamp, detected_objects, violating_objects, environment_score) in enumerate(row_columns):
+            detections = []
+            begin, end = detection_offsets[row], detection_offsets[row + 1]
+            for d in range(begin, end):
+                detection = {
+                    "position": [0.0, 0.0, 0.0],
+                    "bbox_real": bboxes_real[d],
+                    "bbox": bboxes[d],
+                    "tracking_id": track_ids[d] if track_ids[d] >= 0 else f"{class_ids[d]}-{object_indexes[d]}"
+                }
+                if face_labels[d] != -1:
+                    detection["face_label"] = face_labels[d]
+                detections.append(detection)
+            yield {
+                "Version": LOG_FORMAT_VERSION,
+                "Timestamp": timestamp.replace("T", " "),
+                "DetectedObjects": detected_objects,
+                "ViolatingObjects": violating_objects,
+                "EnvironmentScore": environment_score,
+                "Detections": detections,
+                "ViolationsIndexes": violation_indexes[violation_offsets[row]:violation_offsets[row + 1]]
+            }
+
+
+def _read_column(directory, column, length):
+    """ Reads the first `length` values of a column """
+    path = _column_path(directory, column)
+    if length == 0 or not os.path.isfile(path):
+        return _empty_column(column)
+    values = np.fromfile(path, dtype=COLUMN_DTYPES[column], count=length * _column_width(column))
+    return values.reshape((-1,) + COLUMN_SHAPES.get(column, (0,))[1:])
+
+
+def _rows_count(directory):
+    """ Returns the number of rows completely stored in the columnar log of a day """
+    path = _column_path(directory, "timestamps")
+    if not os.path.isfile(path):
+        return 0
+    return os.path.getsize(path) // np.dtype(COLUMN_DTYPES["timestamps"]).itemsize
+
+
+def _committed_lengths(directory, rows_count):
+    """ Returns the number of values (rows, detections or violations) of each column in the first `rows_count` rows """
+    lengths = {column: rows_count for column in ROW_COLUMNS}
+    for column, count_column in COUNT_COLUMNS.items():
+        lengths[column] = int(_read_column(directory, count_column, rows_count).sum())
+    return lengths
+
+
+def read_columnar_log(directory):
+    """ Loads the columnar log of a day """
+    # The timestamps are read first, the other columns can only have more values (of rows being written)
+    rows_count = _rows_count(directory)
+    timestamps = _read_column(directory, "timestamps", rows_count)
+    lengths = _committed_lengths(directory, len(timestamps))
+    columns = {column: _read_column(directory, column, lengths[column]) for column in COLUMN_DTYPES if column != "timestamps"}
+    columns["timestamps"] = timestamps
+    return ColumnarLog(columns)
+
+
+def columnar_log_rows_count(directory):
+    """ Returns the number of rows of the columnar log of a day (0 if it doesn't exist) """
+    return _rows_count(directory)
+
+
+class ColumnarLogWriter:
+    """
+    Appends the rows of the raw data log to the columnar log of their day (the day comes from the timestamp of each
+    row), keeping the files of the current day open. The rows are buffered and appended to the files when
+    `flush_rows` rows are buffered or `flush_interval` seconds passed since the last write (checked when a row is
+    added).
+
+    :param directory: The `objects_log` folder of the camera.
+    :param flush_rows: The number of buffered rows that triggers a write.
+    :param flush_interval: The maximum time (in seconds) a row waits in the buffer (while new rows arrive).
+    :param fsync: Whether to fsync the files after each write.
+    """
+
+    def __init__(self, directory, flush_rows=100, flush_interval=5, fsync=False):
+        self.directory = directory
+        self.flush_rows = max(1, flush_rows)
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.day = None
+        self.files = {}
+        self.pending_rows = []
+        self.last_flush_time = time.monotonic()
+
+    def writerow(self, timestamp, detections, violating_objects, environment_score):
+        """
+        Adds a row to the log of its day.
+
+        :param timestamp: The timestamp of the row (YYYY-MM-DD HH:MM:SS).
+        :param detections: The DetectionBatch of the row.
+        :param violating_objects: The (i, j) pairs of objects that violate the social distancing.
+        :param environment_score: The environment score of the row.
+        """
+        violation_pairs = _as_column("violation_pairs", violating_objects)
+        violation_indexes = np.unique(violation_pairs)
+        face_labels = detections.face_labels if detections.face_labels is not None else np.full(len(detections), -1)
+        self.append({
+            "timestamps": np.datetime64(timestamp.replace(" ", "T"), "s"),
+            "detected_objects": len(detections),
+            "violating_objects": len(violation_pairs),
+            "environment_scores": environment_score,
+            "detection_counts": len(detections),
+            "violation_index_counts": len(violation_indexes),
+            "violation_pair_counts": len(violation_pairs),
+            "bboxes": detections.bboxes,
+            "bboxes_real": detections.bboxes_real,
+            "class_ids": detections.class_ids,
+            "track_ids": detections.track_ids,
+            "face_labels": face_labels,
+            "violation_indexes": violation_indexes,
+            "violation_pairs": violation_pairs,
+        })
+
+    def append(self, row):
+        """ Adds a row given as a dict with the values of all the columns (see `writerow`) """
+        day = str(row["timestamps"])[0: 10]
+        if day != self.day:
+            self.rotate(day)
+        self.pending_rows.append(row)
+        if len(self.pending_rows) >= self.flush_rows or time.monotonic() - self.last_flush_time >= self.flush_interval:
+            self.flush()
+
+    def rotate(self, day):
+        """ Closes the files of the current day and opens the ones of `day` """
+        self.close()
+        day_directory = get_columnar_log_directory(self.directory, day)
+        os.makedirs(day_directory, exist_ok=True)
+        format_path = os.path.join(day_directory, FORMAT_FILE)
+        if not os.path.isfile(format_path):
+            with open(format_path, "w") as format_file:
+                json.dump({
+                    "version": LOG_FORMAT_VERSION,
+                    "columns": {
+                        column: {"dtype": np.dtype(dtype).str, "shape": COLUMN_SHAPES.get(column, (0,))[1:]}
+                        for column, dtype in COLUMN_DTYPES.items()
+                    }
+                }, format_file)
+        # Remove the values of the rows that weren't completely stored (e.g. if the processor was killed)
+        lengths = _committed_lengths(day_directory, _rows_count(day_directory))
+        for column in COLUMN_DTYPES:
+            path = _column_path(day_directory, column)
+            committed_size = lengths[column] * _column_width(column) * np.dtype(COLUMN_DTYPES[column]).itemsize
+            if os.path.isfile(path) and os.path.getsize(path) > committed_size:
+                os.truncate(path, committed_size)
+        self.files = {column: open(_column_path(day_directory, column), "ab") for column in COLUMN_DTYPES}
+        self.day = day
+
+    def flush(self):
+        if self.pending_rows:
+            # The timestamps are stored last, they make the rows visible to the readers
+            for column in [column for column in COLUMN_DTYPES if column != "timestamps"] + ["timestamps"]:
+                values = [row[column] for row in self.pending_rows]
+                if column in ROW_COLUMNS:
+                    values = np.array(values, dtype=COLUMN_DTYPES[column])
+                else:
+                    values = np.concatenate([_as_column(column, value) for value in values])
+                column_file = self.files[column]
+                column_file.write(values.tobytes())
+                column_file.flush()
+                if self.fsync:
+                    os.fsync(column_file.fileno())
+            self.pending_rows = []
+        self.last_flush_time = time.monotonic()
+
+    def close(self):
+        """ Writes the buffered rows and closes the files of the current day """
+        if self.day is None:
+            return
+        self.flush()
+        for column_file in self.files.values():
+            column_file.close()
+        self.files = {}
+        self.day = None
@@ -0,0 +1,167 @@
+import numpy as np
+
+
+class DetectionBatch:
+    """
+    Objects detected in a frame stored as a struct of arrays (one row per object), so each step of the pipeline can
+    work on all the objects at once instead of walking a list of dicts.
+
+    :param resolution: The (width, height) of the processed frames, used to compute the real coordinates.
+    :param bboxes: (N, 4) array with the normalized boxes as [x0, y0, x1, y1].
+    :param scores: (N,) array with the detection scores.
+    :param class_ids: (N,) array with the class ids of the objects.
+    :param track_ids: (N,) array with the ids of the tracks of the objects (-1 for the untracked ones).
+    :param track_infos: List with the info of the track of each object (None for the untracked ones).
+    :param face_bboxes: (N, 4) array with the normalized boxes of the faces as [x0, y0, x1, y1] (NaN if the face
+        wasn't detected), or None if the detector doesn't detect faces.
+    :param face_labels: (N,) array with the face mask labels (-1 if unknown), or None if there isn't a classifier.
+    """
+    __slots__ = ("resolution", "bboxes", "scores", "class_ids", "track_ids", "track_infos", "face_bboxes",
+                 "face_labels")
+
+    def __init__(self, resolution, bboxes, scores, class_ids, track_ids=None, track_infos=None, face_bboxes=None,
+                 face_labels=None):
+        self.resolution = tuple(resolution)
+        self.bboxes = np.asarray(bboxes, dtype=float).reshape(-1, 4)
+        count = len(self.bboxes)
+        self.scores = np.asarray(scores, dtype=float).reshape(count)
+        self.class_ids = np.asarray(class_ids, dtype=int).reshape(count)
+        self.track_ids = np.full(count, -1, dtype=int) if track_ids is None else np.asarray(track_ids, dtype=int)
+        self.track_infos = [None] * count if track_infos is None else list(track_infos)
+        self.face_bboxes = None if face_bboxes is None else np.asarray(face_bboxes, dtype=float).reshape(-1, 4)
+        self.face_labels = None if face_labels is None else np.asarray(face_labels, dtype=int)
+
+    @classmethod
+    def empty(cls, resolution):
+        return cls(resolution, np.zeros((0, 4)), np.zeros(0), np.zeros(0, dtype=int))
+
+    @classmethod
+    def from_detector_objects(cls, object_list, resolution):
+        """
+        Builds a batch from the output of a detector: a list of dicts with "id" ("<class_id>-<index>"), "score",
+        "bbox" and optionally "face" (normalized boxes as [ymin, xmin, ymax, xmax]).
+        """
+        if not object_list:
+            return cls.empty(resolution)
+        bboxes = np.array([obj["bbox"] for obj in object_list], dtype=float).reshape(-1, 4)[:, [1, 0, 3, 2]]
+        scores = [obj["score"] for obj in object_list]
+        class_ids = [int(obj["id"].split("-")[0]) for obj in object_list]
+        face_bboxes = None
+        if "face" in object_list[0]:
+            face_bboxes = np.array(
+                [obj["face"] if obj.get("face") is not None else [np.nan] * 4 for obj in object_list], dtype=float
+            ).reshape(-1, 4)[:, [1, 0, 3, 2]]
+        return cls(resolution, bboxes, scores, class_ids, face_bboxes=face_bboxes)
+
+    @classmethod
+    def from_objects(cls, objects_list, resolution):
+        """ Builds a batch from a list of objects in the format returned by `to_objects` """
+        if not objects_list:
+            return cls.empty(resolution)
+        bboxes = [obj["bbox"] for obj in objects_list]
+        scores = [obj.get("score", 1.0) for obj in objects_list]
+        class_ids = [int(str(obj["id"]).split("-")[0]) for obj in objects_list]
+        track_ids = [obj.get("tracked_id", -1) for obj in objects_list]
+        track_infos = [obj.get("track_info") for obj in objects_list]
+        face_bboxes, face_labels = None, None
+        if "face" in objects_list[0]:
+            face_bboxes = np.array(
+                [obj["face"] if obj.get("face") is not None else [np.nan] * 4 for obj in objects_list], dtype=float
+            ).reshape(-1, 4)[:, [1, 0, 3, 2]]
+        if "face_label" in objects_list[0]:
+            face_labels = [obj.get("face_label", -1) for obj in objects_list]
+        return cls(resolution, bboxes, scores, class_ids, track_ids, track_infos, face_bboxes, face_labels)
+
+    def __len__(self):
+        return len(self.bboxes)
+
+    @property
+    def scale(self):
+        return np.array(self.resolution * 2, dtype=float)
+
+    @property
+    def bboxes_real(self):
+        """ (N, 4) array with the boxes in pixels as [x0, y0, x1, y1] """
+        return self.bboxes * self.scale
+
+    @property
+    def centroids(self):
+        """ (N, 4) array with the normalized centroids of the boxes as [cx, cy, w, h] """
+        return np.concatenate([(self.bboxes[:, :2] + self.bboxes[:, 2:]) / 2, self.bboxes[:, 2:] - self.bboxes[:, :2]],
+                              axis=1)
+
+    @property
+    def centroids_real(self):
+        """ (N, 4) array with the centroids of the boxes in pixels as [cx, cy, w, h] """
+        return self.centroids * self.scale
+
+    @property
+    def has_faces(self):
+        """ (N,) boolean array with True for the objects with a detected face """
+        if self.face_bboxes is None:
+            return np.zeros(len(self), dtype=bool)
+        return ~np.isnan(self.face_bboxes).any(axis=1)
+
+    def tracker_bboxes(self):
+        """ Returns the list of boxes in integer pixels (x0, y0, x1, y1) used as input of the trackers """
+        return [tuple(bbox) for bbox in (self.bboxes * self.scale).astype(int).tolist()]
+
+    def select(self, indexes):
+        """ Returns a new batch with the objects selected by `indexes` (an array of indexes or a boolean mask) """
+        indexes = np.asarray(indexes)
+        if indexes.dtype == bool:
+            indexes = np.flatnonzero(indexes)
+        return DetectionBatch(
+            self.resolution,
+            self.bboxes[indexes],
+            self.scores[indexes],
+            self.class_ids[indexes],
+            self.track_ids[indexes],
+            [self.track_infos[i] for i in indexes.tolist()],
+            None if self.face_bboxes is None else self.face_bboxes[indexes],
+            None if self.face_labels is None else self.face_labels[indexes]
+        )
+
+    def copy(self):
+        """ Returns a copy of the batch, the track infos are copied as dicts """
+        return DetectionBatch(
+            self.resolution,
+            self.bboxes.copy(),
+            self.scores.copy(),
+            self.class_ids.copy(),
+            self.track_ids.copy(),
+            [dict(info) if info is not None else None for info in self.track_infos],
+            None if self.face_bboxes is None else self.face_bboxes.copy(),
+            None if self.face_labels is None else self.face_labels.copy()
+        )
+
+    def to_objects(self):
+        """
+        Returns the objects as the list of dicts used before the batches, for the steps (e.g. plug-ins) that still
+        expect it: "id" ("<class_id>-<index>"), "score", "bbox", "centroid", "bboxReal", "centroidReal" and,
+        if available, "face" (as [ymin, xmin, ymax, xmax]), "face_label", "tracked_id" and "track_info".
+        """
+        objects = []
+        face_bboxes = None if self.face_bboxes is None else self.face_bboxes[:, [1, 0, 3, 2]].tolist()
+        face_labels = None if self.face_labels is None else self.face_labels.tolist()
+        has_faces = self.has_faces.tolist()
+        columns = zip(self.class_ids.tolist(), self.scores.tolist(), self.bboxes.tolist(), self.centroids.tolist(),
+                      self.bboxes_real.tolist(), self.centroids_real.tolist(), self.track_ids.tolist())
+        for i, (class_id, score, bbox, centroid, bbox_real, centroid_real, track_id) in enumerate(columns):
+            obj = {
+                "id": f"{class_id}-{i}",
+                "score": score,
+                "bbox": bbox,
+                "centroid": centroid,
+                "bboxReal": bbox_real,
+                "centroidReal": centroid_real,
+            }
+            if face_bboxes is not None:
+                obj["face"] = face_bboxes[i] if has_faces[i] else None
+            if face_labels is not None:
+                obj["face_label"] = face_labels[i]
+            if track_id >= 0:
+                obj["tracked_id"] = track_id
+                obj["track_info"] = self.track_infos[i]
+            objects.append(obj)
+        return objects
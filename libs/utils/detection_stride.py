@@ -0,0 +1,47 @@
+import numpy as np
+
+# Maximum displacement (relative to the height of the box) that a track can be predicted before running the
+# detector again
+MAX_PREDICTED_DISPLACEMENT = 0.25
+
+
+class AdaptiveDetectionStride:
+    """
+    Schedules the detector to run every N frames, where N adapts to the activity of the scene.
+    After each detection, N is the number of frames that the fastest track needs to move
+    `MAX_PREDICTED_DISPLACEMENT` times its height (bounded by `max_stride`). If the number of detected objects
+    changed (people entering or leaving the scene), the detector runs again in the next frame.
+    In the frames in between, the tracks are propagated by the tracker.
+
+    :param max_stride: The maximum number of frames between two detector runs.
+    """
+
+    def __init__(self, max_stride):
+        self.max_stride = max(1, int(max_stride))
+        self.stride = 1
+        self.frames_since_inference = 0
+        self.last_detections_count = None
+
+    def should_run_inference(self):
+        self.frames_since_inference += 1
+        if self.frames_since_inference >= self.stride:
+            self.frames_since_inference = 0
+            return True
+        return False
+
+    def update(self, tracks: list, detections_count: int):
+        """ Adapts the stride to the tracks and number of objects of a frame processed by the detector """
+        if self.last_detections_count is not None and detections_count != self.last_detections_count:
+            self.stride = 1
+        else:
+            max_speed = 0
+            for track in tracks:
+                track_bbox, track_info = track[4], track[5]
+                height = max(float(track_bbox[3]) - float(track_bbox[1]), 1)
+                max_speed = max(max_speed, np.hypot(*track_info.get("velocity", (0, 0))) / height)
+            if max_speed > 0:
+                self.stride = int(np.clip(MAX_PREDICTED_DISPLACEMENT / max_speed, 1, self.max_stride))
+            else:
+                self.stride = self.max_stride
+        self.last_detections_count = detections_count
+        self.frames_since_inference = 0
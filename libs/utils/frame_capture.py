@@ -0,0 +1,114 @@
+import logging
+import time
+
+import cv2 as cv
+
+from collections import deque
+from threading import Condition, Thread
+
+from libs.utils.frame_pool import PooledVideoCapture
+
+logger = logging.getLogger(__name__)
+
+
+class LatestFrameCapture:
+    """
+    Wraps a `cv.VideoCapture` and decodes the stream in a dedicated thread into a small bounded ring buffer.
+    When the consumer is slower than the stream, the oldest buffered frames are dropped, so `read` always
+    returns the newest decoded frame and the capture-to-inference lag stays bounded.
+    It exposes the subset of the `cv.VideoCapture` interface used by the CvEngine (isOpened, get, read and release).
+
+    :param video_uri: The uri of the video stream. Ex: "rtsp://...".
+    :param buffer_size: The maximum number of decoded frames kept in the ring buffer.
+    :param frame_pool: An optional FramePool. When it's provided, the frames are decoded into its slots and `read`
+        returns FrameHandles that must be released by the caller.
+    """
+
+    def __init__(self, video_uri, buffer_size=2, frame_pool=None):
+        self.video_uri = video_uri
+        self.frame_pool = frame_pool
+        if self.frame_pool is not None:
+            self.input_cap = PooledVideoCapture(video_uri, frame_pool)
+        else:
+            self.input_cap = cv.VideoCapture(video_uri)
+        # Each item is a tuple (frame, capture_time)
+        self.frames = deque(maxlen=max(1, buffer_size))
+        self.condition = Condition()
+        self.dropped_frames = 0
+        self.total_dropped_frames = 0
+        # Time (time.perf_counter) in which the last frame returned by `read` was decoded
+        self.last_capture_time = None
+        self.running = False
+        self.stream_ended = False
+        self.thread = None
+        if self.input_cap.isOpened():
+            self.running = True
+            self.thread = Thread(target=self._capture_frames, daemon=True)
+            self.thread.start()
+
+    def _capture_frames(self):
+        while self.running:
+            ret, cv_image = self.input_cap.read()
+            capture_time = time.perf_counter()
+            with self.condition:
+                if not ret:
+                    self.stream_ended = True
+                    self.condition.notify_all()
+                    break
+                if len(self.frames) == self.frames.maxlen:
+                    self.dropped_frames += 1
+                    self._discard(self.frames.popleft()[0])
+                self.frames.append((cv_image, capture_time))
+                self.condition.notify_all()
+        # The capture is released by this thread as it may be blocked in a read when the consumer stops
+        self.input_cap.release()
+
+    def isOpened(self):
+        return self.input_cap.isOpened()
+
+    def get(self, prop_id):
+        return self.input_cap.get(prop_id)
+
+    def read(self):
+        """
+        Blocks until a frame is available and returns the newest one. The older frames that were still buffered
+        are counted as dropped.
+        Returns the same tuple (ret, frame) as `cv.VideoCapture.read`.
+        """
+        with self.condition:
+            while not self.frames and not self.stream_ended and self.running:
+                self.condition.wait()
+            if not self.frames:
+                return False, None
+            cv_image, self.last_capture_time = self.frames.pop()
+            self.dropped_frames += len(self.frames)
+            while self.frames:
+                self._discard(self.frames.popleft()[0])
+            return True, cv_image
+
+    def _discard(self, frame):
+        if self.frame_pool is not None:
+            frame.release()
+
+    def pop_dropped_frames(self):
+        """ Returns the number of frames dropped since the last call and resets the counter """
+        with self.condition:
+            dropped_frames = self.dropped_frames
+            self.total_dropped_frames += dropped_frames
+            self.dropped_frames = 0
+        return dropped_frames
+
+    def release(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.thread is not None:
+            # The decoding thread may be blocked in a read, don't wait for it forever
+            self.thread.join(5)
+        else:
+            self.input_cap.release()
+        with self.condition:
+            while self.frames:
+                self._discard(self.frames.popleft()[0])
+        self.pop_dropped_frames()
+        logger.info(f"{self.total_dropped_frames} frames were dropped while processing {self.video_uri}")
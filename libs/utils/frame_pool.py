@@ -0,0 +1,138 @@
+import logging
+import multiprocessing as mp
+
+import cv2 as cv
+import numpy as np
+
+from collections import deque
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+
+class FrameHandle:
+    """
+    Reference-counted handle of a frame stored in a FramePool slot.
+    Every stage that keeps the frame after passing it along must call `retain` and the matching `release` when
+    it's done with it. The slot returns to the pool when the last reference is released.
+    """
+    __slots__ = ("pool", "slot", "frame", "refcount")
+
+    def __init__(self, pool, slot, frame):
+        self.pool = pool
+        self.slot = slot
+        self.frame = frame
+        self.refcount = 1
+
+    def retain(self):
+        with self.pool.lock:
+            self.refcount += 1
+        return self
+
+    def release(self):
+        with self.pool.lock:
+            self.refcount -= 1
+            if self.refcount == 0 and self.slot is not None:
+                self.pool.free_slots.append(self.slot)
+
+
+class FramePool:
+    """
+    Preallocated frames with a fixed shape stored in a single shared memory buffer (a `multiprocessing.RawArray`
+    that can be inherited by forked processes).
+    The slots are reused across frames, so the decoding stage can write directly into them and the following
+    stages receive a view of the slot instead of a new array.
+
+    The pool counts the frames allocated outside of it (when all the slots are in use) and the full-frame copies
+    done to fill a slot. Both counters should be 0 once the pipeline has the right number of slots.
+
+    :param shape: The shape (height, width, channels) of the frames.
+    :param size: The number of slots.
+    """
+
+    def __init__(self, shape, size):
+        self.shape = tuple(shape)
+        self.size = max(1, int(size))
+        frame_size = int(np.prod(self.shape))
+        self.buffer = mp.RawArray("B", frame_size * self.size)
+        buffer_array = np.frombuffer(self.buffer, dtype=np.uint8)
+        self.slots = [
+            buffer_array[index * frame_size:(index + 1) * frame_size].reshape(self.shape)
+            for index in range(self.size)
+        ]
+        self.free_slots = deque(range(self.size))
+        self.lock = Lock()
+        self.allocations = 0
+        self.copies = 0
+
+    def acquire(self):
+        """
+        Returns a FrameHandle of a free slot. If all the slots are in use, the frame is allocated outside of the
+        pool (and counted as an allocation) instead of blocking the caller.
+        """
+        with self.lock:
+            if self.free_slots:
+                slot = self.free_slots.popleft()
+                return FrameHandle(self, slot, self.slots[slot])
+            self.allocations += 1
+        return FrameHandle(self, None, np.empty(self.shape, dtype=np.uint8))
+
+    def record_copy(self):
+        with self.lock:
+            self.copies += 1
+
+    def pop_stats(self):
+        """ Returns the tuple (allocations, copies) counted since the last call and resets the counters """
+        with self.lock:
+            stats = (self.allocations, self.copies)
+            self.allocations = 0
+            self.copies = 0
+        return stats
+
+
+class PooledVideoCapture:
+    """
+    Wraps a `cv.VideoCapture` and decodes the frames directly into the slots of a FramePool. When the stream
+    resolution is different from the pool one, the frame is resized straight into the slot.
+    It exposes the subset of the `cv.VideoCapture` interface used by the CvEngine, but `read` returns a FrameHandle
+    instead of an array.
+
+    :param video_uri: The uri of the video.
+    :param frame_pool: The FramePool that provides the frames.
+    """
+
+    def __init__(self, video_uri, frame_pool):
+        self.input_cap = cv.VideoCapture(video_uri)
+        self.frame_pool = frame_pool
+        self.decoded_image = None
+
+    def isOpened(self):
+        return self.input_cap.isOpened()
+
+    def get(self, prop_id):
+        return self.input_cap.get(prop_id)
+
+    def read(self):
+        """ Returns the tuple (ret, frame_handle). The caller owns the handle and must release it. """
+        frame_handle = self.frame_pool.acquire()
+        if self.decoded_image is None:
+            # The stream matches the pool resolution (or it's the first frame), decode into the slot
+            ret, cv_image = self.input_cap.read(frame_handle.frame)
+        else:
+            # Reuse the decoding buffer of the previous frame
+            ret, cv_image = self.input_cap.read(self.decoded_image)
+        if not ret or np.shape(cv_image) == ():
+            frame_handle.release()
+            return False, None
+        if cv_image.ctypes.data != frame_handle.frame.ctypes.data:
+            if cv_image.shape == frame_handle.frame.shape:
+                self.frame_pool.record_copy()
+                np.copyto(frame_handle.frame, cv_image)
+            else:
+                self.decoded_image = cv_image
+                h, w = frame_handle.frame.shape[:2]
+                cv.resize(cv_image, (w, h), dst=frame_handle.frame)
+        return True, frame_handle
+
+    def release(self):
+        self.input_cap.release()
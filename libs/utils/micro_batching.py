@@ -0,0 +1,78 @@
+import logging
+import time
+
+from queue import Queue, Empty
+from threading import Event, Thread
+
+logger = logging.getLogger(__name__)
+
+
+class BatchRequest:
+    __slots__ = ("item", "result", "error", "done")
+
+    def __init__(self, item):
+        self.item = item
+        self.result = None
+        self.error = None
+        self.done = Event()
+
+
+class MicroBatcher:
+    """
+    Groups the items submitted concurrently by several threads (e.g. one thread per camera) into batches that
+    are processed together by a single worker thread.
+    A batch is processed as soon as it has `max_batch_size` items or its oldest item has waited `max_wait_ms`.
+
+    :param batch_function: A callable that receives a list of items and returns a list with one result per item.
+    :param max_batch_size: The maximum number of items processed in a single call to `batch_function`.
+    :param max_wait_ms: The maximum time (in milliseconds) an item waits for other items to fill the batch.
+    :param name: A name used to identify the worker thread.
+    """
+
+    def __init__(self, batch_function, max_batch_size, max_wait_ms, name="MicroBatcher"):
+        self.batch_function = batch_function
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000
+        self.requests = Queue()
+        self.worker = Thread(target=self._process_batches, name=name, daemon=True)
+        self.worker.start()
+
+    def submit(self, item):
+        """
+        Enqueues the item and blocks until the batch that includes it has been processed.
+        Returns the result of the item or raises the exception raised by `batch_function`.
+        """
+        request = BatchRequest(item)
+        self.requests.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _next_batch(self):
+        batch = [self.requests.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining > 0:
+                    batch.append(self.requests.get(timeout=remaining))
+                else:
+                    batch.append(self.requests.get_nowait())
+            except Empty:
+                break
+        return batch
+
+    def _process_batches(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                results = self.batch_function([request.item for request in batch])
+                for request, result in zip(batch, results):
+                    request.result = result
+            except Exception as e:
+                logger.error(e, exc_info=True)
+                for request in batch:
+                    request.error = e
+            for request in batch:
+                request.done.set()
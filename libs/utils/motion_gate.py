@@ -0,0 +1,57 @@
+import time
+
+import cv2 as cv
+import numpy as np
+
+# Width of the grayscale frames compared by the motion gate
+MOTION_GATE_WIDTH = 160
+# Minimum difference of intensity for a pixel to be considered changed
+PIXEL_DIFFERENCE_THRESHOLD = 25
+
+
+class MotionGate:
+    """
+    Decides if the detector has to run on a frame by comparing a downscaled grayscale copy of the frame with the
+    one of the last frame processed by the detector. Only the pixels inside the RoI contour (if any) are compared.
+    The detector runs when the fraction of changed pixels reaches `threshold` or when `redetect_interval` seconds
+    have elapsed since the last inference.
+
+    :param resolution: The resolution (width, height) of the frames.
+    :param roi_contour: An optional array with the points (x, y) of the RoI contour (in `resolution` coordinates).
+    :param threshold: The minimum fraction of changed pixels considered motion.
+    :param redetect_interval: The maximum time (in seconds) between two inferences.
+    """
+
+    def __init__(self, resolution, roi_contour=None, threshold=0.005, redetect_interval=5):
+        scale = min(1.0, MOTION_GATE_WIDTH / resolution[0])
+        self.size = (max(1, int(resolution[0] * scale)), max(1, int(resolution[1] * scale)))
+        self.threshold = threshold
+        self.redetect_interval = redetect_interval
+        self.mask = None
+        self.mask_pixels = self.size[0] * self.size[1]
+        if roi_contour is not None:
+            self.mask = np.zeros(self.size[::-1], dtype=np.uint8)
+            cv.fillPoly(self.mask, [np.round(np.array(roi_contour) * scale).astype(np.int32)], 255)
+            self.mask_pixels = max(1, cv.countNonZero(self.mask))
+        self.reference_frame = None
+        self.last_inference_time = None
+
+    def should_run_inference(self, cv_image):
+        """ Returns True if the frame changed since the last inference (or the inference is due) """
+        gray_image = cv.cvtColor(cv.resize(cv_image, self.size, interpolation=cv.INTER_AREA), cv.COLOR_BGR2GRAY)
+        gray_image = cv.GaussianBlur(gray_image, (5, 5), 0)
+        now = time.perf_counter()
+        if self.reference_frame is None or now - self.last_inference_time >= self.redetect_interval:
+            run_inference = True
+        else:
+            _, changed_pixels = cv.threshold(
+                cv.absdiff(gray_image, self.reference_frame), PIXEL_DIFFERENCE_THRESHOLD, 255, cv.THRESH_BINARY)
+            if self.mask is not None:
+                changed_pixels = cv.bitwise_and(changed_pixels, self.mask)
+            run_inference = cv.countNonZero(changed_pixels) / self.mask_pixels >= self.threshold
+        if run_inference:
+            # Compare the following frames against the last one processed by the detector, so slow movements
+            # are eventually detected
+            self.reference_frame = gray_image
+            self.last_inference_time = now
+        return run_inference
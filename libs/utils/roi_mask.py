@@ -0,0 +1,64 @@
+import os
+import cv2 as cv
+import numpy as np
+
+from libs.utils.utils import validate_file_exists_and_is_not_empty
+
+# Masks of the loaded RoI files by (path, resolution), with the modification time of the file when they were loaded
+_roi_masks = {}
+
+
+class RoIMask:
+    """
+    Bitmap of a Region of Interest rasterized at the processing resolution, used to test if points lie inside the
+    RoI with a single gather instead of a `cv.pointPolygonTest` per point. The points on the contour are inside.
+
+    :param roi_contour: An array with the points (x, y) of the RoI contour (in `resolution` coordinates).
+    :param resolution: The (width, height) of the frames.
+    """
+
+    def __init__(self, roi_contour, resolution):
+        self.contour = roi_contour
+        width, height = resolution
+        # One extra row and column for the points on the right and bottom borders of the frame
+        mask = np.zeros((height + 1, width + 1), dtype=np.uint8)
+        polygon = [np.asarray(roi_contour, dtype=np.int32).reshape(-1, 1, 2)]
+        cv.fillPoly(mask, polygon, 1)
+        cv.polylines(mask, polygon, True, 1)
+        self.mask = mask.astype(bool)
+
+    def contains(self, points):
+        """ Returns a boolean array with True for the points (N, 2) that lie inside the RoI """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        xs = np.floor(points[:, 0]).astype(int)
+        ys = np.floor(points[:, 1]).astype(int)
+        in_frame = (xs >= 0) & (ys >= 0) & (xs < self.mask.shape[1]) & (ys < self.mask.shape[0])
+        inside = np.zeros(len(points), dtype=bool)
+        inside[in_frame] = self.mask[ys[in_frame], xs[in_frame]]
+        return inside
+
+    def contains_boxes(self, boxes):
+        """
+        Returns a boolean array with True for the boxes (N, 4) as (xmin, ymin, xmax, ymax) inside the RoI.
+        A box is inside the RoI if its middle bottom point lies inside it.
+        """
+        boxes = np.asarray(boxes, dtype=float).reshape(-1, 4).astype(int)
+        return self.contains(np.stack([(boxes[:, 0] + boxes[:, 2]) / 2, boxes[:, 3]], axis=1))
+
+
+def get_roi_mask(roi_file_path, resolution):
+    """
+    Returns the RoIMask of the contour stored in `roi_file_path` (or None if the RoI is not defined).
+    The masks are rasterized once and reused until the file is modified.
+    """
+    key = (roi_file_path, tuple(resolution))
+    if not validate_file_exists_and_is_not_empty(roi_file_path):
+        _roi_masks.pop(key, None)
+        return None
+    modification_time = os.path.getmtime(roi_file_path)
+    cached_mask = _roi_masks.get(key)
+    if cached_mask is None or cached_mask[0] != modification_time:
+        roi_contour = np.loadtxt(roi_file_path, delimiter=',', dtype=int)
+        cached_mask = (modification_time, RoIMask(roi_contour, resolution))
+        _roi_masks[key] = cached_mask
+    return cached_mask[1]
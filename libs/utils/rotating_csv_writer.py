@@ -0,0 +1,74 @@
+import csv
+import io
+import os
+import time
+
+
+class RotatingCsvWriter:
+    """
+    Appends rows to daily CSV files (`<directory>/<day>.csv`) keeping the file of the current day open.
+    The rows are buffered in memory and written at once when `flush_rows` rows are buffered or `flush_interval`
+    seconds passed since the last write (checked when a row is added), so each row costs a few syscalls only in
+    the flushes. The file is rotated when a row of another day arrives (the day of each row comes from its
+    timestamp, so the rows of recorded videos go to the file of their day too).
+    The rows that are still buffered are lost if the process is killed, call `close` to write them.
+
+    :param directory: The folder of the CSV files.
+    :param fieldnames: The columns of the files (the header is written when a file is created).
+    :param flush_rows: The number of buffered rows that triggers a flush.
+    :param flush_interval: The maximum time (in seconds) a row waits in the buffer (while new rows arrive).
+    :param fsync: Whether to fsync the file after each flush (the rows survive power failures, but each flush is
+        slower).
+    """
+
+    def __init__(self, directory, fieldnames, flush_rows=100, flush_interval=5, fsync=False):
+        self.directory = directory
+        self.fieldnames = fieldnames
+        self.flush_rows = max(1, flush_rows)
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.day = None
+        self.file = None
+        self.buffer = io.StringIO()
+        self.writer = csv.DictWriter(self.buffer, fieldnames=fieldnames)
+        self.buffered_rows = 0
+        self.last_flush_time = time.monotonic()
+
+    def writerow(self, day, row):
+        """ Adds a row (a dict with the `fieldnames` keys) to the file of the `day` (YYYY-MM-DD) """
+        if day != self.day:
+            self.rotate(day)
+        self.writer.writerow(row)
+        self.buffered_rows += 1
+        if self.buffered_rows >= self.flush_rows or time.monotonic() - self.last_flush_time >= self.flush_interval:
+            self.flush()
+
+    def rotate(self, day):
+        """ Closes the file of the current day and opens (or creates) the file of `day` """
+        self.close()
+        os.makedirs(self.directory, exist_ok=True)
+        self.file = open(os.path.join(self.directory, day + ".csv"), "a")
+        self.day = day
+        if self.file.tell() == 0:
+            # New file
+            self.writer.writeheader()
+
+    def flush(self):
+        if self.file is not None and self.buffer.tell() > 0:
+            self.file.write(self.buffer.getvalue())
+            self.file.flush()
+            if self.fsync:
+                os.fsync(self.file.fileno())
+            self.buffer.seek(0)
+            self.buffer.truncate()
+        self.buffered_rows = 0
+        self.last_flush_time = time.monotonic()
+
+    def close(self):
+        """ Writes the buffered rows and closes the current file """
+        if self.file is None:
+            return
+        self.flush()
+        self.file.close()
+        self.file = None
+        self.day = None
@@ -387,68 +387,39 @@ def visualize_boxes_and_labels_on_image_array(
     return image
 
 
-def visualization_preparation(nn_out, distances, dist_threshold):
+def visualization_preparation(detections, min_distances, dist_threshold):
     """
     prepare the objects boxes and id in order to visualize
 
     Args:
-        nn_out: a list of dicionary contains normalized numbers of bonding boxes
-        {'id' : '0-0', 'bbox' : [x0, y0, x1, y1], 'score' : 0.99(optional} of shape [N, 3] or [N, 2]
-        distances: a symmetric matrix of normalized distances
+        detections: the DetectionBatch with the normalized bounding boxes [x0, y0, x1, y1], classes and scores
+        min_distances: the distance of each object to the closest one (at most dist_threshold)
         dist_threshold: the minimum distance for considering unsafe distance between objects
     Returns:
         an output dictionary contains object classes, boxes, scores
     """
     output_dict = {}
-    detection_classes = []
-    detection_scores = []
-    detection_boxes = []
-    is_violating = []
-    colors = []
-    face_labels = []
-    track_ids = []
-
-    distance = np.amin(distances + np.identity(len(distances)) * dist_threshold * 2, 0) if distances != [] else [dist_threshold]
-    for i, obj in enumerate(nn_out):
-        # Colorizing bounding box based on the distances between them
-        # R = 255 when dist=0 and R = 0 when dist > dist_threshold
-        redness_factor = 1.5
-        r_channel = np.maximum(255 * (dist_threshold - distance[i]) / dist_threshold, 0) * redness_factor
-        g_channel = 255 - r_channel
-        b_channel = 0
-        # Create a tuple object of colors
-        color = (int(b_channel), int(g_channel), int(r_channel))
-        # Get the object id
-        obj_id = obj["id"]
-        # Split and get the first item of obj_id
-        obj_id = obj_id.split("-")[0]
-        box = obj["bbox"]
-        if "score" in obj:
-            score = obj["score"]
-        else:
-            score = 1.0
-        # Append all processed items
-        detection_classes.append(int(obj_id))
-        detection_scores.append(score)
-        detection_boxes.append(box)
-        colors.append(color)
-        if "face_label" in obj:
-            face_labels.append(obj["face_label"])
-        if "tracked_id" in obj:
-            track_ids.append(obj["tracked_id"])
-
-        is_violating.append(True) if distance[i] < dist_threshold else is_violating.append(False)
-    output_dict["detection_boxes"] = np.array(detection_boxes)
-    output_dict["detection_scores"] = detection_scores
-    output_dict["detection_classes"] = detection_classes
-    output_dict["violating_objects"] = is_violating
+    count = len(detections)
+    distance = np.asarray(min_distances, dtype=float) if len(min_distances) == count else np.full(count, dist_threshold)
+    # Colorizing bounding box based on the distances between them
+    # R = 255 when dist=0 and R = 0 when dist > dist_threshold
+    redness_factor = 1.5
+    r_channel = np.maximum(255 * (dist_threshold - distance) / dist_threshold, 0) * redness_factor
+    g_channel = 255 - r_channel
+    b_channel = np.zeros(count)
+    # Create a tuple object of colors
+    colors = [tuple(color) for color in np.stack([b_channel, g_channel, r_channel], axis=1).astype(int).tolist()]
+    output_dict["detection_boxes"] = detections.bboxes
+    output_dict["detection_scores"] = detections.scores.tolist()
+    output_dict["detection_classes"] = detections.class_ids.tolist()
+    output_dict["violating_objects"] = (distance < dist_threshold).tolist()
     output_dict["detection_colors"] = colors
-    output_dict["face_labels"] = face_labels
-    output_dict["track_ids"] = track_ids
+    output_dict["face_labels"] = [] if detections.face_labels is None else detections.face_labels.tolist()
+    output_dict["track_ids"] = detections.track_ids.tolist()
     return output_dict
 
 
-def birds_eye_view(input_frame, boxes, is_violating):
+def birds_eye_view(input_frame, boxes, is_violating, world_points=None, world_bounds=None):
     """
     This function receives a black window and draw circles (based on boxes) at the frame.
     Args:
@@ -456,12 +427,27 @@ def birds_eye_view(input_frame, boxes, is_violating):
         boxes: A numpy array of shape [N, 4]
         is_violating: List of boolean (True/False) which indicates the correspond object at boxes is
         a violating object or not
+        world_points: (optional) A numpy array of shape [N, 2] with the position of the objects in the ground plane.
+        If it's provided the circles are drawn at these positions (instead of the centers of the boxes), scaled to fit
+        world_bounds in the window keeping the aspect ratio.
+        world_bounds: ((min_x, min_y), (max_x, max_y)) coordinates of the ground plane shown in the window.
 
     Returns:
         input_frame: Frame with red and green circles
 
     """
     h, w = input_frame.shape[0:2]
+    if world_points is not None and world_bounds is not None:
+        min_point, max_point = np.asarray(world_bounds[0], dtype=float), np.asarray(world_bounds[1], dtype=float)
+        scale = np.min(np.array([w, h]) / np.maximum(max_point - min_point, 1e-6))
+        offset = (np.array([w, h]) - (max_point - min_point) * scale) / 2
+        centers = (np.asarray(world_points, dtype=float).reshape(-1, 2) - min_point) * scale + offset
+        for i, (center_x, center_y) in enumerate(centers.tolist()):
+            if not (np.isfinite(center_x) and np.isfinite(center_y)):
+                continue
+            color = (0, 0, 255) if is_violating[i] else (0, 255, 0)
+            input_frame = cv.circle(input_frame, (int(center_x), int(center_y)), 2, color, 2)
+        return input_frame
     for i, box in enumerate(boxes):
         center_x = int((box[0] * w + box[2] * w) / 2)
         center_y = int((box[1] * h + box[3] * h) / 2)
@@ -492,25 +478,77 @@ def text_putter(input_frame, txt, origin, normalized_origin=True, fontscale=0.75
                color, thickness, cv.LINE_AA)
 
 
+class TrackTrail:
+    """
+    Fixed-size ring buffer with the last centroids of a track and the color used to draw each of them.
+    The buffers are allocated once, appending a centroid overwrites the oldest one when the trail is full.
+
+    :param capacity: The maximum number of centroids of the trail.
+    """
+    __slots__ = ("centroids", "colors", "start", "size")
+
+    def __init__(self, capacity=50):
+        self.centroids = np.zeros((capacity, 2), dtype=int)
+        # -1 means that the centroid doesn't have a color yet
+        self.colors = np.full((capacity, 3), -1, dtype=int)
+        self.start = 0
+        self.size = 0
+
+    def reset(self):
+        self.start = 0
+        self.size = 0
+
+    def _last_index(self):
+        return (self.start + self.size - 1) % len(self.centroids)
+
+    def append(self, centroid):
+        capacity = len(self.centroids)
+        if self.size < capacity:
+            self.size += 1
+        else:
+            self.start = (self.start + 1) % capacity
+        index = self._last_index()
+        self.centroids[index] = centroid
+        self.colors[index] = -1
+
+    def set_color(self, color):
+        """ Sets the color of the last centroid """
+        self.colors[self._last_index()] = color
+
+    def fill_last_color(self):
+        """
+        Assigns the color of the previous centroid to the last one if it doesn't have a color (e.g. lost objects).
+        Returns False if the trail doesn't have any color.
+        """
+        index = self._last_index()
+        if self.colors[index][0] >= 0:
+            return True
+        if self.size > 1:
+            self.colors[index] = self.colors[index - 1]
+            return True
+        return False
+
+
 def draw_tracks(input_frame, track_history, radius=1, thickness=1):
     """
     Visualize tracks based on history.
     Args:
     input_frame: The source image, is an RGB image.
-    track_history: Dictionary of track's centroids with track ids as keys and tuples of tracks centroids and 
-    corresponding colors as values
+    track_history: Dictionary of the TrackTrail of each track (with track ids as keys)
     radius: Tracking circules radius
     thickness: Thickness of tracking circlus
     """
-    for track in track_history.values():
+    for trail in track_history.values():
         # assign last frame color for lost objects
-        if len(track[0]) != len(track[1]):
-            if len(track[1]) == 0:
-                track[1].append((0, 255, 0))
+        if trail.size == 0:
+            continue
+        if not trail.fill_last_color():
+            trail.set_color((0, 255, 0))
+            continue
+        for centroid, color in zip(trail.centroids[:trail.size].tolist(), trail.colors[:trail.size].tolist()):
+            if color[0] < 0:
                 continue
-            track[1].append(track[1][-1])
-        for i, centroid in enumerate(track[0]):
-            cv.circle(input_frame, tuple(centroid), color=track[1][i], radius=radius, thickness=thickness)
+            cv.circle(input_frame, tuple(centroid), color=tuple(color), radius=radius, thickness=thickness)
 
 
 def draw_contour(input_frame, contour, color):
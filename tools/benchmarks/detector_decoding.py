@@ -0,0 +1,110 @@
+"""
+Measures the time of decoding the (synthetic) outputs of the x86 detectors for a frame, comparing the decoding box by
+box (as the detectors did before) with the vectorized decoding of libs.detectors.utils.decoding.
+The outputs are numpy arrays, so the cost of the per box host transfers of the tensors is not included.
+
+Usage: python -m tools.benchmarks.detector_decoding [--batch-sizes 1 4] [--repetitions 200]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from libs.detectors.utils.decoding import decode_batch_detections, decode_detections
+
+CLASS_ID = 1
+SCORE_THRESHOLD = 0.25
+
+
+def generate_ssd_outputs(batch_size, boxes_count=100, seed=0):
+    """ Returns the (boxes, labels, scores) outputs of the mobilenet ssd (boxes_count boxes per image) """
+    rng = np.random.RandomState(seed)
+    top_left = rng.uniform(0, 0.8, (batch_size, boxes_count, 2))
+    boxes = np.concatenate([top_left, top_left + rng.uniform(0.05, 0.2, (batch_size, boxes_count, 2))], axis=2)
+    labels = rng.choice([CLASS_ID, 2, 3], (batch_size, boxes_count), p=[0.5, 0.25, 0.25]).astype(np.float32)
+    scores = np.sort(rng.rand(batch_size, boxes_count).astype(np.float32))[:, ::-1]
+    return boxes.astype(np.float32), labels, scores
+
+
+def generate_openvino_output(batch_size, rows=200, seed=0):
+    """ Returns the detection_out of the openvino model: [image_id, label, score, x_min, y_min, x_max, y_max] rows """
+    boxes, labels, scores = generate_ssd_outputs(1, rows, seed)
+    output = np.zeros((1, 1, rows, 7), dtype=np.float32)
+    output[0, 0, :, 0] = np.sort(np.random.RandomState(seed).randint(0, batch_size, rows))
+    output[0, 0, :, 1] = labels[0]
+    output[0, 0, :, 2] = scores[0]
+    output[0, 0, :, 3:] = boxes[0][:, [1, 0, 3, 2]]
+    # End of the detections
+    output[0, 0, int(rows * 0.9):, 0] = -1
+    return output
+
+
+def ssd_decoding_by_box(boxes, labels, scores):
+    results = []
+    for batch_index in range(boxes.shape[0]):
+        result = []
+        for i in range(boxes.shape[1]):
+            if labels[batch_index, i] == CLASS_ID and scores[batch_index, i] > SCORE_THRESHOLD:
+                result.append({"id": str(CLASS_ID) + '-' + str(i), "bbox": np.array(boxes[batch_index, i, :]),
+                               "score": scores[batch_index, i]})
+        results.append(result)
+    return results
+
+
+def ssd_decoding(boxes, labels, scores):
+    return [
+        decode_detections(boxes[batch_index], labels[batch_index], scores[batch_index], CLASS_ID, SCORE_THRESHOLD)
+        for batch_index in range(boxes.shape[0])
+    ]
+
+
+def openvino_decoding_by_box(output, batch_size):
+    results = [[] for _ in range(batch_size)]
+    for i, (image_id, label, score, x_min, y_min, x_max, y_max) in enumerate(output[0][0]):
+        if image_id < 0:
+            break
+        if label == CLASS_ID and score > SCORE_THRESHOLD:
+            results[int(image_id)].append({"id": str(CLASS_ID) + '-' + str(i), "bbox": [y_min, x_min, y_max, x_max],
+                                           "score": score})
+    return results
+
+
+def openvino_decoding(output, batch_size):
+    detections = output[0][0]
+    end = np.flatnonzero(detections[:, 0] < 0)
+    if len(end):
+        detections = detections[:end[0]]
+    return decode_batch_detections(detections[:, 0], detections[:, [4, 3, 6, 5]], detections[:, 1], detections[:, 2],
+                                   CLASS_ID, SCORE_THRESHOLD, batch_size)
+
+
+def benchmark(decoding, args, repetitions):
+    """ Returns the median time (in milliseconds) of the decoding """
+    times = []
+    for _ in range(repetitions):
+        begin_time = time.perf_counter()
+        decoding(*args)
+        times.append(time.perf_counter() - begin_time)
+    return np.median(times) * 1000
+
+
+def main(batch_sizes, repetitions):
+    print("Median decoding time per frame (ms)")
+    print(f"{'Model':>10}{'Batch':>7}{'By box':>10}{'Vectorized':>12}")
+    for batch_size in batch_sizes:
+        ssd_outputs = generate_ssd_outputs(batch_size)
+        openvino_output = generate_openvino_output(batch_size)
+        for model, by_box, vectorized, args in (
+                ("ssd", ssd_decoding_by_box, ssd_decoding, ssd_outputs),
+                ("openvino", openvino_decoding_by_box, openvino_decoding, (openvino_output, batch_size))):
+            by_box_time = benchmark(by_box, args, repetitions) / batch_size
+            vectorized_time = benchmark(vectorized, args, repetitions) / batch_size
+            print(f"{model:>10}{batch_size:>7}{by_box_time:>10.3f}{vectorized_time:>12.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--repetitions", type=int, default=200)
+    args = parser.parse_args()
+    main(args.batch_sizes, args.repetitions)
@@ -0,0 +1,60 @@
+"""
+Measures the time of the objects filtering (large boxes and non maximum suppression) with an increasing number of
+(synthetic) detections, some of them duplicated.
+
+Usage: python -m tools.benchmarks.objects_filtering [--objects 50 200 1000] [--repetitions 20]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from libs.source_post_processors.objects_filtering import ObjectsFilteringPostProcessor
+
+NMS_THRESHOLD = 0.98
+
+
+def generate_objects(objects, seed=0):
+    """ Returns a list of detected objects with normalized boxes, 20% of them are duplicates and 5% large boxes """
+    rng = np.random.RandomState(seed)
+    sizes = rng.uniform((0.02, 0.05), (0.05, 0.15), (objects, 2))
+    large = rng.rand(objects) < 0.05
+    sizes[large] = 0.6
+    top_left = rng.uniform(0, 1 - sizes)
+    duplicated = np.flatnonzero(rng.rand(objects) < 0.2)
+    top_left[duplicated] = top_left[duplicated - 1] + rng.uniform(-0.002, 0.002, (len(duplicated), 2))
+    sizes[duplicated] = sizes[duplicated - 1]
+    object_list = []
+    for i, ((x0, y0), (w, h)) in enumerate(zip(top_left.tolist(), sizes.tolist())):
+        object_list.append({
+            "id": f"1-{i}",
+            "centroid": [x0 + w / 2, y0 + h / 2, w, h],
+            "bbox": [x0, y0, x0 + w, y0 + h],
+        })
+    return object_list
+
+
+def benchmark(object_list, repetitions):
+    """ Returns the median time (in milliseconds) of the filtering """
+    times = []
+    for _ in range(repetitions):
+        begin_time = time.perf_counter()
+        filtered_objects = ObjectsFilteringPostProcessor.ignore_large_boxes(object_list)
+        ObjectsFilteringPostProcessor.non_max_suppression_fast(filtered_objects, NMS_THRESHOLD)
+        times.append(time.perf_counter() - begin_time)
+    return np.median(times) * 1000
+
+
+def main(objects_counts, repetitions):
+    print("Median time (ms)")
+    print(f"{'Objects':>8}{'Filtering':>14}")
+    for objects in objects_counts:
+        print(f"{objects:>8}{benchmark(generate_objects(objects), repetitions):>14.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--objects", type=int, nargs="+", default=[50, 200, 1000])
+    parser.add_argument("--repetitions", type=int, default=20)
+    args = parser.parse_args()
+    main(args.objects, args.repetitions)
@@ -0,0 +1,72 @@
+"""
+Measures the time and the memory allocated to prepare a frame (with the processing resolution) for the detector,
+comparing the previous steps (resize to `ImageSize`, BGR to RGB conversion and the resize of the models with other
+input sizes) with the PreprocessingPlan of libs.detectors.utils.preprocessing.
+
+Usage: python -m tools.benchmarks.preprocessing [--resolution 1280 720] [--repetitions 200]
+"""
+import argparse
+import time
+import tracemalloc
+
+import cv2 as cv
+import numpy as np
+
+from libs.detectors.utils.preprocessing import OPENVINO_INPUT_SIZE, PreprocessingPlan, get_input_geometry
+
+# (model name, ImageSize) of the compared models
+MODELS = [
+    ("mobilenet_ssd_v2", "300,300,3"),
+    ("openvino", "300,300,3"),
+    ("yolov3", "416,416,3"),
+]
+
+
+def previous_preprocessing(model_name, image_size):
+    """ Returns a function with the steps done to each frame before the PreprocessingPlan """
+    def preprocess(cv_image):
+        resized_image = cv.resize(cv_image, image_size)
+        rgb_resized_image = cv.cvtColor(resized_image, cv.COLOR_BGR2RGB)
+        if model_name == "openvino":
+            return cv.resize(rgb_resized_image, OPENVINO_INPUT_SIZE)
+        elif model_name == "yolov3":
+            # Letterbox (of an image that already had the input size) and RGB to BGR
+            canvas = np.full((image_size[1], image_size[0], 3), 128)
+            canvas[:, :, :] = cv.resize(rgb_resized_image, image_size, interpolation=cv.INTER_CUBIC)
+            return canvas[:, :, ::-1]
+        return rgb_resized_image
+    return preprocess
+
+
+def benchmark(preprocess, cv_image, repetitions):
+    """ Returns the median time (in milliseconds) and the memory allocated (in KiB) by each call """
+    times = []
+    for _ in range(repetitions):
+        begin_time = time.perf_counter()
+        preprocess(cv_image)
+        times.append(time.perf_counter() - begin_time)
+    tracemalloc.start()
+    preprocess(cv_image)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return np.median(times) * 1000, peak / 1024
+
+
+def main(resolution, repetitions):
+    cv_image = np.random.RandomState(0).randint(0, 256, (resolution[1], resolution[0], 3)).astype(np.uint8)
+    print(f"Frame resolution: {resolution[0]}x{resolution[1]}")
+    print(f"{'Model':>18}{'Previous (ms)':>15}{'Plan (ms)':>11}{'Previous (KiB)':>16}{'Plan (KiB)':>12}")
+    for model_name, image_size in MODELS:
+        plan = PreprocessingPlan(get_input_geometry("x86", model_name, {"ImageSize": image_size}))
+        size = tuple(int(i) for i in image_size.split(",")[:2])
+        previous_time, previous_memory = benchmark(previous_preprocessing(model_name, size), cv_image, repetitions)
+        plan_time, plan_memory = benchmark(plan.run, cv_image, repetitions)
+        print(f"{model_name:>18}{previous_time:>15.3f}{plan_time:>11.3f}{previous_memory:>16.1f}{plan_memory:>12.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--resolution", type=int, nargs=2, default=[1280, 720])
+    parser.add_argument("--repetitions", type=int, default=200)
+    args = parser.parse_args()
+    main(args.resolution, args.repetitions)
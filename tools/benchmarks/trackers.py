@@ -0,0 +1,62 @@
+"""
+Measures the time per frame of the trackers with an increasing number of (synthetic) moving people.
+
+Usage: python -m tools.benchmarks.trackers [--objects 10 50 100 200 500] [--frames 100]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from libs.trackers.base_tracker import BaseTracker
+from libs.trackers.iou_tracker import IOUTracker
+from libs.trackers.sort_tracker import SORTTracker
+
+RESOLUTION = (1920, 1080)
+BOX_SIZE = (40, 100)
+
+
+def generate_frames(objects, frames, seed=0):
+    """ Returns a list with the detections (bboxes, class_ids, scores) of each frame """
+    rng = np.random.RandomState(seed)
+    positions = rng.uniform((0, 0), (RESOLUTION[0] - BOX_SIZE[0], RESOLUTION[1] - BOX_SIZE[1]), (objects, 2))
+    velocities = rng.uniform(-3, 3, (objects, 2))
+    detections = []
+    for frame in range(frames):
+        top_left = positions + velocities * frame
+        bboxes = np.concatenate([top_left, top_left + BOX_SIZE], axis=1).astype(int)
+        detections.append(([tuple(bbox) for bbox in bboxes], [1] * objects, [0.9] * objects))
+    return detections
+
+
+def benchmark(tracker, detections):
+    """ Returns the median time (in milliseconds) of the tracker updates """
+    times = []
+    for bboxes, class_ids, scores in detections:
+        begin_time = time.perf_counter()
+        tracker.update(bboxes, class_ids, scores)
+        times.append(time.perf_counter() - begin_time)
+    return np.median(times) * 1000
+
+
+def main(objects_counts, frames):
+    trackers = {
+        "BaseTracker": lambda: BaseTracker(max_lost=5),
+        "IOUTracker": lambda: IOUTracker(max_lost=5, iou_threshold=0.5, min_detection_confidence=0.2,
+                                         max_detection_confidence=1.0),
+        "SORTTracker": lambda: SORTTracker(max_lost=5, iou_threshold=0.5),
+    }
+    print("Median time per frame (ms)")
+    print(f"{'Objects':>8}" + "".join(f"{name:>14}" for name in trackers))
+    for objects in objects_counts:
+        detections = generate_frames(objects, frames)
+        results = [benchmark(tracker_factory(), detections) for tracker_factory in trackers.values()]
+        print(f"{objects:>8}" + "".join(f"{result:>14.3f}" for result in results))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--objects", type=int, nargs="+", default=[10, 50, 100, 200, 500])
+    parser.add_argument("--frames", type=int, default=100)
+    args = parser.parse_args()
+    main(args.objects, args.frames)
@@ -0,0 +1,85 @@
+"""
+Converts the raw data CSV logs (`<SourceLogDirectory>/<camera id>/objects_log/<day>.csv`) into the columnar log
+format of libs.utils.columnar_log, so the hourly metrics of the past days read them without parsing every row.
+The days that already have a columnar log are skipped (unless --overwrite is used). The violating pairs aren't
+stored in the CSV logs, the converted days only have the violating objects.
+
+Usage: python -m tools.convert_raw_logs <objects_log directory> [<objects_log directory> ...] [--overwrite]
+"""
+import argparse
+import ast
+import csv
+import os
+import shutil
+
+import numpy as np
+
+from libs.utils.columnar_log import ColumnarLogWriter, get_columnar_log_directory
+
+
+def csv_row_columns(csv_row):
+    """ Returns the columns (as lists) of a row of the CSV log """
+    detections = ast.literal_eval(csv_row["Detections"])
+    violation_indexes = ast.literal_eval(csv_row["ViolationsIndexes"])
+    class_ids, track_ids = [], []
+    for detection in detections:
+        tracking_id = detection["tracking_id"]
+        if isinstance(tracking_id, str):
+            # Untracked object, its id is "<class id>-<index>"
+            class_ids.append(int(tracking_id.split("-")[0]))
+            track_ids.append(-1)
+        else:
+            class_ids.append(0)
+            track_ids.append(tracking_id)
+    return {
+        "timestamps": np.datetime64(csv_row["Timestamp"].replace(" ", "T"), "s"),
+        "detected_objects": int(csv_row["DetectedObjects"]),
+        "violating_objects": int(csv_row["ViolatingObjects"]),
+        "environment_scores": float(csv_row["EnvironmentScore"]),
+        "detection_counts": len(detections),
+        "violation_index_counts": len(violation_indexes),
+        "violation_pair_counts": 0,
+        "bboxes": [detection["bbox"] for detection in detections],
+        "bboxes_real": [detection["bbox_real"] for detection in detections],
+        "class_ids": class_ids,
+        "track_ids": track_ids,
+        "face_labels": [detection.get("face_label", -1) for detection in detections],
+        "violation_indexes": violation_indexes,
+        "violation_pairs": [],
+    }
+
+
+def convert_csv_log(csv_path, rows_per_chunk=10000):
+    """ Writes the columnar log of the day of `csv_path` and returns its number of rows """
+    writer = ColumnarLogWriter(os.path.dirname(csv_path), flush_rows=rows_per_chunk, flush_interval=float("inf"))
+    rows_count = 0
+    with open(csv_path, newline="") as csv_file:
+        for csv_row in csv.DictReader(csv_file):
+            writer.append(csv_row_columns(csv_row))
+            rows_count += 1
+    writer.close()
+    return rows_count
+
+
+def main(objects_log_directories, overwrite):
+    for objects_log_directory in objects_log_directories:
+        for file_name in sorted(os.listdir(objects_log_directory)):
+            day, extension = os.path.splitext(file_name)
+            if extension != ".csv":
+                continue
+            columnar_log_directory = get_columnar_log_directory(objects_log_directory, day)
+            if os.path.isdir(columnar_log_directory):
+                if not overwrite:
+                    print(f"Skipping {file_name}, it already has a columnar log")
+                    continue
+                shutil.rmtree(columnar_log_directory)
+            rows_count = convert_csv_log(os.path.join(objects_log_directory, file_name))
+            print(f"Converted {file_name} ({rows_count} rows)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("objects_log_directories", nargs="+")
+    parser.add_argument("--overwrite", action="store_true")
+    args = parser.parse_args()
+    main(args.objects_log_directories, args.overwrite)
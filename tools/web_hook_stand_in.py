@@ -0,0 +1,62 @@
+"""
+A local stand-in of a web hook endpoint to test the `web_hook_logger` (set its `Endpoint` to
+http://<host>:<port>/). It decodes the (optionally gzip-compressed) requests and prints the number of entries
+received from each camera. The endpoint can simulate an outage, answering 503 during the first `--down-seconds`
+seconds and between `--down-at` and `--down-at + --down-seconds` seconds after it starts.
+
+Usage: python -m tools.web_hook_stand_in [--port 8090] [--down-at 0] [--down-seconds 0]
+"""
+import argparse
+import gzip
+import json
+import socketserver
+import time
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    # http.server.ThreadingHTTPServer is only available since Python 3.7
+    daemon_threads = True
+
+
+def build_handler(start_time, down_at, down_seconds, received):
+    class WebHookHandler(BaseHTTPRequestHandler):
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            elapsed_time = time.monotonic() - start_time
+            if down_at <= elapsed_time < down_at + down_seconds:
+                self.send_response(503)
+                self.end_headers()
+                return
+            if self.headers.get("Content-Encoding") == "gzip":
+                body = gzip.decompress(body)
+            request_data = json.loads(body)
+            received.append(request_data)
+            entries = request_data["raw_data"]
+            first_timestamp = entries[0]["timestamp"] if entries else None
+            print(f"{request_data['camera_id']}: {len(entries)} entries (first one at {first_timestamp})")
+            self.send_response(200)
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    return WebHookHandler
+
+
+def serve(port, down_at=0, down_seconds=0, received=None):
+    """ Returns the stand-in server (call `serve_forever` to start it), the requests are appended to `received` """
+    received = received if received is not None else []
+    handler = build_handler(time.monotonic(), down_at, down_seconds, received)
+    return ThreadingHTTPServer(("0.0.0.0", port), handler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--down-at", type=float, default=0)
+    parser.add_argument("--down-seconds", type=float, default=0)
+    args = parser.parse_args()
+    serve(args.port, args.down_at, args.down_seconds).serve_forever()